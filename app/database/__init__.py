@@ -1,4 +1,4 @@
 # Exportar funciones de database para fácil importación
-from app.database.session import get_db, create_tables, drop_tables, SessionLocal, engine
+from app.database.session import get_db, create_tables, create_search_schema, drop_tables, SessionLocal, engine
 
-__all__ = ["get_db", "create_tables", "drop_tables", "SessionLocal", "engine"]
+__all__ = ["get_db", "create_tables", "create_search_schema", "drop_tables", "SessionLocal", "engine"]
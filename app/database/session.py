@@ -6,6 +6,8 @@ from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria
 from app.models.lectura import Lectura
 from app.models.preferencia import Preferencia, Lenguaje, Categoria, PreferenciaLenguaje, PreferenciaCategoria
 from app.models.nivel import Nivel
+from app.models.estadistica import EstadisticaCatalogo
+from app.services.stats_service import stats_service
 from typing import Generator
 import os
 from dotenv import load_dotenv
@@ -32,6 +34,9 @@ engine = create_engine(
 # Crear la sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Contadores del catálogo actualizados en la misma transacción de cada escritura
+stats_service.register(SessionLocal)
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -53,6 +58,103 @@ def create_tables():
     Base.metadata.create_all(bind=engine)
 
 
+# Configuración de texto para la búsqueda: el catálogo mezcla libros en español
+# e inglés, así que se usa 'simple' (sin stemming de un idioma en particular)
+SEARCH_CONFIG = "simple"
+
+SEARCH_SCHEMA_DDL = [
+    # Nombres de autores desnormalizados: una columna generada no puede leer otras tablas
+    'ALTER TABLE libros ADD COLUMN IF NOT EXISTS autores_busqueda TEXT',
+    f"""
+    ALTER TABLE libros ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(autores_busqueda, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(sinopsis, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_libros_search_vector ON libros USING GIN (search_vector)',
+    """
+    CREATE OR REPLACE FUNCTION libros_refrescar_autores(ids integer[]) RETURNS void AS $$
+        UPDATE libros l SET autores_busqueda = (
+            SELECT string_agg(a.nombre, ' ')
+            FROM autor_libros al JOIN autores a ON a."idAutor" = al."idAutor"
+            WHERE al."idLibro" = l."idLibro"
+        )
+        WHERE l."idLibro" = ANY(ids)
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION autor_libros_busqueda_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM libros_refrescar_autores(ARRAY[OLD."idLibro"]);
+        ELSIF TG_OP = 'UPDATE' THEN
+            PERFORM libros_refrescar_autores(ARRAY[OLD."idLibro", NEW."idLibro"]);
+        ELSE
+            PERFORM libros_refrescar_autores(ARRAY[NEW."idLibro"]);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS trg_autor_libros_busqueda ON autor_libros',
+    """
+    CREATE TRIGGER trg_autor_libros_busqueda
+    AFTER INSERT OR UPDATE OR DELETE ON autor_libros
+    FOR EACH ROW EXECUTE FUNCTION autor_libros_busqueda_trigger()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION autores_busqueda_trigger() RETURNS trigger AS $$
+    BEGIN
+        PERFORM libros_refrescar_autores(
+            ARRAY(SELECT "idLibro" FROM autor_libros WHERE "idAutor" = NEW."idAutor")
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS trg_autores_busqueda ON autores',
+    """
+    CREATE TRIGGER trg_autores_busqueda
+    AFTER UPDATE OF nombre ON autores
+    FOR EACH ROW EXECUTE FUNCTION autores_busqueda_trigger()
+    """,
+]
+
+
+def create_search_schema() -> bool:
+    """
+    Crea (idempotente) la columna tsvector generada, su índice GIN y los
+    triggers que mantienen los nombres de autores para /libros/search.
+    Se ejecuta al iniciar, después de create_tables().
+    
+    Returns:
+        bool: False si la base no es PostgreSQL (búsqueda no disponible)
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            return False
+        
+        # Varios workers arrancan a la vez: serializar el DDL
+        conn.exec_driver_sql("SELECT pg_advisory_xact_lock(hashtext('libros_search_schema'))")
+        
+        existia = conn.exec_driver_sql(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'libros' AND column_name = 'autores_busqueda'"
+        ).first() is not None
+        
+        for ddl in SEARCH_SCHEMA_DDL:
+            conn.exec_driver_sql(ddl)
+        
+        # Primera vez: completar los autores de los libros ya cargados
+        if not existia:
+            conn.exec_driver_sql(
+                'SELECT libros_refrescar_autores(ARRAY(SELECT "idLibro" FROM libros))'
+            )
+    return True
+
+
 def drop_tables():
     """
     Elimina todas las tablas de la base de datos.
@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import create_tables
+from app.database import create_tables, create_search_schema, SessionLocal
 from app.routes import (
     auth_router,
     usuarios_router,
@@ -15,7 +15,10 @@ from app.routes import (
     nivel_router,
 )
 from app.routes.recomendaciones import router as recomendaciones_router
+from app.services.retraining_scheduler import retraining_scheduler
+from app.services.stats_service import stats_service
 from app.utils.exception_handlers import setup_exception_handlers
+from app.utils.compression import CompressionMiddleware
 from app.utils.responses import create_success_response
 import os
 from dotenv import load_dotenv
@@ -43,6 +46,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión gzip/Brotli de las respuestas (umbral, niveles y tipos excluidos
+# se ajustan con COMPRESSION_* en el entorno, ver utils/compression.py)
+app.add_middleware(CompressionMiddleware)
+
 
 # Evento de inicio: Crear tablas
 @app.on_event("startup")
@@ -54,6 +61,33 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Error al crear tablas: {e}")
         print("⚠️ Continuando sin crear tablas...")
+    
+    # Contadores del catálogo (se calculan una sola vez si la tabla es nueva)
+    try:
+        db = SessionLocal()
+        try:
+            stats_service.get(db)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"⚠️ Error al inicializar las estadísticas del catálogo: {e}")
+    
+    # Índice de búsqueda de texto completo (tsvector + GIN) para /libros/search
+    try:
+        if create_search_schema():
+            print("✅ Índice de búsqueda de libros creado/verificado")
+    except Exception as e:
+        print(f"⚠️ Error al crear el índice de búsqueda: {e}")
+    
+    # Reentrenamiento periódico del modelo de recomendaciones (si está configurado)
+    retraining_scheduler.start()
+
+
+# Evento de cierre: detener el reentrenamiento en segundo plano
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detener el pool de procesos del reentrenamiento"""
+    retraining_scheduler.shutdown()
 
 
 # Ruta raíz
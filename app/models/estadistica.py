@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from app.models import Base
+
+
+class EstadisticaCatalogo(Base):
+    __tablename__ = "estadisticas_catalogo"
+
+    clave = Column(String(50), primary_key=True)
+    valor = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<EstadisticaCatalogo(clave={self.clave}, valor={self.valor})>"
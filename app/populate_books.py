@@ -16,6 +16,8 @@ from app.database.session import SessionLocal
 from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
 from app.models.preferencia import Lenguaje, Categoria
 from app.services.google_books_service import GoogleBooksService
+from app.services.content_service import content_service
+from app.utils.http_cache import catalog_version
 
 
 class BookPopulator:
@@ -297,6 +299,10 @@ class BookPopulator:
             # Commit final
             db.commit()
             
+            # Vectorizar solo los libros nuevos en el índice de contenido
+            content_service.sync_after_import(db)
+            catalog_version.bump()
+            
             print(f"\nPoblación completada!")
             print(f"Libros guardados: {saved_count}")
             print(f"Libros omitidos: {skipped_count}")
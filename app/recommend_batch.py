@@ -0,0 +1,62 @@
+"""
+Script para generar recomendaciones de muchos usuarios en lote (NDJSON)
+Pensado para el digest nocturno por email: una línea por usuario
+Ejecutar: python -m app.recommend_batch [--usuarios 1,2,3] [--limit 10] [--salida archivo.ndjson]
+Sin --usuarios se procesan todos los usuarios activos
+"""
+import sys
+from pathlib import Path
+import argparse
+import contextlib
+import json
+
+# Agregar el directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database.session import SessionLocal
+from app.models import EstadoUsuario
+from app.models.usuario import Usuario
+from app.services.recommendation_service import recommendation_service
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Recomendaciones por lote en formato NDJSON")
+    parser.add_argument("--usuarios", help="IDs de usuario separados por coma (default: todos los activos)")
+    parser.add_argument("--limit", type=int, default=10, help="Recomendaciones por usuario")
+    parser.add_argument("--salida", help="Archivo de salida (default: stdout)")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    
+    try:
+        if args.usuarios:
+            usuario_ids = [int(uid) for uid in args.usuarios.split(",") if uid.strip()]
+        else:
+            usuario_ids = [
+                uid for (uid,) in db.query(Usuario.idUsuario)
+                .filter(Usuario.estado == EstadoUsuario.ACTIVO)
+                .order_by(Usuario.idUsuario)
+            ]
+        
+        # Los mensajes del servicio van a stderr para no mezclarse con el NDJSON
+        total = 0
+        with contextlib.redirect_stdout(sys.stderr):
+            for resultado in recommendation_service.get_recommendations_batch(usuario_ids, db, limit=args.limit):
+                salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                total += 1
+        
+        print(f"✅ Recomendaciones generadas para {total} usuarios", file=sys.stderr)
+    
+    except Exception as e:
+        print(f"❌ Error al generar recomendaciones: {e}", file=sys.stderr)
+        raise
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
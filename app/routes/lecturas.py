@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models.usuario import Usuario
@@ -13,7 +13,9 @@ from app.schemas.lectura import (
     LecturaDetailResponse
 )
 from app.services.auth import get_current_active_user
-from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.services.recommendation_service import recommendation_service
+from app.utils.responses import create_success_response, create_error_response, ErrorCodes, response_format
+from app.utils.pagination import paginate, keyset_page, resolve_after_id
 
 router = APIRouter(prefix="/lecturas", tags=["Lecturas"])
 
@@ -47,7 +49,8 @@ def create_lectura(
         lectura_dict = LecturaResponse.model_validate(lectura_existente).model_dump()
         return create_success_response(
             data=lectura_dict,
-            message="Ya tienes una lectura registrada para este libro"
+            message="Ya tienes una lectura registrada para este libro",
+            status_code=status.HTTP_201_CREATED
         )
     
     # Crear lectura
@@ -61,11 +64,13 @@ def create_lectura(
     db.add(db_lectura)
     db.commit()
     db.refresh(db_lectura)
+    recommendation_service.invalidate_user(current_user.idUsuario)
     
     lectura_dict = LecturaResponse.model_validate(db_lectura).model_dump()
     return create_success_response(
         data=lectura_dict,
-        message="Lectura creada exitosamente"
+        message="Lectura creada exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
@@ -73,13 +78,24 @@ def create_lectura(
 def read_lecturas(
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    formato: str = Depends(response_format),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
-    """Obtener todas las lecturas del usuario actual"""
-    lecturas = db.query(Lectura).filter(
+    """
+    Obtener todas las lecturas del usuario actual (paginación por cursor o skip/limit)
+    Con `Accept: application/msgpack` responde en MessagePack columnar
+    """
+    query = db.query(Lectura).filter(
         Lectura.idUsuario == current_user.idUsuario
-    ).offset(skip).limit(limit).all()
+    )
+    lecturas, pagination = keyset_page(
+        paginate(query, Lectura.idLectura, skip, limit, resolve_after_id(after_id, cursor)).all(),
+        limit,
+        lambda lectura: lectura.idLectura
+    )
     
     # Construir respuesta detallada
     responses = []
@@ -99,7 +115,9 @@ def read_lecturas(
     return create_success_response(
         data=responses,
         message="Lecturas obtenidas exitosamente",
-        count=len(responses)
+        count=len(responses),
+        pagination=pagination,
+        formato=formato
     )
 
 
@@ -220,6 +238,7 @@ def update_lectura(
     
     db.commit()
     db.refresh(db_lectura)
+    recommendation_service.invalidate_user(current_user.idUsuario)
     
     lectura_dict = LecturaResponse.model_validate(db_lectura).model_dump()
     return create_success_response(
@@ -251,6 +270,7 @@ def delete_lectura(
     
     db.delete(db_lectura)
     db.commit()
+    recommendation_service.invalidate_user(current_user.idUsuario)
     
     return create_success_response(
         data={"deleted": True, "id": lectura_id},
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
 
 from app.database import get_db
 from app.models.usuario import Usuario
-from app.models.libro import Libro, Editorial, Autor, AutorLibro, LibroCategoria, LibroLenguaje
+from app.models.libro import Libro, Editorial, Autor, AutorLibro
 from app.schemas.libro import (
     LibroCreate,
     LibroUpdate,
@@ -17,7 +18,15 @@ from app.schemas.libro import (
 from app.services.auth import get_current_active_user
 from app.services.s3_service import s3_service
 from app.services.google_books_service import google_books_service
-from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.services.content_service import content_service
+from app.services.search_service import search_service
+from app.services.facet_service import facet_service
+from app.services.stats_service import stats_service
+from app.services.recommendation_service import recommendation_service
+from app.utils.responses import create_success_response, create_error_response, ErrorCodes, response_format
+from app.utils.pagination import paginate, keyset_page, resolve_after_id
+from app.utils.http_cache import catalog_cache, negotiated_catalog_cache, invalidates_catalog, catalog_version
+from app.utils.response_cache import response_cache
 
 router = APIRouter(prefix="/libros", tags=["Libros"])
 editorial_router = APIRouter(prefix="/editoriales", tags=["Editoriales"])
@@ -25,8 +34,88 @@ autor_router = APIRouter(prefix="/autores", tags=["Autores"])
 admin_router = APIRouter(prefix="/admin", tags=["Admin"])
 
 
+# Relaciones que usa LibroResponse, cargadas con un JOIN (editorial) y un
+# SELECT ... IN (autores) en lugar de consultas perezosas por cada libro
+LIBRO_RESPONSE_OPTIONS = (
+    joinedload(Libro.editorial),
+    selectinload(Libro.autor_libros).joinedload(AutorLibro.autor),
+)
+
+
+def _load_libro(db: Session, libro_id: int) -> Optional[Libro]:
+    """Libro con las relaciones de LibroResponse (recarga también las ya cargadas)"""
+    return (
+        db.query(Libro)
+        .options(*LIBRO_RESPONSE_OPTIONS)
+        .filter(Libro.idLibro == libro_id)
+        .populate_existing()
+        .first()
+    )
+
+
+# Columnas que se pueden pedir con fields= en el listado liviano
+LIBRO_FIELDS = {
+    "idLibro": Libro.idLibro,
+    "titulo": Libro.titulo,
+    "totalPaginas": Libro.totalPaginas,
+    "sinopsis": Libro.sinopsis,
+    "urlLibro": Libro.urlLibro,
+    "urlPortada": Libro.urlPortada,
+    "idEditorial": Libro.idEditorial,
+}
+
+# Vistas predefinidas (view=card: lo que muestra una tarjeta del catálogo)
+LIBRO_VIEWS = {
+    "card": ["idLibro", "titulo", "urlPortada"],
+}
+
+
+def _resolve_fields(fields: Optional[str], view: Optional[str]) -> Optional[List[str]]:
+    """Columnas del listado liviano (None = respuesta completa); idLibro siempre va primero"""
+    if fields is None and view is None:
+        return None
+    if view is not None and view not in LIBRO_VIEWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                ErrorCodes.INVALID_INPUT,
+                f"Vista inválida. Opciones: {', '.join(LIBRO_VIEWS)}"
+            )
+        )
+    
+    nombres = list(LIBRO_VIEWS[view]) if view else []
+    for nombre in (fields or "").split(","):
+        nombre = nombre.strip()
+        if not nombre:
+            continue
+        if nombre not in LIBRO_FIELDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=create_error_response(
+                    ErrorCodes.INVALID_INPUT,
+                    f"Campo inválido: {nombre}. Opciones: {', '.join(LIBRO_FIELDS)}"
+                )
+            )
+        if nombre not in nombres:
+            nombres.append(nombre)
+    
+    return ["idLibro"] + [n for n in nombres if n != "idLibro"]
+
+
+def _libro_response(libro: Libro) -> dict:
+    """LibroResponse con autores; requiere las relaciones de LIBRO_RESPONSE_OPTIONS"""
+    response = LibroResponse.model_validate(libro)
+    response.autores = [AutorResponse.model_validate(al.autor) for al in libro.autor_libros]
+    return response.model_dump()
+
+
+def _libro_texto(libro: Libro) -> tuple:
+    """(idLibro, titulo, sinopsis) para el índice de contenido, sin depender de la sesión"""
+    return libro.idLibro, libro.titulo, libro.sinopsis
+
+
 # ENDPOINTS DE LIBROS
-@router.post("/with-file", status_code=status.HTTP_201_CREATED)
+@router.post("/with-file", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 async def create_libro_with_file(
     titulo: str = Form(...),
     totalPaginas: int = Form(...),
@@ -35,6 +124,7 @@ async def create_libro_with_file(
     autores_ids: str = Form(...),  # JSON string: "[1,2,3]"
     urlPortada: Optional[str] = Form(None),
     file: UploadFile = File(...),
+    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
@@ -150,26 +240,28 @@ async def create_libro_with_file(
         )
     
     # Asociar autores al libro
+    libro_id = db_libro.idLibro
     for autor_id in autores_ids_list:
-        autor_libro = AutorLibro(idAutor=autor_id, idLibro=db_libro.idLibro)
+        autor_libro = AutorLibro(idAutor=autor_id, idLibro=libro_id)
         db.add(autor_libro)
     
     db.commit()
-    db.refresh(db_libro)
+    db_libro = _load_libro(db, libro_id)
     
-    # Construir respuesta con autores
-    response = LibroResponse.model_validate(db_libro)
-    response.autores = [AutorResponse.model_validate(al.autor) for al in db_libro.autor_libros]
+    # El índice de contenido se actualiza después de enviar la respuesta
+    background_tasks.add_task(content_service.upsert, [_libro_texto(db_libro)])
     
     return create_success_response(
-        data=response.model_dump(),
-        message="Libro creado exitosamente con archivo PDF"
+        data=_libro_response(db_libro),
+        message="Libro creado exitosamente con archivo PDF",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@router.post("", status_code=status.HTTP_201_CREATED)
+@router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_libro(
     libro: LibroCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
@@ -210,28 +302,28 @@ def create_libro(
     db.refresh(db_libro)
     
     # Asociar autores al libro
+    libro_id = db_libro.idLibro
     for autor_id in libro.autores_ids:
-        autor_libro = AutorLibro(idAutor=autor_id, idLibro=db_libro.idLibro)
+        autor_libro = AutorLibro(idAutor=autor_id, idLibro=libro_id)
         db.add(autor_libro)
     
     db.commit()
-    db.refresh(db_libro)
+    db_libro = _load_libro(db, libro_id)
     
-    # Construir respuesta con autores
-    response = LibroResponse.model_validate(db_libro)
-    response.autores = [AutorResponse.model_validate(al.autor) for al in db_libro.autor_libros]
+    # El índice de contenido se actualiza después de enviar la respuesta
+    background_tasks.add_task(content_service.upsert, [_libro_texto(db_libro)])
     
-    libro_dict = response.model_dump()
     return create_success_response(
-        data=libro_dict,
-        message="Libro creado exitosamente"
+        data=_libro_response(db_libro),
+        message="Libro creado exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
 @router.get("/count")
 def get_total_libros_count(db: Session = Depends(get_db)):
     """Obtener el total de libros (solo el número)"""
-    total = db.query(Libro).count()
+    total = stats_service.get(db)["libros"]
     
     return create_success_response(
         data={"total_libros": total},
@@ -240,47 +332,140 @@ def get_total_libros_count(db: Session = Depends(get_db)):
     )
 
 
-@router.get("")
+@router.get("/search")
+def search_libros(
+    q: str = Query(..., min_length=1, max_length=200),
+    prefijo: bool = False,
+    skip: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Buscar libros por título, autores y sinopsis (texto completo, PostgreSQL)
+    
+    - Normal: sintaxis tipo web ("frase exacta", or, -excluir), ordenado por
+      relevancia y con fragmentos resaltados con <mark>
+    - prefijo=true: modo typeahead, cada palabra se toma como prefijo y solo
+      se devuelven id, título resaltado y rank
+    
+    Los campos `resaltado` son HTML: el texto del libro va escapado y la única
+    etiqueta es <mark>, así que el cliente puede insertarlos como HTML. Los
+    demás campos (titulo, sinopsis) son texto plano sin escapar.
+    """
+    if not search_service.is_available(db):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=create_error_response(
+                ErrorCodes.DATABASE_ERROR,
+                "La búsqueda de texto completo requiere PostgreSQL"
+            )
+        )
+    
+    if prefijo:
+        sugerencias = search_service.typeahead(db, q, limit)
+        return create_success_response(
+            data=sugerencias,
+            message=f"Se encontraron {len(sugerencias)} sugerencias",
+            count=len(sugerencias)
+        )
+    
+    responses = []
+    resultados = search_service.search(db, q, skip, limit, options=LIBRO_RESPONSE_OPTIONS)
+    for libro, rank, titulo_resaltado, sinopsis_resaltada in resultados:
+        data = _libro_response(libro)
+        data["rank"] = float(rank)
+        data["resaltado"] = {"titulo": titulo_resaltado, "sinopsis": sinopsis_resaltada}
+        responses.append(data)
+    
+    return create_success_response(
+        data=responses,
+        message=f"Se encontraron {len(responses)} libros",
+        count=len(responses)
+    )
+
+
+@router.get("", dependencies=[Depends(negotiated_catalog_cache)])
+@response_cache.cached("libros")
 def read_libros(
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    categoria: Optional[List[int]] = Query(None),
+    lenguaje: Optional[List[int]] = Query(None),
+    editorial: Optional[List[int]] = Query(None),
+    autor: Optional[List[int]] = Query(None),
+    paginas_min: Optional[int] = None,
+    paginas_max: Optional[int] = None,
+    facetas: bool = False,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    formato: str = Depends(response_format),
     db: Session = Depends(get_db)
 ):
-    """Obtener lista de libros con eager loading optimizado"""
+    """
+    Obtener lista de libros con eager loading optimizado
+    
+    Paginación por cursor: pasar `cursor` (el `pagination.next_cursor` de la
+    respuesta anterior) o `after_id`; skip/limit se mantienen por compatibilidad.
+    
+    Filtros (repetibles, OR dentro de cada uno y AND entre ellos): categoria,
+    lenguaje, editorial, autor, paginas_min/paginas_max. Con facetas=true la
+    respuesta incluye los conteos por valor de cada faceta. Los filtros y los
+    conteos se resuelven con el índice en memoria de facet_service.
+    
+    Listado liviano: `fields=titulo,urlPortada` o `view=card` seleccionan solo
+    esas columnas (sin ORM ni Pydantic) y devuelven objetos con esas claves.
+    
+    Con `Accept: application/msgpack` responde el mismo sobre en MessagePack,
+    con los libros como arrays paralelos por campo (ver utils/responses.py).
+    """
     from app.models.preferencia import Categoria, Lenguaje
     
-    libros = (
-        db.query(Libro)
-        .options(
-            selectinload(Libro.editorial),
-            selectinload(Libro.autor_libros).selectinload(AutorLibro.autor),
-            selectinload(Libro.libro_categorias).selectinload(LibroCategoria.categoria),
-            selectinload(Libro.libro_lenguajes).selectinload(LibroLenguaje.lenguaje)
+    campos = _resolve_fields(fields, view)
+    if campos is None:
+        query = db.query(Libro).options(*LIBRO_RESPONSE_OPTIONS)
+    else:
+        query = select(*(LIBRO_FIELDS[c] for c in campos))
+    after_id = resolve_after_id(after_id, cursor)
+    filtros = {"categoria": categoria, "lenguaje": lenguaje, "editorial": editorial, "autor": autor}
+    filtrado = any(filtros.values()) or paginas_min is not None or paginas_max is not None
+    
+    conteos = None
+    if filtrado or facetas:
+        ids, conteos = facet_service.get_index(db).query(
+            filtros, paginas_min, paginas_max, con_facetas=facetas
         )
-        .order_by(Libro.idLibro)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
     
-    # Construir respuestas con autores
-    responses = []
-    for libro in libros:
-        response = LibroResponse.model_validate(libro)
-        response.autores = [AutorResponse.model_validate(al.autor) for al in libro.autor_libros]
-        responses.append(response.model_dump())
+    if filtrado:
+        ids = ids[ids > after_id] if after_id is not None else ids[skip:]
+        query = query.filter(Libro.idLibro.in_(ids[:limit + 1].tolist())).order_by(Libro.idLibro)
+    else:
+        query = paginate(query, Libro.idLibro, skip, limit, after_id)
+    
+    if campos is None:
+        libros, pagination = keyset_page(query.all(), limit, lambda libro: libro.idLibro)
+        responses = [_libro_response(libro) for libro in libros]
+    else:
+        # Tuplas de columnas directo a dicts: sin identity map ni validación
+        rows, pagination = keyset_page(db.execute(query).all(), limit, lambda row: row[0])
+        responses = [dict(zip(campos, row)) for row in rows]
     
     return create_success_response(
         data=responses,
         message="Libros obtenidos exitosamente",
-        count=len(responses)
+        count=len(responses),
+        pagination=pagination,
+        facets=conteos,
+        formato=formato
     )
 
 
-@router.get("/{libro_id}")
+@router.get("/{libro_id}", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("libro")
 def read_libro(libro_id: int, db: Session = Depends(get_db)):
     """Obtener un libro por ID"""
-    libro = db.query(Libro).filter(Libro.idLibro == libro_id).first()
+    libro = _load_libro(db, libro_id)
     if not libro:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -290,20 +475,39 @@ def read_libro(libro_id: int, db: Session = Depends(get_db)):
             )
         )
     
-    response = LibroResponse.model_validate(libro)
-    response.autores = [AutorResponse.model_validate(al.autor) for al in libro.autor_libros]
-    
     return create_success_response(
-        data=response.model_dump(),
+        data=_libro_response(libro),
         message="Libro obtenido exitosamente",
         count=1
     )
 
 
-@router.put("/{libro_id}")
+@router.get("/{libro_id}/similares")
+def get_libros_similares(libro_id: int, limit: int = 10, db: Session = Depends(get_db)):
+    """Obtener libros con título y sinopsis parecidos (similitud coseno TF-IDF)"""
+    if not db.query(Libro.idLibro).filter(Libro.idLibro == libro_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=create_error_response(
+                ErrorCodes.BOOK_NOT_FOUND,
+                "Libro no encontrado"
+            )
+        )
+    
+    similares = recommendation_service.get_similar_content(libro_id, db, limit)
+    
+    return create_success_response(
+        data=similares,
+        message=f"Se encontraron {len(similares)} libros similares",
+        count=len(similares)
+    )
+
+
+@router.put("/{libro_id}", dependencies=[Depends(invalidates_catalog)])
 def update_libro(
     libro_id: int,
     libro_update: LibroUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
@@ -335,21 +539,22 @@ def update_libro(
         setattr(db_libro, field, value)
     
     db.commit()
-    db.refresh(db_libro)
+    db_libro = _load_libro(db, libro_id)
     
-    response = LibroResponse.model_validate(db_libro)
-    response.autores = [AutorResponse.model_validate(al.autor) for al in db_libro.autor_libros]
+    if "titulo" in update_data or "sinopsis" in update_data:
+        # El índice de contenido se actualiza después de enviar la respuesta
+        background_tasks.add_task(content_service.upsert, [_libro_texto(db_libro)])
     
-    libro_dict = response.model_dump()
     return create_success_response(
-        data=libro_dict,
+        data=_libro_response(db_libro),
         message="Libro actualizado exitosamente"
     )
 
 
-@router.delete("/{libro_id}")
+@router.delete("/{libro_id}", dependencies=[Depends(invalidates_catalog)])
 def delete_libro(
     libro_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
@@ -380,6 +585,7 @@ def delete_libro(
     # Eliminar libro de la base de datos
     db.delete(db_libro)
     db.commit()
+    background_tasks.add_task(content_service.remove, [libro_id])
     
     return create_success_response(
         data={
@@ -392,7 +598,7 @@ def delete_libro(
 
 
 # ENDPOINTS DE EDITORIALES
-@editorial_router.post("", status_code=status.HTTP_201_CREATED)
+@editorial_router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_editorial(
     editorial: EditorialCreate,
     db: Session = Depends(get_db),
@@ -407,11 +613,13 @@ def create_editorial(
     editorial_dict = EditorialResponse.model_validate(db_editorial).model_dump()
     return create_success_response(
         data=editorial_dict,
-        message="Editorial creada exitosamente"
+        message="Editorial creada exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@editorial_router.get("")
+@editorial_router.get("", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("editoriales")
 def read_editoriales(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de editoriales"""
     editoriales = db.query(Editorial).offset(skip).limit(limit).all()
@@ -425,7 +633,7 @@ def read_editoriales(skip: int = 0, limit: int = 100, db: Session = Depends(get_
 
 
 # ENDPOINTS DE AUTORES
-@autor_router.post("", status_code=status.HTTP_201_CREATED)
+@autor_router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_autor(
     autor: AutorCreate,
     db: Session = Depends(get_db),
@@ -440,11 +648,13 @@ def create_autor(
     autor_dict = AutorResponse.model_validate(db_autor).model_dump()
     return create_success_response(
         data=autor_dict,
-        message="Autor creado exitosamente"
+        message="Autor creado exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@autor_router.get("")
+@autor_router.get("", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("autores")
 def read_autores(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de autores"""
     autores = db.query(Autor).offset(skip).limit(limit).all()
@@ -457,14 +667,17 @@ def read_autores(skip: int = 0, limit: int = 100, db: Session = Depends(get_db))
     )
 
 
-@autor_router.get("/{autor_id}/libros")
+@autor_router.get("/{autor_id}/libros", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("libros_autor")
 def get_libros_by_autor(
     autor_id: int,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Obtener todos los libros de un autor específico"""
+    """Obtener todos los libros de un autor específico (paginación por cursor o skip/limit)"""
     # Verificar que el autor existe
     autor = db.query(Autor).filter(Autor.idAutor == autor_id).first()
     if not autor:
@@ -481,9 +694,13 @@ def get_libros_by_autor(
         AutorLibro, Libro.idLibro == AutorLibro.idLibro
     ).filter(
         AutorLibro.idAutor == autor_id
-    ).offset(skip).limit(limit)
+    )
     
-    libros = libros_query.all()
+    libros, pagination = keyset_page(
+        paginate(libros_query, Libro.idLibro, skip, limit, resolve_after_id(after_id, cursor)).all(),
+        limit,
+        lambda libro: libro.idLibro
+    )
     
     # Construir respuesta con la información solicitada
     responses = []
@@ -502,7 +719,8 @@ def get_libros_by_autor(
     return create_success_response(
         data=responses,
         message=f"Libros del autor {autor.nombre} obtenidos exitosamente",
-        count=len(responses)
+        count=len(responses),
+        pagination=pagination
     )
 
 
@@ -592,6 +810,10 @@ def populate_books_task(total_books: int, db: Session):
         # Commit final
         db.commit()
         
+        # Vectorizar solo los libros nuevos en el índice de contenido
+        content_service.sync_after_import(db)
+        catalog_version.bump()
+        
         print(f"\n✅ Población completada:")
         print(f"  - Libros insertados: {stats['libros_insertados']}")
         print(f"  - Libros duplicados (omitidos): {stats['libros_duplicados']}")
@@ -609,6 +831,15 @@ def populate_books_task(total_books: int, db: Session):
         db.close()
 
 
+@admin_router.get("/cache")
+def get_response_cache_stats(current_user: Usuario = Depends(get_current_active_user)):
+    """Métricas de la caché de respuestas del catálogo (aciertos, fallos, tamaño)"""
+    return create_success_response(
+        data=response_cache.stats(),
+        message="Estadísticas de caché obtenidas exitosamente"
+    )
+
+
 @admin_router.post("/populate-books")
 def populate_books_from_google(
     total_books: int = 1000,
@@ -654,19 +885,15 @@ def populate_books_from_google(
 @admin_router.get("/populate-status")
 def get_populate_status(db: Session = Depends(get_db)):
     """Obtener estadísticas de la base de datos"""
-    total_libros = db.query(Libro).count()
-    total_autores = db.query(Autor).count()
-    total_editoriales = db.query(Editorial).count()
-    libros_con_pdf = db.query(Libro).filter(Libro.urlLibro != None).count()
-    libros_sin_pdf = db.query(Libro).filter(Libro.urlLibro == None).count()
+    stats = stats_service.get(db)
     
     return create_success_response(
         data={
-            "total_libros": total_libros,
-            "total_autores": total_autores,
-            "total_editoriales": total_editoriales,
-            "libros_con_pdf": libros_con_pdf,
-            "libros_sin_pdf": libros_sin_pdf
+            "total_libros": stats["libros"],
+            "total_autores": stats["autores"],
+            "total_editoriales": stats["editoriales"],
+            "libros_con_pdf": stats["libros_con_pdf"],
+            "libros_sin_pdf": stats["libros_sin_pdf"]
         },
         message="Estadísticas obtenidas exitosamente",
         count=1
@@ -847,21 +1074,23 @@ def get_populate_status(
 ):
     """Obtener el estado actual de libros en la base de datos"""
     
-    # Contar elementos actuales
-    total_libros = db.query(Libro).count()
-    total_autores = db.query(Autor).count()
-    total_editoriales = db.query(Editorial).count()
-    
-    # Contar elementos de configuración
-    from app.models.preferencia import Lenguaje, Categoria
-    from app.models.nivel import Nivel
-    
-    total_lenguajes = db.query(Lenguaje).count()
-    total_categorias = db.query(Categoria).count()
-    total_niveles = db.query(Nivel).count()
+    # Contadores del catálogo y de configuración (una sola lectura)
+    stats = stats_service.get(db)
+    total_libros = stats["libros"]
+    total_autores = stats["autores"]
+    total_editoriales = stats["editoriales"]
+    total_lenguajes = stats["lenguajes"]
+    total_categorias = stats["categorias"]
+    total_niveles = stats["niveles"]
     
     # Obtener algunos ejemplos de libros recientes
-    libros_recientes = db.query(Libro).order_by(Libro.idLibro.desc()).limit(5).all()
+    libros_recientes = (
+        db.query(Libro)
+        .options(joinedload(Libro.editorial))
+        .order_by(Libro.idLibro.desc())
+        .limit(5)
+        .all()
+    )
     libros_ejemplos = [
         {
             "id": libro.idLibro,
@@ -11,11 +11,13 @@ from app.schemas.nivel import (
 )
 from app.services.auth import get_current_active_user
 from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.utils.http_cache import catalog_cache, invalidates_catalog
+from app.utils.response_cache import response_cache
 
 router = APIRouter(prefix="/niveles", tags=["Niveles"])
 
 
-@router.post("", status_code=status.HTTP_201_CREATED)
+@router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_nivel(
     nivel: NivelCreate,
     db: Session = Depends(get_db),
@@ -41,11 +43,13 @@ def create_nivel(
     nivel_dict = NivelResponse.model_validate(db_nivel).model_dump()
     return create_success_response(
         data=nivel_dict,
-        message="Nivel creado exitosamente"
+        message="Nivel creado exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@router.get("")
+@router.get("", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("niveles")
 def read_niveles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de niveles disponibles"""
     niveles = db.query(Nivel).offset(skip).limit(limit).all()
@@ -83,7 +87,7 @@ def read_nivel(
     )
 
 
-@router.put("/{nivel_id}")
+@router.put("/{nivel_id}", dependencies=[Depends(invalidates_catalog)])
 def update_nivel(
     nivel_id: int,
     nivel: NivelCreate,
@@ -128,7 +132,7 @@ def update_nivel(
     )
 
 
-@router.delete("/{nivel_id}")
+@router.delete("/{nivel_id}", dependencies=[Depends(invalidates_catalog)])
 def delete_nivel(
     nivel_id: int,
     db: Session = Depends(get_db),
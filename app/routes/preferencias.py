@@ -23,13 +23,30 @@ from app.schemas.preferencia import (
 )
 from app.schemas.nivel import NivelResponse
 from app.services.auth import get_current_active_user
+from app.services.recommendation_service import recommendation_service
+from app.services.retraining_scheduler import retraining_scheduler
 from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.utils.http_cache import catalog_cache, invalidates_catalog
+from app.utils.response_cache import response_cache
 
 router = APIRouter(prefix="/preferencias", tags=["Preferencias"])
 lenguaje_router = APIRouter(prefix="/lenguajes", tags=["Lenguajes"])
 categoria_router = APIRouter(prefix="/categorias", tags=["Categorías"])
 
 
+def _actualizar_cluster(usuario_id: int, preferencia):
+    """
+    Reasigna el cluster del usuario sin reentrenar e invalida sus recomendaciones
+    cacheadas; el cambio cuenta para el reentrenamiento por umbral de cambios
+    """
+    recommendation_service.invalidate_user(usuario_id)
+    try:
+        recommendation_service.assign_user_cluster(usuario_id, preferencia)
+        retraining_scheduler.record_preference_change()
+    except Exception as e:
+        print(f"⚠️ Error al actualizar cluster del usuario {usuario_id}: {e}")
+
+
 # ENDPOINTS DE PREFERENCIAS
 @router.post("", status_code=status.HTTP_201_CREATED)
 def create_preferencia(
@@ -109,10 +126,13 @@ def create_preferencia(
     if db_preferencia.nivel:
         response.nivel = NivelResponse.model_validate(db_preferencia.nivel)
     
+    _actualizar_cluster(current_user.idUsuario, db_preferencia)
+    
     preferencia_dict = response.model_dump()
     return create_success_response(
         data=preferencia_dict,
-        message="Preferencias creadas exitosamente"
+        message="Preferencias creadas exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
@@ -236,6 +256,8 @@ def update_my_preferencias(
     if db_preferencia.nivel:
         response.nivel = NivelResponse.model_validate(db_preferencia.nivel)
     
+    _actualizar_cluster(current_user.idUsuario, db_preferencia)
+    
     preferencia_dict = response.model_dump()
     return create_success_response(
         data=preferencia_dict,
@@ -265,6 +287,8 @@ def delete_my_preferencias(
     db.delete(db_preferencia)
     db.commit()
     
+    _actualizar_cluster(current_user.idUsuario, None)
+    
     return create_success_response(
         data={"deleted": True},
         message="Preferencias eliminadas exitosamente"
@@ -272,7 +296,7 @@ def delete_my_preferencias(
 
 
 # ENDPOINTS DE LENGUAJES
-@lenguaje_router.post("", status_code=status.HTTP_201_CREATED)
+@lenguaje_router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_lenguaje(
     lenguaje: LenguajeCreate,
     db: Session = Depends(get_db),
@@ -287,11 +311,13 @@ def create_lenguaje(
     lenguaje_dict = LenguajeResponse.model_validate(db_lenguaje).model_dump()
     return create_success_response(
         data=lenguaje_dict,
-        message="Lenguaje creado exitosamente"
+        message="Lenguaje creado exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@lenguaje_router.get("")
+@lenguaje_router.get("", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("lenguajes")
 def read_lenguajes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de lenguajes disponibles"""
     lenguajes = db.query(Lenguaje).offset(skip).limit(limit).all()
@@ -305,7 +331,7 @@ def read_lenguajes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
 
 
 # ENDPOINTS DE CATEGORÍAS
-@categoria_router.post("", status_code=status.HTTP_201_CREATED)
+@categoria_router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(invalidates_catalog)])
 def create_categoria(
     categoria: CategoriaCreate,
     db: Session = Depends(get_db),
@@ -320,11 +346,13 @@ def create_categoria(
     categoria_dict = CategoriaResponse.model_validate(db_categoria).model_dump()
     return create_success_response(
         data=categoria_dict,
-        message="Categoría creada exitosamente"
+        message="Categoría creada exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
-@categoria_router.get("")
+@categoria_router.get("", dependencies=[Depends(catalog_cache)])
+@response_cache.cached("categorias")
 def read_categorias(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Obtener lista de categorías disponibles"""
     categorias = db.query(Categoria).offset(skip).limit(limit).all()
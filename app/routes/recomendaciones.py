@@ -2,14 +2,19 @@
 Endpoints para el sistema de recomendaciones
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
+import json
 
 from app.database import get_db
+from app.database.session import SessionLocal
 from app.models.usuario import Usuario
+from app.schemas.recomendacion import RecomendacionesLoteRequest
 from app.services.auth import get_current_active_user
-from app.services.recommendation_service import recommendation_service
-from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.services.recommendation_service import recommendation_service, TRAINING_MODES
+from app.services.retraining_scheduler import retraining_scheduler, TrainingInProgressError
+from app.utils.responses import create_success_response, create_error_response, ErrorCodes, response_format
 
 
 router = APIRouter(prefix="/recomendaciones", tags=["Recomendaciones"])
@@ -18,27 +23,52 @@ router = APIRouter(prefix="/recomendaciones", tags=["Recomendaciones"])
 @router.get("/entrenar")
 async def entrenar_modelo(
     n_clusters: int = 5,
-    db: Session = Depends(get_db),
+    modo: str = "dense",
+    batch_size: int = 1024,
+    background: bool = False,
     current_user: Usuario = Depends(get_current_active_user)
 ):
     """
     Entrena el modelo K-Means con los usuarios actuales
     Solo admin puede ejecutar esto
+    
+    - modo=dense: StandardScaler + KMeans (default)
+    - modo=sparse: features CSR + MiniBatchKMeans, para bases de usuarios grandes
+    - background=true: encola el entrenamiento y responde de inmediato
+      (el estado se consulta en /recomendaciones/entrenar/estado)
+    
+    El entrenamiento corre en un proceso aparte; el modelo anterior sigue
+    sirviendo recomendaciones hasta que la versión nueva queda publicada.
+    Si ya hay uno en curso con otros parámetros responde 409.
     """
+    if modo not in TRAINING_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                ErrorCodes.INVALID_INPUT,
+                f"Modo de entrenamiento inválido: '{modo}'. Valores permitidos: {', '.join(TRAINING_MODES)}"
+            )
+        )
+    
     try:
-        user_cluster_map = recommendation_service.train_model(db, n_clusters)
+        if background:
+            retraining_scheduler.submit(n_clusters, modo, batch_size)
+            return create_success_response(
+                data=retraining_scheduler.status(),
+                message="Entrenamiento encolado"
+            )
+        
+        resultado = await retraining_scheduler.run(n_clusters, modo, batch_size)
         
         return create_success_response(
-            data={
-                "clusters_creados": n_clusters,
-                "usuarios_procesados": len(user_cluster_map),
-                "distribucion": {
-                    f"cluster_{i}": sum(1 for c in user_cluster_map.values() if c == i)
-                    for i in range(n_clusters)
-                }
-            },
+            data=resultado,
             message="Modelo entrenado exitosamente"
         )
+    except TrainingInProgressError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=create_error_response(ErrorCodes.TRAINING_IN_PROGRESS, str(e))
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -49,15 +79,31 @@ async def entrenar_modelo(
         )
 
 
+@router.get("/entrenar/estado")
+async def obtener_estado_entrenamiento(
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene el estado del reentrenamiento en segundo plano
+    Solo admin puede ejecutar esto
+    """
+    return create_success_response(
+        data=retraining_scheduler.status(),
+        message="Estado del entrenamiento obtenido exitosamente"
+    )
+
+
 @router.get("")
 async def obtener_recomendaciones(
     limit: int = 10,
+    formato: str = Depends(response_format),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
     """
     Obtiene recomendaciones personalizadas para el usuario actual
     Basado en K-Means y preferencias (categorías, lenguajes, nivel)
+    Con `Accept: application/msgpack` responde en MessagePack columnar
     """
     try:
         recomendaciones = recommendation_service.get_recommendations(
@@ -69,7 +115,8 @@ async def obtener_recomendaciones(
         return create_success_response(
             data=recomendaciones,
             message=f"Se encontraron {len(recomendaciones)} recomendaciones",
-            count=len(recomendaciones)
+            count=len(recomendaciones),
+            formato=formato
         )
         
     except Exception as e:
@@ -82,6 +129,63 @@ async def obtener_recomendaciones(
         )
 
 
+@router.post("/lote")
+def obtener_recomendaciones_lote(
+    solicitud: RecomendacionesLoteRequest,
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene recomendaciones para muchos usuarios en una sola petición
+    Solo admin puede ejecutar esto (p. ej. para el digest por email)
+    
+    Responde NDJSON: una línea {"usuario_id", "recomendaciones"} por usuario,
+    emitida a medida que se procesa cada bloque.
+    """
+    def generar():
+        # Sesión propia: la respuesta se sigue enviando después de que
+        # FastAPI cierra las dependencias de la petición
+        db = SessionLocal()
+        try:
+            for resultado in recommendation_service.get_recommendations_batch(
+                solicitud.usuario_ids, db, limit=solicitud.limit
+            ):
+                yield json.dumps(resultado, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+
+@router.get("/libros/{libro_id}/tambien-leyeron")
+async def obtener_tambien_leyeron(
+    libro_id: int,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene los libros que también leyeron los lectores de un libro
+    Basado en la co-ocurrencia de lecturas (ponderada por estado)
+    """
+    try:
+        libros = recommendation_service.get_also_read(libro_id, db, limit)
+        
+        return create_success_response(
+            data=libros,
+            message=f"Se encontraron {len(libros)} libros relacionados",
+            count=len(libros)
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=create_error_response(
+                ErrorCodes.INTERNAL_ERROR,
+                f"Error al obtener libros relacionados: {str(e)}"
+            )
+        )
+
+
 @router.get("/mi-cluster")
 async def obtener_mi_cluster(
     db: Session = Depends(get_db),
@@ -118,3 +222,32 @@ async def obtener_mi_cluster(
                 f"Error al obtener cluster: {str(e)}"
             )
         )
+
+
+@router.get("/modelo")
+async def obtener_info_modelo(
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """
+    Obtiene la versión y la hora de carga del modelo en memoria,
+    junto con las métricas de la caché de recomendaciones
+    Solo admin puede ejecutar esto
+    """
+    try:
+        info = recommendation_service.registry.info()
+        info["cache_resultados"] = recommendation_service.results_cache.stats()
+        
+        return create_success_response(
+            data=info,
+            message="Información del modelo obtenida exitosamente" if info["loaded"]
+            else "No hay un modelo entrenado todavía"
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=create_error_response(
+                ErrorCodes.INTERNAL_ERROR,
+                f"Error al obtener información del modelo: {str(e)}"
+            )
+        )
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models.usuario import Usuario, EstadoUsuario
@@ -15,6 +15,7 @@ from app.schemas.usuario import (
 from app.utils.security import get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.services.auth import authenticate_user, get_current_active_user
 from app.utils.responses import create_success_response, create_error_response, ErrorCodes
+from app.utils.pagination import paginate, keyset_page, resolve_after_id
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 auth_router = APIRouter(prefix="/auth", tags=["Autenticación"])
@@ -65,7 +66,8 @@ def register_user(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     
     return create_success_response(
         data=usuario_dict,
-        message="Usuario registrado exitosamente"
+        message="Usuario registrado exitosamente",
+        status_code=status.HTTP_201_CREATED
     )
 
 
@@ -116,20 +118,24 @@ def read_users_me(current_user: Usuario = Depends(get_current_active_user)):
 def read_users(
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user)
 ):
-    """Obtener lista de usuarios"""
-    usuarios = db.query(Usuario).offset(skip).limit(limit).all()
+    """Obtener lista de usuarios (paginación por cursor o skip/limit)"""
+    usuarios, pagination = keyset_page(
+        paginate(db.query(Usuario), Usuario.idUsuario, skip, limit, resolve_after_id(after_id, cursor)).all(),
+        limit,
+        lambda usuario: usuario.idUsuario
+    )
     usuarios_dict = [UsuarioResponse.model_validate(u).model_dump() for u in usuarios]
     
-    # Obtener total para paginación
-    total = db.query(Usuario).count()
-    
     return create_success_response(
         data=usuarios_dict,
         message="Usuarios obtenidos exitosamente",
-        count=len(usuarios_dict)
+        count=len(usuarios_dict),
+        pagination=pagination
     )
 
 
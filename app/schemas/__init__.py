@@ -38,6 +38,7 @@ from app.schemas.nivel import (
     NivelCreate,
     NivelResponse
 )
+from app.schemas.recomendacion import RecomendacionesLoteRequest
 
 __all__ = [
     # Usuario
@@ -74,4 +75,6 @@ __all__ = [
     # Nivel
     "NivelCreate",
     "NivelResponse",
+    # Recomendaciones
+    "RecomendacionesLoteRequest",
 ]
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+# Schemas para Recomendaciones
+class RecomendacionesLoteRequest(BaseModel):
+    usuario_ids: List[int] = Field(..., min_length=1)
+    limit: int = Field(10, ge=1, le=100)
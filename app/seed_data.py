@@ -13,6 +13,7 @@ from app.database.session import SessionLocal, engine
 from app.models import Base
 from app.models.nivel import Nivel
 from app.models.preferencia import Lenguaje, Categoria
+from app.utils.http_cache import catalog_version
 
 
 def init_db():
@@ -125,6 +126,8 @@ def main():
         raise
     finally:
         db.close()
+        # Niveles, lenguajes y categorías son parte del catálogo: invalidar sus cachés
+        catalog_version.bump()
 
 
 if __name__ == "__main__":
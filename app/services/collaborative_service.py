@@ -0,0 +1,201 @@
+"""
+Servicio de recomendaciones colaborativas item-item
+Construye una matriz de co-ocurrencia de libros a partir del historial de
+lecturas, ponderada por el estado de cada lectura:
+- COMPLETADO pesa más que EN_PROGRESO, y este más que ABANDONADO
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.lectura import Lectura, EstadoLectura
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+import os
+import threading
+
+
+# Peso de cada estado de lectura como señal de interés
+ESTADO_WEIGHTS = {
+    EstadoLectura.COMPLETADO: 1.0,
+    EstadoLectura.EN_PROGRESO: 0.6,
+    EstadoLectura.ABANDONADO: 0.2,
+    EstadoLectura.NO_INICIADO: 0.1,
+}
+
+# Vecinos que se conservan por libro (acota la memoria de la matriz)
+TOP_NEIGHBOURS = 100
+
+
+class CollaborativeService:
+    """Motor item-item "lectores de este libro también leyeron" sobre matrices dispersas"""
+    
+    def __init__(self):
+        # Matriz CSR e ids de libros en un solo archivo: se publican juntos
+        # con un único os.replace y un worker nunca ve ids de otra matriz
+        self.matrix_path = "models/item_similarity.npz"
+        # (matriz, ids de libros) en una sola tupla: se leen y reemplazan juntos
+        self._datos: Tuple[Optional[csr_matrix], Optional[np.ndarray]] = (None, None)
+        self._mtime = None
+        self._lock = threading.Lock()
+    
+    def build(self, db: Session) -> int:
+        """
+        Construye y guarda la matriz de similitud item-item
+        
+        R (usuarios x libros) contiene el peso del estado de cada lectura;
+        la co-ocurrencia es R^T R normalizada por coseno, sin diagonal y
+        recortada a los TOP_NEIGHBOURS vecinos más fuertes de cada libro.
+        
+        Args:
+            db: Sesión de base de datos
+        
+        Returns:
+            int: Número de libros con historial de lecturas
+        """
+        print("Construyendo matriz de co-ocurrencia de lecturas...")
+        
+        rows = db.query(Lectura.idUsuario, Lectura.idLibro, Lectura.estado).all()
+        
+        usuario_ids = np.array(sorted({r.idUsuario for r in rows}), dtype=np.int64)
+        libro_ids = np.array(sorted({r.idLibro for r in rows}), dtype=np.int64)
+        
+        R = csr_matrix(
+            (
+                np.array([ESTADO_WEIGHTS.get(r.estado, 0.0) for r in rows], dtype=np.float32),
+                (
+                    np.searchsorted(usuario_ids, np.array([r.idUsuario for r in rows], dtype=np.int64)),
+                    np.searchsorted(libro_ids, np.array([r.idLibro for r in rows], dtype=np.int64)),
+                )
+            ),
+            shape=(len(usuario_ids), len(libro_ids))
+        )
+        R.eliminate_zeros()
+        
+        # Co-ocurrencia ponderada y normalización coseno
+        C = (R.T @ R).tocsr()
+        norms = np.sqrt(C.diagonal())
+        inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        C = (diags(inv_norms) @ C @ diags(inv_norms)).tocsr()
+        C.setdiag(0)
+        C.eliminate_zeros()
+        C = self._prune_rows(C, TOP_NEIGHBOURS)
+        
+        os.makedirs("models", exist_ok=True)
+        C = C.astype(np.float32)
+        tmp_matrix = f"models/item_similarity.tmp-{os.getpid()}.npz"
+        np.savez(
+            tmp_matrix,
+            data=C.data, indices=C.indices, indptr=C.indptr,
+            shape=np.array(C.shape, dtype=np.int64), libro_ids=libro_ids
+        )
+        os.replace(tmp_matrix, self.matrix_path)
+        
+        print(f"✓ Matriz de co-ocurrencia: {len(libro_ids)} libros, {C.nnz} pares")
+        return len(libro_ids)
+    
+    @staticmethod
+    def _prune_rows(C: csr_matrix, top_n: int) -> csr_matrix:
+        """Conserva solo los top_n valores más altos de cada fila"""
+        indptr, indices, data = [0], [], []
+        for i in range(C.shape[0]):
+            start, end = C.indptr[i], C.indptr[i + 1]
+            row_data = C.data[start:end]
+            row_indices = C.indices[start:end]
+            if len(row_data) > top_n:
+                keep = np.argpartition(-row_data, top_n)[:top_n]
+                row_data, row_indices = row_data[keep], row_indices[keep]
+            data.append(row_data)
+            indices.append(row_indices)
+            indptr.append(indptr[-1] + len(row_data))
+        
+        if not data:
+            return C
+        return csr_matrix(
+            (np.concatenate(data), np.concatenate(indices), np.array(indptr)),
+            shape=C.shape
+        )
+    
+    def _load(self) -> Tuple[Optional[csr_matrix], Optional[np.ndarray]]:
+        """Matriz e ids de libros en memoria, recargados si el archivo cambió"""
+        try:
+            mtime = os.stat(self.matrix_path).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+        
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with np.load(self.matrix_path) as archivo:
+                        matrix = csr_matrix(
+                            (archivo["data"], archivo["indices"], archivo["indptr"]),
+                            shape=tuple(archivo["shape"])
+                        )
+                        libro_ids = archivo["libro_ids"]
+                    self._datos = (matrix, libro_ids)
+                    self._mtime = mtime
+        return self._datos
+    
+    def is_available(self) -> bool:
+        """Indica si ya existe una matriz de co-ocurrencia construida"""
+        matrix, _ = self._load()
+        return matrix is not None
+    
+    def similar_books(self, libro_id: int, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        Libros que más leyeron los lectores de `libro_id`
+        
+        Returns:
+            Lista de (idLibro, similitud) ordenada de mayor a menor
+        """
+        matrix, libro_ids = self._load()
+        if matrix is None:
+            return []
+        
+        pos = np.searchsorted(libro_ids, libro_id)
+        if pos >= len(libro_ids) or libro_ids[pos] != libro_id:
+            return []
+        
+        start, end = matrix.indptr[pos], matrix.indptr[pos + 1]
+        scores = matrix.data[start:end]
+        order = np.argsort(-scores)[:limit]
+        return [(int(libro_ids[matrix.indices[start + i]]), float(scores[i])) for i in order]
+    
+    def score_for_user(self, lecturas: Dict[int, EstadoLectura], limit: int = 100) -> List[Tuple[int, float]]:
+        """
+        Puntúa libros para un usuario a partir de su historial
+        
+        El puntaje es el producto disperso C · u, donde u es el vector de
+        pesos de las lecturas del usuario. Los libros ya leídos se excluyen.
+        
+        Args:
+            lecturas: Mapa idLibro -> estado de las lecturas del usuario
+            limit: Cantidad máxima de libros a retornar
+        
+        Returns:
+            Lista de (idLibro, puntaje) ordenada de mayor a menor
+        """
+        matrix, libro_ids = self._load()
+        if matrix is None or not lecturas:
+            return []
+        
+        ids = np.fromiter(lecturas.keys(), dtype=np.int64, count=len(lecturas))
+        pesos = np.array([ESTADO_WEIGHTS.get(estado, 0.0) for estado in lecturas.values()], dtype=np.float32)
+        pos = np.searchsorted(libro_ids, ids)
+        pos_validas = pos < len(libro_ids)
+        conocidos = pos_validas.copy()
+        conocidos[pos_validas] = libro_ids[pos[pos_validas]] == ids[pos_validas]
+        if not conocidos.any():
+            return []
+        
+        # C es simétrica antes del recorte; C[leídos]^T · pesos = C · u
+        scores = np.asarray(matrix[pos[conocidos]].T @ pesos[conocidos]).ravel()
+        scores[pos[conocidos]] = 0
+        
+        candidatos = np.flatnonzero(scores > 0)
+        if len(candidatos) > limit:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], limit)[:limit]]
+        candidatos = candidatos[np.argsort(-scores[candidatos])]
+        return [(int(libro_ids[i]), float(scores[i])) for i in candidatos]
+
+
+# Instancia singleton del servicio
+collaborative_service = CollaborativeService()
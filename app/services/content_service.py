@@ -0,0 +1,339 @@
+"""
+Servicio de similitud de contenido entre libros
+Vectoriza titulo + sinopsis con n-gramas hasheados y pesos TF-IDF:
+- El hashing no necesita vocabulario, así que los libros nuevos se agregan
+  al índice sin reajustar nada (el IDF se recalcula en cada build completo)
+- Las filas se guardan normalizadas (L2): el producto punto es el coseno
+
+Cada escritura publica una versión nueva en models/content/versions/<versión>/
+y mueve el puntero models/content/CURRENT (mismo esquema que el modelo de
+recomendaciones). Las escrituras (build, upsert, remove) leen, modifican y
+guardan bajo un lock de archivo, así dos workers no pisan sus cambios.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.libro import Libro
+from app.models.lectura import EstadoLectura
+from app.services.collaborative_service import ESTADO_WEIGHTS
+import numpy as np
+from scipy.sparse import csr_matrix, diags, load_npz, save_npz, vstack
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Dimensión del espacio hasheado (las colisiones son raras con 2^18)
+N_FEATURES = 2 ** 18
+
+# Directorio del índice, puntero a la versión activa y artefactos por versión
+CONTENT_DIR = "models/content"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+MATRIX_FILE = "content_matrix.npz"
+IDS_FILE = "content_ids.npy"
+IDF_FILE = "content_idf.npy"
+
+# Lock entre workers para leer-modificar-guardar el índice
+LOCK_FILE = ".lock"
+
+# Versiones anteriores que se conservan en disco tras cada escritura
+CONTENT_VERSIONS_TO_KEEP = 3
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Lock exclusivo sobre un archivo; el sistema lo libera si el proceso muere"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ContentService:
+    """Índice TF-IDF de titulo + sinopsis con búsqueda de libros similares por coseno"""
+    
+    def __init__(self, directory: str = CONTENT_DIR):
+        self.directory = directory
+        self.current_path = os.path.join(directory, CURRENT_FILE)
+        self.versions_dir = os.path.join(directory, VERSIONS_DIR)
+        self.lock_path = os.path.join(directory, LOCK_FILE)
+        self.vectorizer = HashingVectorizer(
+            n_features=N_FEATURES,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            strip_accents="unicode",
+            lowercase=True
+        )
+        self._matrix: Optional[csr_matrix] = None
+        self._libro_ids: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+        self._version: Optional[str] = None
+        self._current_mtime = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _text(titulo: Optional[str], sinopsis: Optional[str]) -> str:
+        # El título se repite para que pese más que la sinopsis
+        return f"{titulo or ''} {titulo or ''} {sinopsis or ''}"
+    
+    @staticmethod
+    def _tfidf(tf: csr_matrix, idf: np.ndarray) -> csr_matrix:
+        """Filas TF-IDF normalizadas a partir de los conteos hasheados"""
+        tf = tf.astype(np.float32)
+        tf.data = 1 + np.log(tf.data)  # tf sublineal
+        return normalize(tf @ diags(idf), norm="l2", copy=False).tocsr()
+    
+    def _vectorize(self, textos: Iterable[str], idf: np.ndarray) -> csr_matrix:
+        return self._tfidf(self.vectorizer.transform(textos), idf)
+    
+    def build(self, db: Session) -> int:
+        """
+        Construye el índice completo (recalcula el IDF con todo el catálogo)
+        
+        Args:
+            db: Sesión de base de datos
+        
+        Returns:
+            int: Número de libros indexados
+        """
+        print("Construyendo índice de contenido de libros...")
+        
+        rows = db.query(Libro.idLibro, Libro.titulo, Libro.sinopsis).order_by(Libro.idLibro).all()
+        libro_ids = np.array([r.idLibro for r in rows], dtype=np.int64)
+        
+        tf = self.vectorizer.transform(self._text(r.titulo, r.sinopsis) for r in rows)
+        df = np.bincount(tf.indices, minlength=N_FEATURES)
+        idf = (np.log((1 + len(rows)) / (1 + df)) + 1).astype(np.float32)
+        
+        matrix = self._tfidf(tf, idf)
+        with self._write_lock():
+            self._save(matrix, libro_ids, idf)
+        
+        print(f"✓ Índice de contenido: {len(libro_ids)} libros")
+        return len(libro_ids)
+    
+    @contextmanager
+    def _write_lock(self):
+        """Lock entre procesos para las escrituras del índice"""
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(self.lock_path):
+            yield
+    
+    def _save(self, matrix: csr_matrix, libro_ids: np.ndarray, idf: np.ndarray):
+        """Publica una versión nueva: directorio temporal, rename y luego el puntero CURRENT"""
+        version = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+        version_dir = os.path.join(self.versions_dir, version)
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        save_npz(os.path.join(tmp_dir, MATRIX_FILE), matrix)
+        np.save(os.path.join(tmp_dir, IDS_FILE), libro_ids)
+        np.save(os.path.join(tmp_dir, IDF_FILE), idf)
+        os.replace(tmp_dir, version_dir)
+        
+        tmp_current = f"{self.current_path}.tmp-{os.getpid()}"
+        with open(tmp_current, "w") as f:
+            f.write(version)
+        os.replace(tmp_current, self.current_path)
+        self._prune_versions(keep=version)
+        
+        with self._lock:
+            self._matrix, self._libro_ids, self._idf = matrix, libro_ids, idf
+            self._version = version
+            self._current_mtime = os.stat(self.current_path).st_mtime_ns
+    
+    def _prune_versions(self, keep: str):
+        """Elimina las versiones más antiguas, conservando CONTENT_VERSIONS_TO_KEEP"""
+        versions = sorted(
+            name for name in os.listdir(self.versions_dir)
+            if ".tmp-" not in name and os.path.isdir(os.path.join(self.versions_dir, name))
+        )
+        for name in versions[:-CONTENT_VERSIONS_TO_KEEP]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.versions_dir, name), ignore_errors=True)
+    
+    def _load(self) -> Tuple[Optional[csr_matrix], Optional[np.ndarray], Optional[np.ndarray]]:
+        """Matriz, ids e IDF en memoria, recargados cuando cambia el puntero CURRENT"""
+        try:
+            mtime = os.stat(self.current_path).st_mtime_ns
+        except FileNotFoundError:
+            return None, None, None
+        
+        if mtime != self._current_mtime:
+            with self._lock:
+                if mtime != self._current_mtime:
+                    with open(self.current_path) as f:
+                        version = f.read().strip()
+                    if version != self._version:
+                        version_dir = os.path.join(self.versions_dir, version)
+                        try:
+                            idf = np.load(os.path.join(version_dir, IDF_FILE))
+                            libro_ids = np.load(os.path.join(version_dir, IDS_FILE))
+                            matrix = load_npz(os.path.join(version_dir, MATRIX_FILE)).tocsr()
+                        except FileNotFoundError:
+                            # Versión ya podada por otra escritura: se reintenta en la próxima llamada
+                            return self._matrix, self._libro_ids, self._idf
+                        self._matrix, self._libro_ids, self._idf = matrix, libro_ids, idf
+                        self._version = version
+                    self._current_mtime = mtime
+        return self._matrix, self._libro_ids, self._idf
+    
+    def upsert(self, libros: List[Tuple[int, Optional[str], Optional[str]]]):
+        """
+        Agrega o reemplaza las filas de los libros indicados (crear/editar libro)
+        
+        Recibe tuplas (idLibro, titulo, sinopsis) y no objetos de la sesión,
+        porque las rutas lo ejecutan como BackgroundTask, después de cerrarla.
+        Si todavía no hay índice no hace nada: el primer build lo crea completo.
+        """
+        if not libros:
+            return
+        with self._write_lock():
+            matrix, libro_ids, idf = self._load()
+            if matrix is None:
+                return
+            
+            nuevos_ids = np.array([libro_id for libro_id, _, _ in libros], dtype=np.int64)
+            nuevas_filas = self._vectorize(
+                (self._text(titulo, sinopsis) for _, titulo, sinopsis in libros), idf
+            )
+            
+            conservar = ~np.isin(libro_ids, nuevos_ids)
+            ids = np.concatenate([libro_ids[conservar], nuevos_ids])
+            filas = vstack([matrix[np.flatnonzero(conservar)], nuevas_filas]).tocsr()
+            order = np.argsort(ids, kind="stable")
+            self._save(filas[order], ids[order], idf)
+    
+    def remove(self, libro_ids_eliminados: List[int]):
+        """Quita libros eliminados del índice"""
+        if not len(libro_ids_eliminados):
+            return
+        with self._write_lock():
+            matrix, libro_ids, idf = self._load()
+            if matrix is None:
+                return
+            conservar = ~np.isin(libro_ids, np.asarray(libro_ids_eliminados, dtype=np.int64))
+            if conservar.all():
+                return
+            self._save(matrix[np.flatnonzero(conservar)], libro_ids[conservar], idf)
+    
+    def sync(self, db: Session) -> int:
+        """
+        Reconstrucción incremental tras cargas masivas (populate, uploads)
+        
+        Solo vectoriza los libros que no están en el índice y quita los que ya
+        no existen; si no hay índice hace el build completo.
+        
+        Returns:
+            int: Número de libros agregados
+        """
+        matrix, libro_ids, _ = self._load()
+        if matrix is None:
+            return self.build(db)
+        
+        ids_actuales = np.array([lid for (lid,) in db.query(Libro.idLibro)], dtype=np.int64)
+        eliminados = np.setdiff1d(libro_ids, ids_actuales)
+        nuevos = np.setdiff1d(ids_actuales, libro_ids)
+        
+        if len(eliminados):
+            self.remove(eliminados.tolist())
+        if len(nuevos):
+            self.upsert(
+                db.query(Libro.idLibro, Libro.titulo, Libro.sinopsis)
+                .filter(Libro.idLibro.in_(nuevos.tolist()))
+                .all()
+            )
+        
+        print(f"✓ Índice de contenido sincronizado: +{len(nuevos)} / -{len(eliminados)} libros")
+        return len(nuevos)
+    
+    def sync_after_import(self, db: Session):
+        """sync() para los scripts de carga: un error no debe invalidar la carga ya hecha"""
+        try:
+            self.sync(db)
+        except Exception as e:
+            print(f"⚠️ Error al sincronizar el índice de contenido: {e}")
+    
+    def is_available(self) -> bool:
+        """Indica si ya existe un índice de contenido construido"""
+        matrix, _, _ = self._load()
+        return matrix is not None
+    
+    def similar_books(self, libro_id: int, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        Libros con titulo/sinopsis más parecidos a `libro_id`
+        
+        Returns:
+            Lista de (idLibro, similitud coseno) ordenada de mayor a menor
+        """
+        matrix, libro_ids, _ = self._load()
+        if matrix is None:
+            return []
+        
+        pos = np.searchsorted(libro_ids, libro_id)
+        if pos >= len(libro_ids) or libro_ids[pos] != libro_id:
+            return []
+        
+        scores = np.asarray((matrix @ matrix[pos].T).todense()).ravel()
+        scores[pos] = 0
+        return self._top(scores, libro_ids, limit)
+    
+    def score_for_user(self, lecturas: Dict[int, EstadoLectura], limit: int = 100) -> List[Tuple[int, float]]:
+        """
+        Puntúa libros por similitud de contenido con el historial del usuario
+        
+        El perfil es la suma de las filas de los libros leídos ponderadas por
+        el estado de cada lectura; los libros ya leídos se excluyen.
+        
+        Returns:
+            Lista de (idLibro, puntaje) ordenada de mayor a menor
+        """
+        matrix, libro_ids, _ = self._load()
+        if matrix is None or not lecturas:
+            return []
+        
+        ids = np.fromiter(lecturas.keys(), dtype=np.int64, count=len(lecturas))
+        pesos = np.array([ESTADO_WEIGHTS.get(estado, 0.0) for estado in lecturas.values()], dtype=np.float32)
+        pos = np.searchsorted(libro_ids, ids)
+        pos_validas = pos < len(libro_ids)
+        conocidos = pos_validas.copy()
+        conocidos[pos_validas] = libro_ids[pos[pos_validas]] == ids[pos_validas]
+        if not conocidos.any():
+            return []
+        
+        perfil = matrix[pos[conocidos]].T @ pesos[conocidos]
+        scores = np.asarray(matrix @ perfil).ravel()
+        scores[pos[conocidos]] = 0
+        return self._top(scores, libro_ids, limit)
+    
+    @staticmethod
+    def _top(scores: np.ndarray, libro_ids: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        candidatos = np.flatnonzero(scores > 0)
+        if len(candidatos) > limit:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], limit)[:limit]]
+        candidatos = candidatos[np.argsort(-scores[candidatos])]
+        return [(int(libro_ids[i]), float(scores[i])) for i in candidatos]
+
+
+# Instancia singleton del servicio
+content_service = ContentService()
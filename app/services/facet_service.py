@@ -0,0 +1,205 @@
+"""
+Índice de facetas del catálogo en memoria
+Evita un COUNT(*) por faceta y por request sobre las tablas intermedias:
+- Cada faceta (categoría, lenguaje, editorial, autor) es un índice invertido
+  guardado como arrays de NumPy: pares (posición del libro, valor) agrupados
+  por valor, así el conjunto de libros de un valor es un slice
+- Los filtros se combinan como máscaras booleanas (OR dentro de una faceta,
+  AND entre facetas) y los conteos salen de un np.bincount sobre los pares
+- Los conteos de cada faceta ignoran su propio filtro (facetas disyuntivas),
+  así la UI puede mostrar las alternativas de lo ya seleccionado
+
+El índice se reconstruye en la siguiente consulta cuando cambia la versión
+del catálogo (utils/http_cache.py), que suben las rutas de escritura, las
+tareas de carga y los scripts de importación en cualquier worker.
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
+from app.models.preferencia import Categoria, Lenguaje
+from app.utils.http_cache import catalog_version
+import numpy as np
+import threading
+import time
+
+
+# Autores que se devuelven en los conteos (los de más libros dentro del filtro)
+TOP_AUTORES = 50
+
+
+class FacetDimension:
+    """Índice invertido de una faceta sobre las posiciones de los libros"""
+    
+    def __init__(self, libro_pos: np.ndarray, valores: np.ndarray, nombres: Dict[int, str]):
+        self.value_ids, self.value_idx = np.unique(valores, return_inverse=True)
+        self.libro_pos = libro_pos.astype(np.int32)
+        self.value_idx = self.value_idx.astype(np.int32)
+        order = np.argsort(self.value_idx, kind="stable")
+        self.postings = self.libro_pos[order]
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(self.value_idx, minlength=len(self.value_ids)))]
+        )
+        self.nombres = nombres
+    
+    def mask(self, ids: List[int], n_libros: int) -> np.ndarray:
+        """Libros que tienen alguno de los valores indicados"""
+        mask = np.zeros(n_libros, dtype=bool)
+        pos = np.searchsorted(self.value_ids, ids)
+        for i, value_id in zip(pos, ids):
+            if i < len(self.value_ids) and self.value_ids[i] == value_id:
+                mask[self.postings[self.offsets[i]:self.offsets[i + 1]]] = True
+        return mask
+    
+    def counts(self, mask: np.ndarray, top: Optional[int] = None) -> List[Dict]:
+        """Libros por valor dentro de `mask` (solo valores con al menos uno)"""
+        conteos = np.bincount(self.value_idx[mask[self.libro_pos]], minlength=len(self.value_ids))
+        indices = np.flatnonzero(conteos)
+        indices = indices[np.argsort(-conteos[indices], kind="stable")]
+        if top is not None:
+            indices = indices[:top]
+        return [
+            {"id": int(self.value_ids[i]), "nombre": self.nombres.get(int(self.value_ids[i])), "count": int(conteos[i])}
+            for i in indices
+        ]
+
+
+class FacetIndex:
+    """Snapshot inmutable del catálogo para filtrar y contar facetas"""
+    
+    def __init__(self, libro_ids: np.ndarray, paginas: np.ndarray, dimensiones: Dict[str, FacetDimension],
+                 version: int = 0):
+        self.libro_ids = libro_ids
+        self.paginas = paginas
+        self.dimensiones = dimensiones
+        self.version = version
+    
+    @classmethod
+    def build(cls, db: Session, version: int = 0) -> "FacetIndex":
+        libros = db.query(Libro.idLibro, Libro.totalPaginas, Libro.idEditorial).order_by(Libro.idLibro).all()
+        libro_ids = np.array([r.idLibro for r in libros], dtype=np.int64)
+        paginas = np.array([r.totalPaginas for r in libros], dtype=np.int32)
+        editoriales = np.array([r.idEditorial for r in libros], dtype=np.int64)
+        
+        def pares(rows) -> Tuple[np.ndarray, np.ndarray]:
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            valores = np.array([r[1] for r in rows], dtype=np.int64)
+            if not len(libro_ids):
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            pos = np.searchsorted(libro_ids, ids)
+            # Descartar pares de libros insertados después de leer `libros`
+            validos = pos < len(libro_ids)
+            validos[validos] = libro_ids[pos[validos]] == ids[validos]
+            return pos[validos], valores[validos]
+        
+        dimensiones = {
+            "categoria": FacetDimension(
+                *pares(db.query(LibroCategoria.idLibro, LibroCategoria.idCategoria).all()),
+                dict(db.query(Categoria.idCategoria, Categoria.nombre).all())
+            ),
+            "lenguaje": FacetDimension(
+                *pares(db.query(LibroLenguaje.idLibro, LibroLenguaje.idLenguaje).all()),
+                dict(db.query(Lenguaje.idLenguaje, Lenguaje.nombre).all())
+            ),
+            "editorial": FacetDimension(
+                np.arange(len(libro_ids)), editoriales,
+                dict(db.query(Editorial.idEditorial, Editorial.nombre).all())
+            ),
+            "autor": FacetDimension(
+                *pares(db.query(AutorLibro.idLibro, AutorLibro.idAutor).all()),
+                dict(db.query(Autor.idAutor, Autor.nombre).all())
+            ),
+        }
+        return cls(libro_ids, paginas, dimensiones, version)
+    
+    def _masks(self, filtros: Dict[str, List[int]], paginas_min: Optional[int],
+               paginas_max: Optional[int]) -> Dict[str, np.ndarray]:
+        n = len(self.libro_ids)
+        masks = {}
+        if paginas_min is not None or paginas_max is not None:
+            rango = np.ones(n, dtype=bool)
+            if paginas_min is not None:
+                rango &= self.paginas >= paginas_min
+            if paginas_max is not None:
+                rango &= self.paginas <= paginas_max
+            masks["paginas"] = rango
+        for nombre, ids in filtros.items():
+            if ids:
+                masks[nombre] = self.dimensiones[nombre].mask(ids, n)
+        return masks
+    
+    @staticmethod
+    def _combine(masks: Dict[str, np.ndarray], n: int, excluir: Optional[str] = None) -> np.ndarray:
+        mask = np.ones(n, dtype=bool)
+        for nombre, m in masks.items():
+            if nombre != excluir:
+                mask &= m
+        return mask
+    
+    def query(self, filtros: Dict[str, List[int]], paginas_min: Optional[int] = None,
+              paginas_max: Optional[int] = None, con_facetas: bool = False) -> Tuple[np.ndarray, Optional[Dict]]:
+        """
+        Filtra el catálogo y opcionalmente cuenta libros por valor de cada faceta
+        
+        Args:
+            filtros: {"categoria": [ids], "lenguaje": [...], "editorial": [...], "autor": [...]}
+            paginas_min / paginas_max: Rango de totalPaginas (inclusive)
+            con_facetas: Calcular también los conteos
+        
+        Returns:
+            (ids de libros que cumplen los filtros, ordenados; facetas o None)
+        """
+        n = len(self.libro_ids)
+        masks = self._masks(filtros, paginas_min, paginas_max)
+        mask = self._combine(masks, n)
+        
+        facetas = None
+        if con_facetas:
+            facetas = {"total": int(mask.sum())}
+            for nombre, dimension in self.dimensiones.items():
+                mask_faceta = mask if nombre not in masks else self._combine(masks, n, excluir=nombre)
+                facetas[nombre] = dimension.counts(mask_faceta, TOP_AUTORES if nombre == "autor" else None)
+            mask_paginas = mask if "paginas" not in masks else self._combine(masks, n, excluir="paginas")
+            if mask_paginas.any():
+                facetas["paginas"] = {
+                    "min": int(self.paginas[mask_paginas].min()),
+                    "max": int(self.paginas[mask_paginas].max())
+                }
+            else:
+                facetas["paginas"] = {"min": None, "max": None}
+        
+        return self.libro_ids[mask], facetas
+
+
+class FacetService:
+    """Mantiene el índice de facetas al día con la versión del catálogo"""
+    
+    def __init__(self):
+        self._index: Optional[FacetIndex] = None
+        self._lock = threading.Lock()
+    
+    def get_index(self, db: Session) -> FacetIndex:
+        """
+        Índice vigente; si la versión del catálogo cambió lo reconstruye un
+        solo hilo y los demás siguen usando el anterior mientras tanto
+        """
+        version = catalog_version.get()
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        
+        if not self._lock.acquire(blocking=index is None):
+            return index
+        try:
+            if self._index is not None and self._index.version == version:
+                return self._index
+            inicio = time.perf_counter()
+            # La versión se toma antes de leer: una escritura durante el build fuerza otro
+            self._index = FacetIndex.build(db, version)
+            print(f"✓ Índice de facetas: {len(self._index.libro_ids)} libros en {time.perf_counter() - inicio:.2f}s")
+            return self._index
+        finally:
+            self._lock.release()
+
+
+# Instancia singleton del servicio
+facet_service = FacetService()
@@ -0,0 +1,168 @@
+"""
+Índice de vecinos aproximados (LSH por proyecciones aleatorias) de usuarios
+Se construye al entrenar sobre la matriz de features ya escalada y permite
+obtener los usuarios más parecidos a uno dado sin recorrer toda la base:
+- Cada tabla asigna a cada usuario un código de N_BITS bits con el signo de
+  N_BITS proyecciones aleatorias (usuarios con ángulo pequeño comparten código)
+- Los códigos se guardan ordenados, así un bucket es un slice (searchsorted)
+- Los candidatos de los buckets se re-rankean con la similitud coseno exacta
+
+Cada array se guarda como un .npy dentro del directorio del índice y se abre
+con np.load(mmap_mode='r'), igual que el mapa de clusters: los workers
+comparten las páginas a través de la caché del sistema operativo.
+"""
+from typing import List, Optional, Tuple, Union
+import os
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+
+# Tablas hash independientes y bits por código
+N_TABLES = 8
+N_BITS = 12
+
+# Usuarios que se toman como máximo de cada bucket (acota el costo por consulta)
+MAX_BUCKET_CANDIDATES = 1000
+
+
+class UserNeighborIndex:
+    """Índice LSH de usuarios guardado como arrays de NumPy"""
+    
+    def __init__(self, user_ids: np.ndarray, planes: np.ndarray, codes: np.ndarray,
+                 order: np.ndarray, features: Union[np.ndarray, csr_matrix], norms: np.ndarray):
+        self.user_ids = user_ids
+        self.planes = planes
+        self.codes = codes
+        self.order = order
+        self.features = features
+        self.norms = norms
+    
+    @staticmethod
+    def _hash(planes: np.ndarray, X) -> np.ndarray:
+        """Códigos (tablas x filas) a partir del signo de las proyecciones"""
+        weights = (1 << np.arange(planes.shape[1], dtype=np.int64))
+        codes = np.empty((planes.shape[0], X.shape[0]), dtype=np.int64)
+        for t in range(planes.shape[0]):
+            bits = np.asarray(X @ planes[t].T) > 0
+            codes[t] = bits.astype(np.int64) @ weights
+        return codes
+    
+    @classmethod
+    def build(cls, user_ids: List[int], X, n_tables: int = N_TABLES, n_bits: int = N_BITS,
+              random_state: int = 42) -> "UserNeighborIndex":
+        """
+        Construye el índice a partir de la matriz de features escalada
+        
+        Args:
+            user_ids: IDs de usuario por fila de X
+            X: Matriz escalada (array denso o CSR)
+            n_tables: Tablas hash (más tablas = mejor recall, más memoria)
+            n_bits: Bits por código (más bits = buckets más chicos)
+            random_state: Semilla de las proyecciones
+        """
+        rng = np.random.default_rng(random_state)
+        planes = rng.standard_normal((n_tables, n_bits, X.shape[1])).astype(np.float32)
+        
+        if issparse(X):
+            features = csr_matrix(X, dtype=np.float32)
+            norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+        else:
+            features = np.asarray(X, dtype=np.float32)
+            norms = np.linalg.norm(features, axis=1)
+        
+        codes = cls._hash(planes, features)
+        order = np.argsort(codes, axis=1, kind="stable")
+        sorted_codes = np.take_along_axis(codes, order, axis=1)
+        
+        return cls(
+            user_ids=np.asarray(user_ids, dtype=np.int64),
+            planes=planes,
+            codes=sorted_codes,
+            order=order.astype(np.int64),
+            features=features,
+            norms=norms.astype(np.float32)
+        )
+    
+    def save(self, directory: str):
+        """Guarda el índice como un .npy por array (sin pickle)"""
+        arrays = {
+            "user_ids": self.user_ids,
+            "planes": self.planes,
+            "codes": self.codes,
+            "order": self.order,
+            "norms": self.norms,
+        }
+        if issparse(self.features):
+            arrays.update(
+                data=self.features.data,
+                indices=self.features.indices,
+                indptr=self.features.indptr,
+                shape=np.array(self.features.shape),
+            )
+        else:
+            arrays["features"] = self.features
+        os.makedirs(directory, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+    
+    @classmethod
+    def load(cls, directory: str) -> "UserNeighborIndex":
+        """Abre el índice con mmap: solo se leen las páginas que tocan las consultas"""
+        def array(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        
+        if os.path.exists(os.path.join(directory, "features.npy")):
+            features = array("features")
+        else:
+            features = csr_matrix(
+                (array("data"), array("indices"), array("indptr")), shape=tuple(array("shape"))
+            )
+        return cls(
+            user_ids=array("user_ids"),
+            planes=array("planes"),
+            codes=array("codes"),
+            order=array("order"),
+            features=features,
+            norms=array("norms")
+        )
+    
+    def query(self, vector: np.ndarray, k: int = 20,
+              exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Usuarios más parecidos a un vector de features escalado
+        
+        Args:
+            vector: Features del usuario, escaladas como en el entrenamiento
+            k: Cantidad de vecinos
+            exclude: ID de usuario a excluir (normalmente el propio usuario)
+        
+        Returns:
+            Lista de (idUsuario, similitud coseno) ordenada de mayor a menor
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        query_norm = float(np.linalg.norm(vector))
+        if query_norm == 0:
+            return []
+        
+        codes = self._hash(self.planes, vector)[:, 0]
+        rows = []
+        for t, code in enumerate(codes):
+            start = np.searchsorted(self.codes[t], code, side="left")
+            end = np.searchsorted(self.codes[t], code, side="right")
+            rows.append(self.order[t, start:min(end, start + MAX_BUCKET_CANDIDATES)])
+        rows = np.unique(np.concatenate(rows))
+        if exclude is not None:
+            rows = rows[self.user_ids[rows] != exclude]
+        if len(rows) == 0:
+            return []
+        
+        dots = np.asarray(self.features[rows] @ vector.ravel()).ravel()
+        denom = self.norms[rows] * query_norm
+        sims = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+        
+        if len(rows) > k:
+            top = np.argpartition(-sims, k)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(self.user_ids[rows[i]]), float(sims[i])) for i in top if sims[i] > 0]
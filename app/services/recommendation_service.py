@@ -5,27 +5,434 @@ Sistema simple para usuarios nuevos usando solo:
 - Preferencias de lenguajes
 - Nivel del usuario
 """
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+from datetime import datetime
+from sqlalchemy import select, union_all, func, exists
 from sqlalchemy.orm import Session, selectinload
 from app.models.usuario import Usuario
 from app.models.libro import Libro, LibroCategoria, LibroLenguaje, AutorLibro
-from app.models.preferencia import Categoria, Lenguaje
+from app.models.lectura import Lectura, EstadoLectura
+from app.models.preferencia import (
+    Categoria,
+    Lenguaje,
+    Preferencia,
+    PreferenciaCategoria,
+    PreferenciaLenguaje
+)
 from app.models.nivel import Nivel
 from app.models import EstadoUsuario
+from app.services.collaborative_service import collaborative_service, ESTADO_WEIGHTS
+from app.services.content_service import content_service
+from app.services.neighbor_index import UserNeighborIndex
+from app.services.retraining_scheduler import retraining_scheduler
+from app.utils.cache import TTLCache
 import numpy as np
-from sklearn.cluster import KMeans
+from scipy.sparse import csr_matrix
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
 import joblib
+import json
 import os
+import shutil
+import threading
+import time
+
+
+# Modos de entrenamiento soportados por train_model
+TRAINING_MODES = ("dense", "sparse")
+
+# Artefactos de cada versión del modelo
+MODEL_FILE = "kmeans_model.pkl"
+SCALER_FILE = "scaler.pkl"
+USER_IDS_FILE = "cluster_user_ids.npy"
+ASSIGNMENTS_FILE = "cluster_assignments.npy"
+CENTROIDS_FILE = "centroids.npy"
+VERSION_FILE = "model_version.json"
+CANDIDATES_FILE = "cluster_candidates.npz"
+DELTAS_FILE = "user_clusters_deltas.jsonl"
+NEIGHBORS_DIR = "user_neighbors"
+
+# Mapa usuario -> cluster pickleado de los modelos anteriores (solo lectura)
+LEGACY_CLUSTERS_FILE = "user_clusters.npy"
+
+# Puntero a la versión activa y directorio de versiones
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+# Versiones anteriores que se conservan en disco tras cada entrenamiento
+MODEL_VERSIONS_TO_KEEP = 3
+
+# Libros candidatos precalculados por cluster al entrenar
+CANDIDATES_PER_CLUSTER = 500
+
+# Peso de la popularidad (lecturas dentro del cluster) frente a la
+# coincidencia de categorías/lenguajes al rankear candidatos
+POPULARITY_WEIGHT = 0.5
+
+# Pesos al mezclar el ranking del cluster con las demás señales; se
+# normalizan por la suma de las señales disponibles para cada usuario.
+# Se configuran por entorno (RECOMMENDATIONS_*_WEIGHT) para ajustarlos con
+# lecturas reales. benchmarks/recommendations.py --pesos compara
+# combinaciones, pero su catálogo sintético arma títulos, sinopsis y lecturas
+# desde el mismo perfil y favorece al contenido: no sirve para fijarlos.
+CLUSTER_WEIGHT = float(os.getenv("RECOMMENDATIONS_CLUSTER_WEIGHT", "0.6"))
+
+# Peso de la señal colaborativa item-item
+COLLABORATIVE_WEIGHT = float(os.getenv("RECOMMENDATIONS_COLLABORATIVE_WEIGHT", "0.4"))
+
+# Peso de la similitud de contenido (titulo + sinopsis) con el historial
+CONTENT_WEIGHT = float(os.getenv("RECOMMENDATIONS_CONTENT_WEIGHT", "0.3"))
+
+# Peso de las lecturas de los usuarios más parecidos (índice de vecinos) y
+# cantidad de vecinos consultados por usuario
+NEIGHBOUR_WEIGHT = float(os.getenv("RECOMMENDATIONS_NEIGHBOUR_WEIGHT", "0.3"))
+NEIGHBOURS_K = 50
+
+# Usuarios por bloque en las recomendaciones por lote
+BATCH_CHUNK_SIZE = 500
+
+# Caché de resultados por usuario (la invalidación por eventos es local a cada
+# worker; el TTL acota cuánto puede quedar desactualizado otro worker)
+RESULTS_CACHE_SIZE = int(os.getenv("RECOMMENDATIONS_CACHE_SIZE", "10000"))
+RESULTS_CACHE_TTL = float(os.getenv("RECOMMENDATIONS_CACHE_TTL", "300"))
+
+
+class ClusterAssignments:
+    """
+    Mapa usuario -> cluster como arrays planos
+    
+    user_ids (int32, ordenado) y clusters (int16) se abren con
+    np.load(mmap_mode='r'): los workers comparten las páginas a través de la
+    caché del sistema operativo y la búsqueda es binaria. Las asignaciones
+    incrementales (log de deltas) van en un dict aparte que tiene prioridad.
+    """
+    
+    def __init__(self, user_ids: np.ndarray, clusters: np.ndarray):
+        self.user_ids = user_ids
+        self.clusters = clusters
+        self.overrides: Dict[int, int] = {}
+        self._counts: Optional[np.ndarray] = None
+        # Usuarios del mapa base con asignación incremental, por cluster base:
+        # su pertenencia la decide el override, no el conteo precalculado
+        self._overridden: Dict[int, int] = {}
+    
+    @classmethod
+    def from_dict(cls, mapping: Dict[int, int]) -> "ClusterAssignments":
+        """Convierte un mapa {usuario: cluster} (formato pickleado anterior)"""
+        user_ids = np.fromiter(mapping.keys(), dtype=np.int32, count=len(mapping))
+        clusters = np.fromiter(mapping.values(), dtype=np.int16, count=len(mapping))
+        order = np.argsort(user_ids)
+        return cls(user_ids[order], clusters[order])
+    
+    def _base_get(self, usuario_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.user_ids, usuario_id))
+        if pos < len(self.user_ids) and self.user_ids[pos] == usuario_id:
+            return int(self.clusters[pos])
+        return None
+    
+    def get(self, usuario_id: int) -> Optional[int]:
+        """Cluster del usuario o None si no estaba al entrenar ni se asignó después"""
+        if usuario_id in self.overrides:
+            return self.overrides[usuario_id]
+        return self._base_get(usuario_id)
+    
+    def __setitem__(self, usuario_id: int, cluster: int):
+        if usuario_id not in self.overrides:
+            base = self._base_get(usuario_id)
+            if base is not None:
+                self._overridden[base] = self._overridden.get(base, 0) + 1
+        self.overrides[usuario_id] = cluster
+    
+    def __len__(self) -> int:
+        nuevos = sum(1 for uid in self.overrides if self._base_get(uid) is None)
+        return len(self.user_ids) + nuevos
+    
+    def has_other_members(self, cluster: int, usuario_id: int) -> bool:
+        """
+        Indica si algún otro usuario pertenece al cluster
+        
+        Cuenta las asignaciones incrementales y, del mapa base (conteo
+        precalculado), solo a los usuarios que no fueron reasignados.
+        """
+        if any(c == cluster and uid != usuario_id for uid, c in self.overrides.items()):
+            return True
+        if self._counts is None:
+            self._counts = np.bincount(self.clusters)
+        count = int(self._counts[cluster]) if cluster < len(self._counts) else 0
+        count -= self._overridden.get(cluster, 0)
+        if usuario_id not in self.overrides and self._base_get(usuario_id) == cluster:
+            count -= 1
+        return count > 0
+
+
+class ModelSnapshot:
+    """Modelo K-Means, scaler y mapa de clusters cargados juntos en memoria"""
+    
+    def __init__(self, kmeans, scaler, assignments: ClusterAssignments,
+                 version: str, signature: Tuple, loaded_at: datetime,
+                 metadata: Optional[Dict] = None,
+                 candidate_ids: Optional[np.ndarray] = None,
+                 candidate_offsets: Optional[np.ndarray] = None,
+                 directory: str = "models",
+                 neighbor_index: Optional[UserNeighborIndex] = None,
+                 centroids: Optional[np.ndarray] = None):
+        self.kmeans = kmeans
+        self.scaler = scaler
+        self.assignments = assignments
+        self.version = version
+        self.signature = signature
+        self.loaded_at = loaded_at
+        self.metadata = metadata or {}
+        self.candidate_ids = candidate_ids
+        self.candidate_offsets = candidate_offsets
+        self.directory = directory
+        self.neighbor_index = neighbor_index
+        
+        # Parámetros del scaler y centroides como arrays planos para predecir
+        # un solo usuario sin el overhead de validación de sklearn
+        n_features = kmeans.cluster_centers_.shape[1]
+        self.n_features = n_features
+        mean = getattr(scaler, "mean_", None)
+        scale = getattr(scaler, "scale_", None)
+        self._mean = mean if getattr(scaler, "with_mean", True) and mean is not None else np.zeros(n_features)
+        self._scale = scale if scale is not None else np.ones(n_features)
+        self._centers = centroids if centroids is not None else kmeans.cluster_centers_
+        
+        # Índice id -> columna con el que se entrenó el modelo (si se registró)
+        self.categoria_col = None
+        self.lenguaje_col = None
+        if "categoria_ids" in self.metadata and "lenguaje_ids" in self.metadata:
+            categoria_ids = self.metadata["categoria_ids"]
+            self.categoria_col = {cid: i for i, cid in enumerate(categoria_ids)}
+            self.lenguaje_col = {lid: len(categoria_ids) + i
+                                 for i, lid in enumerate(self.metadata["lenguaje_ids"])}
+    
+    def cluster_candidates(self, cluster: int) -> Optional[np.ndarray]:
+        """Libros candidatos del cluster ya rankeados, o None si el modelo no los tiene"""
+        if self.candidate_ids is None or cluster + 1 >= len(self.candidate_offsets):
+            return None
+        return self.candidate_ids[self.candidate_offsets[cluster]:self.candidate_offsets[cluster + 1]]
+    
+    def scale(self, features: np.ndarray) -> np.ndarray:
+        """Escala un vector de features igual que el scaler del entrenamiento"""
+        return (features - self._mean) / self._scale
+    
+    def predict_one(self, features: np.ndarray) -> int:
+        """Asigna un vector de features (sin escalar) al centroide más cercano"""
+        scaled = self.scale(features)
+        distances = ((self._centers - scaled) ** 2).sum(axis=1)
+        return int(np.argmin(distances))
+
+
+class ModelRegistry:
+    """
+    Registro en memoria de los artefactos del modelo de recomendaciones
+    
+    Mantiene un snapshot (modelo + scaler + mapa de clusters) y solo lo
+    recarga cuando cambia la versión activa o el mtime/tamaño de sus
+    archivos. La recarga construye un snapshot nuevo y lo reemplaza de una
+    sola vez, por lo que las peticiones concurrentes nunca ven un modelo de
+    una versión con un scaler de otra.
+    
+    train_model escribe cada entrenamiento en models/versions/<versión>/ y
+    luego cambia el puntero models/CURRENT; si no existe el puntero se usan
+    los archivos planos de models/ (modelos entrenados antes del versionado).
+    
+    Las asignaciones incrementales de usuarios (ver assign_user_cluster) se
+    agregan a un log de deltas de la versión que cada worker lee desde su
+    último offset, sin recargar el modelo completo.
+    """
+    
+    def __init__(self, models_dir: str, check_interval: float = 1.0):
+        self.models_dir = models_dir
+        self.current_path = os.path.join(models_dir, CURRENT_FILE)
+        self.check_interval = check_interval
+        self._snapshot: Optional[ModelSnapshot] = None
+        self._deltas_offset = 0
+        self._deltas_count = 0
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+    
+    def current_directory(self) -> str:
+        """Directorio de la versión activa (según CURRENT) o el directorio plano"""
+        try:
+            with open(self.current_path) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            version = ""
+        if version:
+            return os.path.join(self.models_dir, VERSIONS_DIR, version)
+        return self.models_dir
+    
+    def _file_signature(self, directory: str) -> Optional[Tuple]:
+        """Firma (directorio, mtime, tamaño) de los artefactos; None si falta alguno obligatorio"""
+        signature = [directory]
+        for name in (MODEL_FILE, SCALER_FILE, USER_IDS_FILE, ASSIGNMENTS_FILE, CENTROIDS_FILE,
+                     LEGACY_CLUSTERS_FILE, VERSION_FILE, CANDIDATES_FILE, NEIGHBORS_DIR):
+            try:
+                stat = os.stat(os.path.join(directory, name))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                if name in (MODEL_FILE, SCALER_FILE):
+                    return None
+                signature.append(None)
+        return tuple(signature)
+    
+    def _read_metadata(self, directory: str, signature: Tuple) -> Dict:
+        """Metadatos escritos por train_model; la versión se deriva del mtime si faltan"""
+        try:
+            with open(os.path.join(directory, VERSION_FILE)) as f:
+                metadata = json.load(f)
+            metadata["version"] = str(metadata["version"])
+            return metadata
+        except (OSError, ValueError, KeyError):
+            return {"version": f"mtime-{signature[1][0]}"}
+    
+    def _load(self, directory: str, signature: Tuple) -> ModelSnapshot:
+        kmeans = joblib.load(os.path.join(directory, MODEL_FILE))
+        scaler = joblib.load(os.path.join(directory, SCALER_FILE))
+        user_ids_path = os.path.join(directory, USER_IDS_FILE)
+        legacy_path = os.path.join(directory, LEGACY_CLUSTERS_FILE)
+        centroids = None
+        if os.path.exists(user_ids_path):
+            assignments = ClusterAssignments(
+                np.load(user_ids_path, mmap_mode="r"),
+                np.load(os.path.join(directory, ASSIGNMENTS_FILE), mmap_mode="r")
+            )
+            centroids = np.load(os.path.join(directory, CENTROIDS_FILE), mmap_mode="r")
+        elif os.path.exists(legacy_path):
+            assignments = ClusterAssignments.from_dict(np.load(legacy_path, allow_pickle=True).item())
+        else:
+            assignments = ClusterAssignments.from_dict({})
+        
+        candidate_ids = candidate_offsets = None
+        candidates_path = os.path.join(directory, CANDIDATES_FILE)
+        if os.path.exists(candidates_path):
+            with np.load(candidates_path) as candidates:
+                candidate_ids = candidates["ids"]
+                candidate_offsets = candidates["offsets"]
+        
+        neighbor_index = None
+        neighbors_path = os.path.join(directory, NEIGHBORS_DIR)
+        if os.path.exists(neighbors_path):
+            neighbor_index = UserNeighborIndex.load(neighbors_path)
+        
+        metadata = self._read_metadata(directory, signature)
+        return ModelSnapshot(
+            kmeans=kmeans,
+            scaler=scaler,
+            assignments=assignments,
+            version=metadata["version"],
+            signature=signature,
+            loaded_at=datetime.utcnow(),
+            metadata=metadata,
+            candidate_ids=candidate_ids,
+            candidate_offsets=candidate_offsets,
+            directory=directory,
+            neighbor_index=neighbor_index,
+            centroids=centroids
+        )
+    
+    def _apply_deltas(self, snapshot: ModelSnapshot):
+        """Aplica las asignaciones incrementales escritas desde el último offset leído"""
+        try:
+            with open(os.path.join(snapshot.directory, DELTAS_FILE)) as f:
+                f.seek(self._deltas_offset)
+                lines = f.readlines()
+                self._deltas_offset = f.tell()
+        except FileNotFoundError:
+            self._deltas_offset = 0
+            self._deltas_count = 0
+            return
+        
+        for line in lines:
+            try:
+                delta = json.loads(line)
+            except ValueError:
+                continue
+            # Solo las asignaciones hechas con este mismo modelo son válidas
+            if delta.get("v") == snapshot.version:
+                snapshot.assignments[int(delta["u"])] = int(delta["c"])
+                self._deltas_count += 1
+    
+    def record_assignment(self, snapshot: ModelSnapshot, usuario_id: int, cluster: int):
+        """Actualiza el mapa en memoria y agrega la asignación al log de deltas"""
+        # Con el lock del registro: get() aplica deltas sobre el mismo mapa
+        with self._lock:
+            snapshot.assignments[usuario_id] = cluster
+            with open(os.path.join(snapshot.directory, DELTAS_FILE), "a") as f:
+                f.write(json.dumps({"v": snapshot.version, "u": usuario_id, "c": cluster}) + "\n")
+    
+    def get(self) -> Optional[ModelSnapshot]:
+        """
+        Retorna el snapshot actual, recargándolo si los archivos cambiaron
+        
+        Returns:
+            ModelSnapshot o None si todavía no hay un modelo entrenado
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._last_check < self.check_interval:
+            return snapshot
+        
+        with self._lock:
+            self._last_check = now
+            directory = self.current_directory()
+            signature = self._file_signature(directory)
+            if signature is None:
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.signature != signature:
+                snapshot = self._load(directory, signature)
+                self._deltas_offset = 0
+                self._deltas_count = 0
+                self._apply_deltas(snapshot)
+                self._snapshot = snapshot
+                print(f"✓ Modelo de recomendaciones cargado (versión {snapshot.version})")
+            else:
+                self._apply_deltas(self._snapshot)
+            return self._snapshot
+    
+    def pending_assignments(self) -> int:
+        """
+        Asignaciones incrementales de la versión activa hechas por todos los
+        workers (líneas del log de deltas); vuelve a 0 al publicar otra versión
+        """
+        if self.get() is None:
+            return 0
+        with self._lock:
+            self._apply_deltas(self._snapshot)
+            return self._deltas_count
+    
+    def invalidate(self):
+        """Fuerza la verificación de los archivos en la próxima llamada a get()"""
+        self._last_check = 0.0
+    
+    def info(self) -> Dict:
+        """Información del modelo cargado para el endpoint de administración"""
+        snapshot = self.get()
+        if snapshot is None:
+            return {"loaded": False}
+        
+        return {
+            "loaded": True,
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at.isoformat(),
+            "n_clusters": int(snapshot.kmeans.n_clusters),
+            "algoritmo": type(snapshot.kmeans).__name__,
+            "usuarios_en_mapa": len(snapshot.assignments),
+        }
 
 
 class RecommendationService:
     """Servicio de recomendaciones con K-Means"""
     
     def __init__(self):
-        self.model_path = "models/kmeans_model.pkl"
-        self.scaler_path = "models/scaler.pkl"
-        self.clusters_path = "models/user_clusters.npy"
+        self.models_dir = "models"
+        self.registry = ModelRegistry(self.models_dir)
+        self.results_cache = TTLCache(maxsize=RESULTS_CACHE_SIZE, ttl=RESULTS_CACHE_TTL)
+        # Generación por usuario: invalidar la incrementa y deja inalcanzables
+        # sus entradas anteriores (las desaloja el LRU)
+        self._cache_generations: Dict[int, int] = {}
     
     def extract_user_features(self, usuario: Usuario, db: Session) -> np.ndarray:
         """
@@ -65,60 +472,428 @@ class RecommendationService:
         
         return np.array(feature_vector)
     
-    def train_model(self, db: Session, n_clusters: int = 5):
+    def _filter_usuarios(self, query, usuario_ids: Optional[List[int]]):
+        """Restringe una query a los usuarios indicados o, si es None, a los activos"""
+        if usuario_ids is None:
+            return query.filter(Usuario.estado == EstadoUsuario.ACTIVO)
+        return query.filter(Usuario.idUsuario.in_(usuario_ids))
+    
+    def _feature_columns(self, db: Session) -> Tuple[List[int], List[int]]:
+        """Ids de categorías y lenguajes en el orden de las columnas de features"""
+        categoria_ids = [cid for (cid,) in db.query(Categoria.idCategoria).order_by(Categoria.idCategoria)]
+        lenguaje_ids = [lid for (lid,) in db.query(Lenguaje.idLenguaje).order_by(Lenguaje.idLenguaje)]
+        return categoria_ids, lenguaje_ids
+    
+    def build_feature_matrix(self, db: Session, usuario_ids: Optional[List[int]] = None,
+                             sparse: bool = False,
+                             columns: Optional[Tuple[List[int], List[int]]] = None
+                             ) -> Tuple[List[int], Union[np.ndarray, csr_matrix]]:
         """
-        Entrena el modelo K-Means con todos los usuarios
+        Construye la matriz de features de muchos usuarios en bloque
+        
+        Produce las mismas filas que extract_user_features, pero con tres
+        consultas set-based (usuario+nivel, pares usuario-categoría y pares
+        usuario-lenguaje) en lugar de varias consultas por usuario, y llena la
+        matriz en una sola pasada usando un índice id -> columna.
         
         Args:
             db: Sesión de base de datos
-            n_clusters: Número de clusters (default: 5)
+            usuario_ids: Usuarios a incluir (default: todos los activos)
+            sparse: Si es True retorna una matriz CSR en lugar de un array denso
+            columns: (categoria_ids, lenguaje_ids) de un modelo ya entrenado; las
+                categorías o lenguajes creados después se ignoran (default: los actuales)
+            
+        Returns:
+            Tuple[List[int], matriz]: (ids de usuario por fila, matriz de features)
         """
-        print("Entrenando modelo de recomendaciones...")
+        # Índice id -> columna (mismo orden que extract_user_features)
+        categoria_ids, lenguaje_ids = columns if columns is not None else self._feature_columns(db)
+        categoria_col = {cid: i for i, cid in enumerate(categoria_ids)}
+        lenguaje_col = {lid: len(categoria_ids) + i for i, lid in enumerate(lenguaje_ids)}
+        nivel_col = len(categoria_ids) + len(lenguaje_ids)
+        n_cols = nivel_col + 1
         
-        # Obtener todos los usuarios activos
-        usuarios = db.query(Usuario).filter(Usuario.estado == EstadoUsuario.ACTIVO).all()
+        # 1. Usuarios con su nivel (outer join: usuarios sin preferencias quedan en ceros)
+        usuarios_rows = self._filter_usuarios(
+            db.query(Usuario.idUsuario, Preferencia.idPreferencias, Preferencia.idNivel)
+            .outerjoin(Preferencia, Preferencia.idUsuario == Usuario.idUsuario),
+            usuario_ids
+        ).order_by(Usuario.idUsuario).all()
         
-        if len(usuarios) < n_clusters:
-            print(f"Advertencia: Solo hay {len(usuarios)} usuarios, ajustando clusters a {len(usuarios)}")
-            n_clusters = max(2, len(usuarios))
+        user_ids = [row.idUsuario for row in usuarios_rows]
+        row_index = {uid: i for i, uid in enumerate(user_ids)}
         
-        # Extraer features de todos los usuarios
-        user_ids = []
-        feature_vectors = []
+        # 2 y 3. Pares (usuario, categoría) y (usuario, lenguaje)
+        categoria_pairs = self._filter_usuarios(
+            db.query(Preferencia.idUsuario, PreferenciaCategoria.idCategoria)
+            .join(PreferenciaCategoria, PreferenciaCategoria.idPreferencias == Preferencia.idPreferencias)
+            .join(Usuario, Usuario.idUsuario == Preferencia.idUsuario),
+            usuario_ids
+        ).all()
+        lenguaje_pairs = self._filter_usuarios(
+            db.query(Preferencia.idUsuario, PreferenciaLenguaje.idLenguaje)
+            .join(PreferenciaLenguaje, PreferenciaLenguaje.idPreferencias == Preferencia.idPreferencias)
+            .join(Usuario, Usuario.idUsuario == Preferencia.idUsuario),
+            usuario_ids
+        ).all()
         
-        for usuario in usuarios:
-            user_ids.append(usuario.idUsuario)
-            features = self.extract_user_features(usuario, db)
-            feature_vectors.append(features)
+        # Celdas one-hot; se deduplican porque las tablas intermedias no
+        # tienen restricción única y en CSR los duplicados se sumarían
+        one_hot_keys = [np.empty(0, dtype=np.int64)]
+        for pairs, column_index in ((categoria_pairs, categoria_col), (lenguaje_pairs, lenguaje_col)):
+            if pairs:
+                one_hot_keys.append(np.fromiter(
+                    (row_index[uid] * n_cols + column_index[cid] for uid, cid in pairs
+                     if cid in column_index),
+                    dtype=np.int64
+                ))
+        one_hot_keys = np.unique(np.concatenate(one_hot_keys))
         
-        X = np.array(feature_vectors)
+        # Nivel normalizado, solo para usuarios con preferencias
+        nivel_rows = [i for i, row in enumerate(usuarios_rows) if row.idPreferencias is not None]
+        nivel_values = [usuarios_rows[i].idNivel / 3.0 if usuarios_rows[i].idNivel else 0.33
+                        for i in nivel_rows]
         
-        # Normalizar features
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        rows = np.concatenate([one_hot_keys // n_cols, np.asarray(nivel_rows, dtype=np.int64)])
+        cols = np.concatenate([one_hot_keys % n_cols, np.full(len(nivel_rows), nivel_col, dtype=np.int64)])
+        values = np.concatenate([np.ones(len(one_hot_keys)), np.asarray(nivel_values, dtype=np.float64)])
+        shape = (len(user_ids), n_cols)
         
-        # Entrenar K-Means
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(X_scaled)
+        if sparse:
+            return user_ids, csr_matrix((values, (rows, cols)), shape=shape)
+        
+        X = np.zeros(shape)
+        X[rows, cols] = values
+        return user_ids, X
+    
+    def train_model(self, db: Session, n_clusters: int = 5, modo: str = "dense",
+                    batch_size: int = 1024):
+        """
+        Entrena el modelo K-Means con todos los usuarios
         
-        # Crear directorio de modelos si no existe
-        os.makedirs("models", exist_ok=True)
+        Args:
+            db: Sesión de base de datos
+            n_clusters: Número de clusters (default: 5)
+            modo: "dense" (StandardScaler + KMeans) o "sparse" (features CSR,
+                scaler sin centrado + MiniBatchKMeans, memoria acotada)
+            batch_size: Tamaño de lote de MiniBatchKMeans en modo "sparse"
+        """
+        if modo not in TRAINING_MODES:
+            raise ValueError(f"Modo de entrenamiento inválido: {modo}. Use uno de {TRAINING_MODES}")
         
-        # Guardar modelo y scaler
-        joblib.dump(kmeans, self.model_path)
-        joblib.dump(scaler, self.scaler_path)
+        print(f"Entrenando modelo de recomendaciones (modo {modo})...")
         
-        # Guardar clusters de usuarios
+        # Extraer features de todos los usuarios activos en bloque
+        # Las mismas columnas para la matriz y para los metadatos del modelo
+        categoria_ids, lenguaje_ids = self._feature_columns(db)
+        user_ids, X = self.build_feature_matrix(
+            db, sparse=(modo == "sparse"), columns=(categoria_ids, lenguaje_ids)
+        )
+        
+        if len(user_ids) < n_clusters:
+            print(f"Advertencia: Solo hay {len(user_ids)} usuarios, ajustando clusters a {len(user_ids)}")
+            n_clusters = max(2, len(user_ids))
+        
+        if modo == "sparse":
+            # Sin centrado para no densificar la matriz CSR
+            scaler = StandardScaler(with_mean=False)
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3,
+                                     batch_size=batch_size)
+        else:
+            scaler = StandardScaler()
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        
+        # Normalizar features y entrenar K-Means
+        X_scaled = scaler.fit_transform(X)
+        clusters = kmeans.fit_predict(X_scaled)
+        
+        version = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
         user_cluster_map = {user_id: int(cluster) 
                            for user_id, cluster in zip(user_ids, clusters)}
-        np.save(self.clusters_path, user_cluster_map)
         
-        print(f"✓ Modelo entrenado con {len(usuarios)} usuarios en {n_clusters} clusters")
-        print(f"✓ Modelo guardado en: {self.model_path}")
+        # Candidatos rankeados por cluster
+        candidate_ids, candidate_offsets = self.build_cluster_candidates(
+            db, user_ids, X, clusters, n_clusters, categoria_ids, lenguaje_ids
+        )
+        
+        version_info = {
+            "version": version,
+            "n_clusters": n_clusters,
+            "usuarios": len(user_ids),
+            "modo": modo,
+            # Columnas de features, para asignar usuarios sin consultar la BD
+            "categoria_ids": categoria_ids,
+            "lenguaje_ids": lenguaje_ids,
+        }
+        
+        # Todos los artefactos se escriben en un directorio temporal que se
+        # publica con un rename; luego se mueve el puntero CURRENT. Los workers
+        # siguen sirviendo la versión anterior hasta ver el puntero nuevo.
+        versions_dir = os.path.join(self.models_dir, VERSIONS_DIR)
+        version_dir = os.path.join(versions_dir, version)
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        joblib.dump(kmeans, os.path.join(tmp_dir, MODEL_FILE))
+        joblib.dump(scaler, os.path.join(tmp_dir, SCALER_FILE))
+        # Mapa usuario -> cluster y centroides como arrays planos (mmap, sin pickle)
+        order = np.argsort(user_ids)
+        np.save(os.path.join(tmp_dir, USER_IDS_FILE), np.asarray(user_ids, dtype=np.int32)[order])
+        np.save(os.path.join(tmp_dir, ASSIGNMENTS_FILE), np.asarray(clusters, dtype=np.int16)[order])
+        np.save(os.path.join(tmp_dir, CENTROIDS_FILE), kmeans.cluster_centers_.astype(np.float32))
+        np.savez(
+            os.path.join(tmp_dir, CANDIDATES_FILE),
+            ids=candidate_ids, offsets=candidate_offsets
+        )
+        # Índice de vecinos sobre las mismas features escaladas
+        UserNeighborIndex.build(user_ids, X_scaled).save(os.path.join(tmp_dir, NEIGHBORS_DIR))
+        self._dump_json(version_info, os.path.join(tmp_dir, VERSION_FILE))
+        os.replace(tmp_dir, version_dir)
+        
+        self._atomic_write(
+            self.registry.current_path,
+            lambda path: self._write_text(version, path)
+        )
+        self._prune_versions(versions_dir, keep=version)
+        
+        self.registry.invalidate()
+        self.results_cache.clear()
+        
+        # Matriz item-item de "también leyeron" con el historial actual
+        try:
+            collaborative_service.build(db)
+        except Exception as e:
+            print(f"⚠️ Error al construir la matriz de co-ocurrencia: {e}")
+        
+        # Índice de contenido completo (recalcula el IDF con todo el catálogo)
+        try:
+            content_service.build(db)
+        except Exception as e:
+            print(f"⚠️ Error al construir el índice de contenido: {e}")
+        
+        print(f"✓ Modelo entrenado con {len(user_ids)} usuarios en {n_clusters} clusters")
+        print(f"✓ Modelo guardado en: {version_dir}")
         
         return user_cluster_map
     
-    def get_user_cluster(self, usuario: Usuario, db: Session) -> int:
+    def build_cluster_candidates(self, db: Session, user_ids: List[int], X, clusters: np.ndarray,
+                                 n_clusters: int, categoria_ids: List[int],
+                                 lenguaje_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rankea los libros de cada cluster para servir recomendaciones sin consultas IN
+        
+        El puntaje de un libro en un cluster combina:
+        - Coincidencia: fracción promedio de usuarios del cluster que prefieren
+          cada categoría/lenguaje del libro (perfil del cluster · tags del libro)
+        - Popularidad: lecturas del libro hechas por usuarios del cluster
+          (log-normalizada al rango 0-1 dentro del cluster)
+        
+        Args:
+            db: Sesión de base de datos
+            user_ids: IDs de usuario por fila de X
+            X: Matriz de features usada para entrenar (densa o CSR)
+            clusters: Cluster asignado a cada fila de X
+            n_clusters: Número de clusters
+            categoria_ids: Ids de categorías en el orden de columnas de X
+            lenguaje_ids: Ids de lenguajes en el orden de columnas de X
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (ids de libros concatenados por cluster,
+            offsets de inicio de cada cluster, con n_clusters + 1 elementos)
+        """
+        n_tags = len(categoria_ids) + len(lenguaje_ids)
+        
+        # Perfil de cada cluster: promedio de las columnas one-hot de sus usuarios
+        perfiles = np.zeros((n_clusters, n_tags))
+        for k in range(n_clusters):
+            miembros = np.flatnonzero(clusters == k)
+            if len(miembros):
+                perfiles[k] = np.asarray(X[miembros, :n_tags].mean(axis=0)).ravel()
+        
+        # Matriz libros x tags con las mismas columnas que los usuarios
+        libro_ids = np.array([lid for (lid,) in db.query(Libro.idLibro).order_by(Libro.idLibro)],
+                             dtype=np.int64)
+        libro_row = {lid: i for i, lid in enumerate(libro_ids.tolist())}
+        tag_col = {("c", cid): i for i, cid in enumerate(categoria_ids)}
+        tag_col.update({("l", lid): len(categoria_ids) + i for i, lid in enumerate(lenguaje_ids)})
+        
+        celdas = set()
+        for idLibro, idCategoria in db.query(LibroCategoria.idLibro, LibroCategoria.idCategoria):
+            col = tag_col.get(("c", idCategoria))
+            if col is not None and idLibro in libro_row:
+                celdas.add((libro_row[idLibro], col))
+        for idLibro, idLenguaje in db.query(LibroLenguaje.idLibro, LibroLenguaje.idLenguaje):
+            col = tag_col.get(("l", idLenguaje))
+            if col is not None and idLibro in libro_row:
+                celdas.add((libro_row[idLibro], col))
+        
+        rows = np.fromiter((r for r, _ in celdas), dtype=np.int64, count=len(celdas))
+        cols = np.fromiter((c for _, c in celdas), dtype=np.int64, count=len(celdas))
+        libros_tags = csr_matrix((np.ones(len(celdas)), (rows, cols)), shape=(len(libro_ids), n_tags))
+        
+        # Coincidencia (libros x clusters)
+        coincidencia = np.asarray(libros_tags @ perfiles.T)
+        
+        # Popularidad: lecturas por (cluster, libro)
+        user_cluster = {uid: int(c) for uid, c in zip(user_ids, clusters)}
+        lecturas = np.zeros((n_clusters, len(libro_ids)))
+        pares = [(user_cluster[uid], libro_row[lid])
+                 for uid, lid in db.query(Lectura.idUsuario, Lectura.idLibro)
+                 if uid in user_cluster and lid in libro_row]
+        if pares:
+            pares = np.array(pares, dtype=np.int64)
+            np.add.at(lecturas, (pares[:, 0], pares[:, 1]), 1)
+        popularidad = np.log1p(lecturas)
+        maximos = popularidad.max(axis=1, keepdims=True)
+        popularidad = np.divide(popularidad, maximos, out=np.zeros_like(popularidad), where=maximos > 0)
+        
+        ids_por_cluster = []
+        offsets = [0]
+        for k in range(n_clusters):
+            puntaje = coincidencia[:, k] + POPULARITY_WEIGHT * popularidad[k]
+            relevantes = np.flatnonzero(puntaje > 0)
+            # Orden por puntaje descendente; empates, el libro más nuevo primero
+            orden = relevantes[np.lexsort((-libro_ids[relevantes], -puntaje[relevantes]))]
+            top = libro_ids[orden[:CANDIDATES_PER_CLUSTER]]
+            ids_por_cluster.append(top)
+            offsets.append(offsets[-1] + len(top))
+        
+        return (np.concatenate(ids_por_cluster).astype(np.int64) if ids_por_cluster else np.empty(0, dtype=np.int64),
+                np.array(offsets, dtype=np.int64))
+    
+    @staticmethod
+    def _atomic_write(path: str, writer):
+        """Escribe un archivo en una ruta temporal y lo mueve a su destino con os.replace"""
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.tmp-{os.getpid()}{ext}"
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _write_text(text: str, path: str):
+        with open(path, "w") as f:
+            f.write(text)
+    
+    @staticmethod
+    def _prune_versions(versions_dir: str, keep: str):
+        """Elimina las versiones más antiguas, conservando MODEL_VERSIONS_TO_KEEP"""
+        versions = sorted(
+            name for name in os.listdir(versions_dir)
+            if ".tmp-" not in name and os.path.isdir(os.path.join(versions_dir, name))
+        )
+        for name in versions[:-MODEL_VERSIONS_TO_KEEP]:
+            if name != keep:
+                shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    
+    @staticmethod
+    def _dump_json(data: Dict, path: str):
+        with open(path, "w") as f:
+            json.dump(data, f)
+    
+    def get_model_snapshot(self) -> Optional[ModelSnapshot]:
+        """
+        Retorna el modelo en memoria, o None si todavía no se publicó ninguno
+        
+        Sin modelo se encola el primer entrenamiento en el pool de procesos del
+        scheduler (con el lock entre workers) y quien llama responde con el
+        fallback hasta que la versión se publique; nunca se entrena en la
+        petición.
+        """
+        snapshot = self.registry.get()
+        if snapshot is None:
+            retraining_scheduler.request_initial_training()
+        return snapshot
+    
+    def assign_user_cluster(self, usuario_id: int, preferencia: Optional[Preferencia]) -> Optional[int]:
+        """
+        Asigna (o reasigna) incrementalmente el cluster de un usuario
+        
+        Se llama desde las rutas de preferencias después de crear, actualizar
+        o eliminar. Construye el vector de features con las columnas guardadas
+        al entrenar y predice con los centroides en memoria, sin consultas
+        extra ni reentrenamiento. La asignación se persiste en el log de deltas
+        para que la vean los demás workers.
+        
+        Args:
+            usuario_id: ID del usuario
+            preferencia: Preferencias actuales del usuario (None si se eliminaron)
+            
+        Returns:
+            int: Cluster asignado, o None si no hay modelo entrenado
+        """
+        snapshot = self.registry.get()
+        if snapshot is None or snapshot.categoria_col is None:
+            return None
+        
+        cluster = snapshot.predict_one(self._preference_features(snapshot, preferencia))
+        self.registry.record_assignment(snapshot, usuario_id, cluster)
+        return cluster
+    
+    @staticmethod
+    def _preference_features(snapshot: ModelSnapshot, preferencia: Optional[Preferencia]) -> np.ndarray:
+        """Vector de features (sin escalar) con las columnas con las que se entrenó el modelo"""
+        features = np.zeros(snapshot.n_features)
+        if preferencia is not None:
+            for pc in preferencia.preferencia_categorias:
+                col = snapshot.categoria_col.get(pc.idCategoria)
+                if col is not None:
+                    features[col] = 1
+            for pl in preferencia.preferencia_lenguajes:
+                col = snapshot.lenguaje_col.get(pl.idLenguaje)
+                if col is not None:
+                    features[col] = 1
+            features[-1] = preferencia.idNivel / 3.0 if preferencia.idNivel else 0.33
+        return features
+    
+    def find_similar_users(self, usuario_id: int, preferencia: Optional[Preferencia],
+                           k: int = NEIGHBOURS_K) -> List[Tuple[int, float]]:
+        """
+        Usuarios más parecidos según el índice de vecinos del modelo
+        
+        Usa las preferencias actuales (no las del entrenamiento), así que los
+        cambios recientes ya cuentan. La consulta revisa solo los buckets LSH
+        del usuario, no toda la base.
+        
+        Returns:
+            Lista de (idUsuario, similitud) o vacía si el modelo no tiene índice
+        """
+        snapshot = self.registry.get()
+        if snapshot is None or snapshot.neighbor_index is None or snapshot.categoria_col is None:
+            return []
+        
+        vector = snapshot.scale(self._preference_features(snapshot, preferencia))
+        return snapshot.neighbor_index.query(vector, k, exclude=usuario_id)
+    
+    def _neighbour_scores(self, vecinos_por_usuario: Dict[int, List[Tuple[int, float]]],
+                          db: Session, limit: int = 100) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Puntúa libros para cada usuario con las lecturas de sus vecinos
+        
+        El puntaje de un libro es la suma, sobre los vecinos que lo leyeron, de
+        similitud del vecino x peso del estado de la lectura. Las lecturas de
+        todos los vecinos se leen en una sola consulta.
+        """
+        vecino_ids = {vid for vecinos in vecinos_por_usuario.values() for vid, _ in vecinos}
+        if not vecino_ids:
+            return {}
+        
+        lecturas_vecinos: Dict[int, List[Tuple[int, float]]] = {}
+        for vid, lid, estado in (
+            db.query(Lectura.idUsuario, Lectura.idLibro, Lectura.estado)
+            .filter(Lectura.idUsuario.in_(vecino_ids))
+        ):
+            lecturas_vecinos.setdefault(vid, []).append((lid, ESTADO_WEIGHTS.get(estado, 0.0)))
+        
+        resultados = {}
+        for uid, vecinos in vecinos_por_usuario.items():
+            puntajes: Dict[int, float] = {}
+            for vid, similitud in vecinos:
+                for lid, peso in lecturas_vecinos.get(vid, ()):
+                    puntajes[lid] = puntajes.get(lid, 0.0) + similitud * peso
+            ordenados = sorted(puntajes.items(), key=lambda item: item[1], reverse=True)[:limit]
+            resultados[uid] = [(lid, score) for lid, score in ordenados if score > 0]
+        return resultados
+    
+    def get_user_cluster(self, usuario: Usuario, db: Session) -> Optional[int]:
         """
         Obtiene el cluster del usuario usando el modelo entrenado
         
@@ -127,29 +902,60 @@ class RecommendationService:
             db: Sesión de base de datos
             
         Returns:
-            int: ID del cluster
+            int: ID del cluster, o None si todavía no hay modelo entrenado
         """
-        # Cargar modelo y scaler
-        if not os.path.exists(self.model_path) or not os.path.exists(self.scaler_path):
-            print("Modelo no encontrado, entrenando...")
-            self.train_model(db)
+        # Modelo y scaler en memoria (se recargan solo si cambian los archivos)
+        snapshot = self.get_model_snapshot()
+        if snapshot is None:
+            return None
         
-        kmeans = joblib.load(self.model_path)
-        scaler = joblib.load(self.scaler_path)
+        # Usuarios entrenados o reasignados: búsqueda binaria en el mapa
+        cluster = snapshot.assignments.get(usuario.idUsuario)
+        if cluster is not None:
+            return cluster
         
-        # Extraer features del usuario
+        # Usuario nuevo: vector con las columnas guardadas al entrenar y
+        # centroides en memoria (solo se leen sus preferencias)
+        if snapshot.categoria_col is not None:
+            preferencia = (
+                db.query(Preferencia)
+                .options(
+                    selectinload(Preferencia.preferencia_categorias),
+                    selectinload(Preferencia.preferencia_lenguajes)
+                )
+                .filter(Preferencia.idUsuario == usuario.idUsuario)
+                .first()
+            )
+            return snapshot.predict_one(self._preference_features(snapshot, preferencia))
+        
+        # Modelos entrenados antes de guardar las columnas: extraer features del usuario
         user_features = self.extract_user_features(usuario, db)
-        user_features_scaled = scaler.transform([user_features])
+        user_features_scaled = snapshot.scaler.transform([user_features])
         
         # Predecir cluster
-        cluster = kmeans.predict(user_features_scaled)[0]
+        cluster = snapshot.kmeans.predict(user_features_scaled)[0]
         
         return int(cluster)
     
+    def invalidate_user(self, usuario_id: int):
+        """Descarta las recomendaciones cacheadas de un usuario (preferencias o lecturas cambiaron)"""
+        self._cache_generations[usuario_id] = self._cache_generations.get(usuario_id, 0) + 1
+    
+    def _cache_key(self, usuario_id: int, limit: int) -> Optional[Tuple]:
+        """Clave (usuario, limit, versión del modelo, generación) o None si no hay modelo"""
+        snapshot = self.registry.get()
+        if snapshot is None:
+            return None
+        return (usuario_id, limit, snapshot.version, self._cache_generations.get(usuario_id, 0))
+    
     def get_recommendations(self, usuario_id: int, db: Session, limit: int = 10) -> List[Dict]:
         """
         Obtiene recomendaciones para un usuario basadas en su cluster
         
+        Los resultados se cachean por (usuario, limit, versión del modelo);
+        las visitas repetidas no tocan la base de datos hasta que cambien las
+        preferencias o lecturas del usuario, o se reentrene el modelo.
+        
         Args:
             usuario_id: ID del usuario
             db: Sesión de base de datos
@@ -158,6 +964,22 @@ class RecommendationService:
         Returns:
             Lista de libros recomendados con detalles
         """
+        cache_key = self._cache_key(usuario_id, limit)
+        if cache_key is not None:
+            cached = self.results_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        recomendaciones = self._compute_recommendations(usuario_id, db, limit)
+        
+        # Sin modelo (clave None) el fallback no se cachea: el modelo que se
+        # publique después debe verse en la próxima visita
+        if cache_key is not None:
+            self.results_cache.set(cache_key, recomendaciones)
+        return recomendaciones
+    
+    def _compute_recommendations(self, usuario_id: int, db: Session, limit: int) -> List[Dict]:
+        """Calcula las recomendaciones de un usuario sin pasar por la caché"""
         # Obtener usuario
         usuario = db.query(Usuario).filter(Usuario.idUsuario == usuario_id).first()
         if not usuario:
@@ -169,64 +991,36 @@ class RecommendationService:
         except Exception as e:
             print(f"Error al obtener cluster: {e}")
             # Fallback: recomendar libros por categorías/lenguajes preferidos
-            return self._fallback_recommendations(usuario, db, limit)
+            return self._format_recommendations(self._fallback_recommendations(usuario, db, limit), limit)
         
-        # Cargar mapa de clusters
-        if os.path.exists(self.clusters_path):
-            user_cluster_map = np.load(self.clusters_path, allow_pickle=True).item()
-        else:
-            user_cluster_map = {}
+        # Sin modelo publicado todavía (el primer entrenamiento está encolado)
+        snapshot = self.registry.get()
+        if user_cluster is None or snapshot is None:
+            return self._format_recommendations(self._fallback_recommendations(usuario, db, limit), limit)
         
-        # Encontrar usuarios del mismo cluster
-        usuarios_similares_ids = [uid for uid, cluster in user_cluster_map.items() 
-                                 if cluster == user_cluster and uid != usuario_id]
+        # Candidatos precalculados del cluster: slice + filtro de libros ya leídos
+        candidatos = snapshot.cluster_candidates(user_cluster)
+        if candidatos is not None:
+            return self._recommend_from_candidates(usuario, candidatos, db, limit)
         
         # Si no hay usuarios similares, usar fallback
-        if not usuarios_similares_ids:
-            return self._fallback_recommendations(usuario, db, limit)
+        if not snapshot.assignments.has_other_members(user_cluster, usuario_id):
+            return self._format_recommendations(self._fallback_recommendations(usuario, db, limit), limit)
         
         # Obtener libros de usuarios similares
         # Por ahora, recomendar libros que tengan las mismas categorías/lenguajes
         preferencia = usuario.preferencia
         
         if not preferencia:
-            return self._fallback_recommendations(usuario, db, limit)
-        
-        user_categoria_ids = {pc.idCategoria for pc in preferencia.preferencia_categorias}
-        user_lenguaje_ids = {pl.idLenguaje for pl in preferencia.preferencia_lenguajes}
+            return self._format_recommendations(self._fallback_recommendations(usuario, db, limit), limit)
         
-        # Query de libros que coincidan con preferencias
-        query = db.query(Libro)
-        
-        # Filtrar por categorías o lenguajes
-        if user_categoria_ids or user_lenguaje_ids:
-            # Obtener libros que tengan al menos una categoría o lenguaje en común
-            libro_ids = set()
-            
-            if user_categoria_ids:
-                categoria_libros = db.query(LibroCategoria.idLibro).filter(
-                    LibroCategoria.idCategoria.in_(list(user_categoria_ids))
-                ).all()
-                libro_ids.update([lb.idLibro for lb in categoria_libros])
-            
-            if user_lenguaje_ids:
-                lenguaje_libros = db.query(LibroLenguaje.idLibro).filter(
-                    LibroLenguaje.idLenguaje.in_(list(user_lenguaje_ids))
-                ).all()
-                libro_ids.update([lb.idLibro for lb in lenguaje_libros])
-            
-            if libro_ids:
-                query = query.filter(Libro.idLibro.in_(list(libro_ids)))
-        
-        # Obtener libros con eager loading
+        # Libros rankeados por número de preferencias coincidentes (una sola query)
+        ranking = self._preference_ranking(preferencia)
         libros = (
-            query.options(
-                selectinload(Libro.editorial),
-                selectinload(Libro.autor_libros).selectinload(AutorLibro.autor),
-                selectinload(Libro.libro_categorias).selectinload(LibroCategoria.categoria),
-                selectinload(Libro.libro_lenguajes).selectinload(LibroLenguaje.lenguaje)
-            )
-            .order_by(Libro.idLibro.desc())
+            self._with_libro_details(db.query(Libro))
+            .join(ranking, ranking.c.idLibro == Libro.idLibro)
+            .filter(~Libro.idLibro.in_(self._libros_leidos(usuario.idUsuario)))
+            .order_by(ranking.c.coincidencias.desc(), Libro.idLibro.desc())
             .limit(limit)
             .all()
         )
@@ -238,6 +1032,269 @@ class RecommendationService:
             fallback = self._fallback_recommendations(usuario, db, limit - len(libros), libros_ids_existentes)
             libros.extend(fallback)
         
+        return self._format_recommendations(libros, limit)
+    
+    def _recommend_from_candidates(self, usuario: Usuario, candidatos: np.ndarray,
+                                   db: Session, limit: int) -> List[Dict]:
+        """
+        Recomendaciones a partir de los candidatos rankeados del cluster
+        
+        Mezcla el ranking del cluster con la señal colaborativa item-item del
+        historial del usuario y con las lecturas de sus vecinos más parecidos,
+        descarta los libros que ya tiene en sus
+        lecturas, toma los primeros `limit` y completa con el fallback si no
+        alcanzan.
+        """
+        lecturas = {
+            lid: estado
+            for lid, estado in db.query(Lectura.idLibro, Lectura.estado)
+            .filter(Lectura.idUsuario == usuario.idUsuario)
+        }
+        vecinos = self.find_similar_users(usuario.idUsuario, usuario.preferencia)
+        vecinales = self._neighbour_scores({usuario.idUsuario: vecinos}, db).get(usuario.idUsuario, [])
+        seleccion = self._select_candidates(candidatos, lecturas, limit, vecinales)
+        
+        libros = []
+        if seleccion:
+            libros_por_id = {
+                libro.idLibro: libro
+                for libro in self._with_libro_details(db.query(Libro))
+                .filter(Libro.idLibro.in_(seleccion))
+            }
+            # Mantener el orden del ranking (los libros borrados desde el entrenamiento se omiten)
+            libros = [libros_por_id[lid] for lid in seleccion if lid in libros_por_id]
+        
+        if len(libros) < limit:
+            libros_ids_existentes = {libro.idLibro for libro in libros}
+            fallback = self._fallback_recommendations(usuario, db, limit - len(libros), libros_ids_existentes)
+            libros.extend(fallback)
+        
+        return self._format_recommendations(libros, limit)
+    
+    def _select_candidates(self, candidatos: np.ndarray, lecturas: Dict[int, EstadoLectura],
+                           limit: int, vecinales: Optional[List[Tuple[int, float]]] = None) -> List[int]:
+        """Primeros `limit` candidatos no leídos, mezclados con las señales colaborativa, de contenido y de vecinos"""
+        leidos = np.fromiter(lecturas.keys(), dtype=np.int64, count=len(lecturas))
+        
+        senales = []
+        colaborativos = collaborative_service.score_for_user(lecturas)
+        if colaborativos:
+            senales.append((colaborativos, COLLABORATIVE_WEIGHT))
+        por_contenido = content_service.score_for_user(lecturas)
+        if por_contenido:
+            senales.append((por_contenido, CONTENT_WEIGHT))
+        if vecinales:
+            senales.append((vecinales, NEIGHBOUR_WEIGHT))
+        if senales:
+            candidatos = self._blend_rankings(candidatos, senales)
+        
+        return candidatos[~np.isin(candidatos, leidos)][:limit].tolist()
+    
+    @staticmethod
+    def _blend_rankings(candidatos: np.ndarray,
+                        senales: List[Tuple[List[Tuple[int, float]], float]]) -> np.ndarray:
+        """
+        Combina el ranking del cluster con otras señales puntuadas
+        
+        La posición en el ranking del cluster se convierte en un puntaje
+        lineal 1..0 y cada señal se normaliza por su máximo; el resultado es
+        el promedio ponderado con CLUSTER_WEIGHT y el peso de cada señal.
+        
+        Args:
+            candidatos: Ranking del cluster
+            senales: Lista de ([(idLibro, puntaje)], peso)
+        """
+        senal_ids = [np.array([lid for lid, _ in puntajes], dtype=np.int64) for puntajes, _ in senales]
+        ids = np.union1d(candidatos, np.concatenate(senal_ids))
+        puntaje = np.zeros(len(ids))
+        
+        total = CLUSTER_WEIGHT + sum(peso for _, peso in senales)
+        if len(candidatos):
+            cluster_scores = 1.0 - np.arange(len(candidatos)) / len(candidatos)
+            puntaje[np.searchsorted(ids, candidatos)] += CLUSTER_WEIGHT / total * cluster_scores
+        
+        for (puntajes, peso), libro_ids in zip(senales, senal_ids):
+            scores = np.array([score for _, score in puntajes])
+            puntaje[np.searchsorted(ids, libro_ids)] += peso / total * scores / scores.max()
+        
+        return ids[np.argsort(-puntaje, kind="stable")]
+    
+    def get_recommendations_batch(self, usuario_ids: List[int], db: Session, limit: int = 10,
+                                  chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[Dict]:
+        """
+        Recomendaciones para muchos usuarios a la vez (p. ej. el digest por email)
+        
+        Procesa los usuarios en bloques de `chunk_size`. Por bloque: las
+        features salen de build_feature_matrix (consultas set-based, no por
+        usuario), los clusters del mapa de asignaciones (y de una sola llamada
+        a kmeans.predict para los usuarios que no están), las lecturas de una
+        consulta, y los libros elegidos por todos los usuarios se cargan
+        juntos con un único eager load. Los resultados pasan por la misma
+        caché que get_recommendations.
+        
+        Args:
+            usuario_ids: IDs de los usuarios (los repetidos se procesan una vez)
+            db: Sesión de base de datos
+            limit: Número de recomendaciones por usuario
+            chunk_size: Usuarios por bloque (acota la memoria y el tamaño de los IN)
+            
+        Yields:
+            Dict {"usuario_id", "recomendaciones"} por usuario, en el orden recibido
+        """
+        usuario_ids = list(dict.fromkeys(usuario_ids))
+        snapshot = self.get_model_snapshot()
+        
+        for start in range(0, len(usuario_ids), chunk_size):
+            chunk = usuario_ids[start:start + chunk_size]
+            
+            resultados = {}
+            pendientes = []
+            for uid in chunk:
+                cache_key = self._cache_key(uid, limit)
+                cached = self.results_cache.get(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    resultados[uid] = cached
+                else:
+                    pendientes.append(uid)
+            
+            if pendientes:
+                if snapshot is None or snapshot.candidate_ids is None or snapshot.categoria_col is None:
+                    # Sin modelo o sin candidatos precalculados: camino por usuario
+                    for uid in pendientes:
+                        resultados[uid] = self.get_recommendations(uid, db, limit)
+                else:
+                    resultados.update(self._compute_recommendations_batch(pendientes, snapshot, db, limit))
+            
+            for uid in chunk:
+                yield {"usuario_id": uid, "recomendaciones": resultados.get(uid, [])}
+    
+    def _compute_recommendations_batch(self, usuario_ids: List[int], snapshot: ModelSnapshot,
+                                       db: Session, limit: int) -> Dict[int, List[Dict]]:
+        """Calcula (y cachea) las recomendaciones de un bloque de usuarios"""
+        columns = (snapshot.metadata["categoria_ids"], snapshot.metadata["lenguaje_ids"])
+        user_ids, X = self.build_feature_matrix(db, usuario_ids, columns=columns)
+        if not user_ids:
+            return {}
+        
+        X_scaled = snapshot.scaler.transform(X)
+        
+        # Igual que get_user_cluster: primero el mapa de asignaciones (usuarios
+        # entrenados o reasignados) y kmeans.predict solo para los que no están
+        clusters = [snapshot.assignments.get(uid) for uid in user_ids]
+        sin_asignar = [i for i, cluster in enumerate(clusters) if cluster is None]
+        if sin_asignar:
+            for i, cluster in zip(sin_asignar, snapshot.kmeans.predict(X_scaled[sin_asignar])):
+                clusters[i] = int(cluster)
+        
+        lecturas_por_usuario: Dict[int, Dict[int, EstadoLectura]] = {uid: {} for uid in user_ids}
+        for uid, lid, estado in (
+            db.query(Lectura.idUsuario, Lectura.idLibro, Lectura.estado)
+            .filter(Lectura.idUsuario.in_(user_ids))
+        ):
+            lecturas_por_usuario[uid][lid] = estado
+        
+        # Vecinos de cada usuario desde sus filas ya escaladas; las lecturas
+        # de todos los vecinos del bloque se leen en una consulta
+        vecinales = {}
+        if snapshot.neighbor_index is not None:
+            vecinales = self._neighbour_scores({
+                uid: snapshot.neighbor_index.query(X_scaled[i], NEIGHBOURS_K, exclude=uid)
+                for i, uid in enumerate(user_ids)
+            }, db)
+        
+        selecciones = {
+            uid: self._select_candidates(
+                snapshot.cluster_candidates(int(cluster)), lecturas_por_usuario[uid], limit,
+                vecinales.get(uid)
+            )
+            for uid, cluster in zip(user_ids, clusters)
+        }
+        
+        libro_ids = set().union(*selecciones.values())
+        libros_por_id = {}
+        if libro_ids:
+            libros_por_id = {
+                libro.idLibro: libro
+                for libro in self._with_libro_details(db.query(Libro))
+                .filter(Libro.idLibro.in_(libro_ids))
+            }
+        
+        libros_por_usuario = {
+            uid: [libros_por_id[lid] for lid in seleccion if lid in libros_por_id]
+            for uid, seleccion in selecciones.items()
+        }
+        
+        # El fallback solo se consulta para los usuarios con pocos candidatos
+        incompletos = [uid for uid, libros in libros_por_usuario.items() if len(libros) < limit]
+        if incompletos:
+            usuarios = (
+                db.query(Usuario)
+                .options(selectinload(Usuario.preferencia))
+                .filter(Usuario.idUsuario.in_(incompletos))
+            )
+            for usuario in usuarios:
+                libros = libros_por_usuario[usuario.idUsuario]
+                libros.extend(self._fallback_recommendations(
+                    usuario, db, limit - len(libros), {libro.idLibro for libro in libros}
+                ))
+        
+        resultados = {}
+        for uid, libros in libros_por_usuario.items():
+            resultados[uid] = self._format_recommendations(libros, limit)
+            cache_key = self._cache_key(uid, limit)
+            if cache_key is not None:
+                self.results_cache.set(cache_key, resultados[uid])
+        return resultados
+    
+    def get_also_read(self, libro_id: int, db: Session, limit: int = 10) -> List[Dict]:
+        """
+        Libros que también leyeron los lectores de un libro
+        
+        Args:
+            libro_id: ID del libro de referencia
+            db: Sesión de base de datos
+            limit: Número de libros (default: 10)
+            
+        Returns:
+            Lista de libros con detalles, del más al menos similar
+        """
+        return self._load_ranked_books(collaborative_service.similar_books(libro_id, limit), db, limit)
+    
+    def get_similar_content(self, libro_id: int, db: Session, limit: int = 10) -> List[Dict]:
+        """
+        Libros con titulo y sinopsis más parecidos a un libro (índice TF-IDF)
+        
+        Args:
+            libro_id: ID del libro de referencia
+            db: Sesión de base de datos
+            limit: Número de libros (default: 10)
+            
+        Returns:
+            Lista de libros con detalles y su similitud, del más al menos similar
+        """
+        similares = content_service.similar_books(libro_id, limit)
+        recomendaciones = self._load_ranked_books(similares, db, limit)
+        similitud = dict(similares)
+        for recomendacion in recomendaciones:
+            recomendacion["similitud"] = round(similitud[recomendacion["idLibro"]], 4)
+        return recomendaciones
+    
+    def _load_ranked_books(self, ranking: List[Tuple[int, float]], db: Session, limit: int) -> List[Dict]:
+        """Carga con detalles los libros de un ranking (idLibro, puntaje) manteniendo el orden"""
+        if not ranking:
+            return []
+        
+        ids = [lid for lid, _ in ranking]
+        libros_por_id = {
+            libro.idLibro: libro
+            for libro in self._with_libro_details(db.query(Libro)).filter(Libro.idLibro.in_(ids))
+        }
+        return self._format_recommendations(
+            [libros_por_id[lid] for lid in ids if lid in libros_por_id], limit
+        )
+    
+    def _format_recommendations(self, libros: List[Libro], limit: int) -> List[Dict]:
+        """Elimina duplicados manteniendo el orden y arma el dict de respuesta"""
         # Eliminar duplicados manteniendo el orden
         libros_unicos = []
         libros_ids_vistos = set()
@@ -266,68 +1323,96 @@ class RecommendationService:
         
         return recomendaciones
     
+    def _with_libro_details(self, query):
+        """Agrega el eager loading de editorial, autores, categorías y lenguajes"""
+        return query.options(
+            selectinload(Libro.editorial),
+            selectinload(Libro.autor_libros).selectinload(AutorLibro.autor),
+            selectinload(Libro.libro_categorias).selectinload(LibroCategoria.categoria),
+            selectinload(Libro.libro_lenguajes).selectinload(LibroLenguaje.lenguaje)
+        )
+    
+    def _preference_matches(self, preferencia: Preferencia):
+        """
+        Subquery (idLibro) con una fila por cada categoría o lenguaje del libro
+        que coincide con las preferencias; se resuelve por completo en el servidor
+        """
+        categorias_usuario = select(PreferenciaCategoria.idCategoria).where(
+            PreferenciaCategoria.idPreferencias == preferencia.idPreferencias
+        )
+        lenguajes_usuario = select(PreferenciaLenguaje.idLenguaje).where(
+            PreferenciaLenguaje.idPreferencias == preferencia.idPreferencias
+        )
+        return union_all(
+            select(LibroCategoria.idLibro.label("idLibro"))
+            .where(LibroCategoria.idCategoria.in_(categorias_usuario)),
+            select(LibroLenguaje.idLibro.label("idLibro"))
+            .where(LibroLenguaje.idLenguaje.in_(lenguajes_usuario)),
+        ).subquery("coincidencias_libro")
+    
+    @staticmethod
+    def _libros_leidos(usuario_id: int):
+        """Subconsulta con los libros que el usuario ya tiene en sus lecturas"""
+        return select(Lectura.idLibro).where(Lectura.idUsuario == usuario_id)
+    
+    def _preference_ranking(self, preferencia: Preferencia):
+        """Subquery (idLibro, coincidencias) con los libros que coinciden con las preferencias"""
+        matches = self._preference_matches(preferencia)
+        return (
+            select(matches.c.idLibro, func.count().label("coincidencias"))
+            .group_by(matches.c.idLibro)
+            .subquery("ranking_libros")
+        )
+    
     def _fallback_recommendations(self, usuario: Usuario, db: Session, limit: int, excluir_ids: set = None) -> List[Libro]:
         """
         Recomendaciones de respaldo cuando no hay cluster o usuarios similares
         Retorna libros que coincidan con categorías/lenguajes preferidos
+        (rankeados por número de coincidencias) y completa con los más recientes
         
         Args:
             usuario: Usuario para quien se buscan recomendaciones
             db: Sesión de base de datos
             limit: Número máximo de libros a retornar
-            excluir_ids: Set de IDs de libros a excluir
+            excluir_ids: Set de IDs de libros a excluir (los ya recomendados, a lo sumo `limit`)
+        
+        Los libros que el usuario ya leyó se excluyen con una subconsulta sobre
+        sus lecturas (sin traer los ids); excluir_ids queda acotado por `limit`.
         """
         if excluir_ids is None:
             excluir_ids = set()
         
         preferencia = usuario.preferencia
-        
-        if not preferencia:
-            # Sin preferencias, retornar libros más recientes (excluyendo los ya recomendados)
-            query = db.query(Libro)
-            if excluir_ids:
-                query = query.filter(~Libro.idLibro.in_(list(excluir_ids)))
-            return query.order_by(Libro.idLibro.desc()).limit(limit).all()
-        
-        user_categoria_ids = {pc.idCategoria for pc in preferencia.preferencia_categorias}
-        user_lenguaje_ids = {pl.idLenguaje for pl in preferencia.preferencia_lenguajes}
+        libros = []
+        matches = None
+        leidos = self._libros_leidos(usuario.idUsuario)
         
         # Si tiene preferencias, buscar por ellas
-        if user_categoria_ids or user_lenguaje_ids:
-            libro_ids = set()
-            
-            if user_categoria_ids:
-                categoria_libros = db.query(LibroCategoria.idLibro).filter(
-                    LibroCategoria.idCategoria.in_(list(user_categoria_ids))
-                ).all()
-                libro_ids.update([lb.idLibro for lb in categoria_libros])
-            
-            if user_lenguaje_ids:
-                lenguaje_libros = db.query(LibroLenguaje.idLibro).filter(
-                    LibroLenguaje.idLenguaje.in_(list(user_lenguaje_ids))
-                ).all()
-                libro_ids.update([lb.idLibro for lb in lenguaje_libros])
-            
-            # Excluir libros ya recomendados
+        if preferencia:
+            ranking = self._preference_ranking(preferencia)
+            query = (
+                self._with_libro_details(db.query(Libro))
+                .join(ranking, ranking.c.idLibro == Libro.idLibro)
+                .filter(~Libro.idLibro.in_(leidos))
+            )
             if excluir_ids:
-                libro_ids -= excluir_ids
-            
-            if libro_ids:
-                libros = db.query(Libro).filter(
-                    Libro.idLibro.in_(list(libro_ids))
-                ).order_by(Libro.idLibro.desc()).limit(limit).all()
-            else:
-                # Si no quedan libros, buscar cualquier libro no excluido
-                query = db.query(Libro)
-                if excluir_ids:
-                    query = query.filter(~Libro.idLibro.in_(list(excluir_ids)))
-                libros = query.order_by(Libro.idLibro.desc()).limit(limit).all()
-        else:
-            # Sin preferencias, retornar libros más recientes (excluyendo los ya recomendados)
-            query = db.query(Libro)
+                query = query.filter(~Libro.idLibro.in_(excluir_ids))
+            libros = (
+                query.order_by(ranking.c.coincidencias.desc(), Libro.idLibro.desc())
+                .limit(limit)
+                .all()
+            )
+            matches = self._preference_matches(preferencia)
+        
+        if len(libros) < limit:
+            # Completar con los libros más recientes que no coinciden (ya se
+            # devolvieron todos los que coinciden), excluyendo los leídos y los ya recomendados
+            query = self._with_libro_details(db.query(Libro)).filter(~Libro.idLibro.in_(leidos))
+            if matches is not None:
+                query = query.filter(~exists().where(matches.c.idLibro == Libro.idLibro))
             if excluir_ids:
-                query = query.filter(~Libro.idLibro.in_(list(excluir_ids)))
-            libros = query.order_by(Libro.idLibro.desc()).limit(limit).all()
+                query = query.filter(~Libro.idLibro.in_(excluir_ids))
+            libros.extend(query.order_by(Libro.idLibro.desc()).limit(limit - len(libros)).all())
         
         return libros
 
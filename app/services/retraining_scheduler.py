@@ -0,0 +1,299 @@
+"""
+Reentrenamiento del modelo de recomendaciones en segundo plano
+El ajuste de K-Means corre en un proceso aparte (ProcessPoolExecutor) para no
+bloquear el event loop; train_model publica cada versión en su propio
+directorio y cambia el puntero models/CURRENT, así que los workers pasan al
+modelo nuevo sin reiniciarse y sin ver archivos a medio escribir.
+
+Disparadores:
+- Manual: /recomendaciones/entrenar
+- Por intervalo: RETRAIN_INTERVAL_SECONDS (0 = desactivado); el loop corre en
+  cada worker, pero solo entrena si la versión publicada es más vieja que el
+  intervalo y nadie está entrenando, así que hay un entrenamiento por intervalo
+- Por cambios de preferencias: RETRAIN_AFTER_CHANGES (0 = desactivado); los
+  cambios se cuentan en el log de deltas de la versión activa, que comparten
+  todos los workers
+- Sin modelo: la primera petición de recomendaciones encola el entrenamiento
+  inicial y mientras tanto se responde con el fallback
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+
+# Lock entre workers: solo un entrenamiento a la vez por máquina
+TRAINING_LOCK_PATH = "models/.training.lock"
+
+# El proceso que entrena renueva el mtime del lock cada tanto; un lock sin
+# renovar por más que esto se considera abandonado (proceso caído)
+TRAINING_LOCK_HEARTBEAT_SECONDS = 15
+TRAINING_LOCK_STALE_SECONDS = 120
+
+# Espera antes de volver a encolar el primer entrenamiento si el anterior falló
+INITIAL_TRAINING_RETRY_SECONDS = 60
+
+
+class TrainingInProgressError(RuntimeError):
+    """Ya hay un entrenamiento en curso (en este worker con otros parámetros, o en otro proceso)"""
+
+
+def _training_lock_held() -> bool:
+    """Indica si algún proceso tiene el lock de entrenamiento y lo sigue renovando"""
+    try:
+        return time.time() - os.stat(TRAINING_LOCK_PATH).st_mtime <= TRAINING_LOCK_STALE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def _acquire_training_lock() -> bool:
+    """Crea el archivo de lock de forma exclusiva; False si otro proceso entrena"""
+    os.makedirs(os.path.dirname(TRAINING_LOCK_PATH), exist_ok=True)
+    try:
+        if not _training_lock_held():
+            os.remove(TRAINING_LOCK_PATH)
+    except FileNotFoundError:
+        pass
+    
+    try:
+        fd = os.open(TRAINING_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return True
+
+
+def _renew_training_lock(stop: threading.Event):
+    """Actualiza el mtime del lock mientras dura el entrenamiento"""
+    while not stop.wait(TRAINING_LOCK_HEARTBEAT_SECONDS):
+        try:
+            os.utime(TRAINING_LOCK_PATH)
+        except FileNotFoundError:
+            return
+
+
+def _run_training(n_clusters: int, modo: str, batch_size: int) -> Dict:
+    """
+    Entrena el modelo en el proceso hijo con su propia sesión de base de datos
+    
+    Returns:
+        Dict con la versión publicada, usuarios procesados y distribución por cluster
+    """
+    from app.database.session import SessionLocal
+    from app.services.recommendation_service import recommendation_service
+    
+    if not _acquire_training_lock():
+        raise TrainingInProgressError("Ya hay un entrenamiento en curso")
+    
+    stop = threading.Event()
+    threading.Thread(target=_renew_training_lock, args=(stop,), daemon=True).start()
+    db = SessionLocal()
+    try:
+        user_cluster_map = recommendation_service.train_model(
+            db, n_clusters, modo=modo, batch_size=batch_size
+        )
+        snapshot = recommendation_service.registry.get()
+        return {
+            "version": snapshot.version if snapshot else None,
+            "clusters_creados": n_clusters,
+            "modo": modo,
+            "usuarios_procesados": len(user_cluster_map),
+            "distribucion": {
+                f"cluster_{i}": sum(1 for c in user_cluster_map.values() if c == i)
+                for i in range(n_clusters)
+            }
+        }
+    finally:
+        stop.set()
+        db.close()
+        try:
+            os.remove(TRAINING_LOCK_PATH)
+        except FileNotFoundError:
+            pass
+
+
+class RetrainingScheduler:
+    """Ejecuta y programa entrenamientos del modelo en un pool de procesos"""
+    
+    def __init__(self):
+        self.interval = float(os.getenv("RETRAIN_INTERVAL_SECONDS", "0"))
+        self.change_threshold = int(os.getenv("RETRAIN_AFTER_CHANGES", "0"))
+        self.n_clusters = int(os.getenv("RETRAIN_N_CLUSTERS", "5"))
+        self.modo = os.getenv("RETRAIN_MODE", "dense")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._future: Optional[Future] = None
+        self._params: Optional[Tuple[int, str, int]] = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_started: Optional[datetime] = None
+        self._last_finished: Optional[datetime] = None
+        self._last_trigger: Optional[str] = None
+        self._last_result: Optional[Dict] = None
+        self._last_error: Optional[str] = None
+        self._initial_requested: Optional[float] = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # spawn: el hijo no hereda el pool de conexiones ni los hilos del servidor
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+    
+    def is_running(self) -> bool:
+        return self._future is not None and not self._future.done()
+    
+    def submit(self, n_clusters: Optional[int] = None, modo: Optional[str] = None,
+               batch_size: int = 1024, motivo: str = "manual") -> Future:
+        """
+        Encola un entrenamiento; si ya hay uno en curso con los mismos
+        parámetros retorna ese mismo
+        
+        Args:
+            n_clusters: Número de clusters (default: RETRAIN_N_CLUSTERS)
+            modo: Modo de entrenamiento (default: RETRAIN_MODE)
+            batch_size: Tamaño de lote para el modo sparse
+            motivo: Qué disparó el entrenamiento (manual, intervalo, cambios)
+        
+        Returns:
+            Future con el resumen del entrenamiento
+        
+        Raises:
+            TrainingInProgressError: Si el entrenamiento en curso usa otros parámetros
+        """
+        params = (n_clusters or self.n_clusters, modo or self.modo, batch_size)
+        with self._lock:
+            if self.is_running():
+                if params != self._params:
+                    n, m, b = self._params
+                    raise TrainingInProgressError(
+                        f"Ya hay un entrenamiento en curso con n_clusters={n}, modo={m}, batch_size={b}"
+                    )
+                return self._future
+            
+            self._params = params
+            self._last_started = datetime.utcnow()
+            self._last_trigger = motivo
+            self._future = self._get_executor().submit(_run_training, *params)
+            self._future.add_done_callback(self._on_done)
+            print(f"🔄 Entrenamiento del modelo encolado ({motivo})")
+            return self._future
+    
+    def _on_done(self, future: Future):
+        from app.services.recommendation_service import recommendation_service
+        
+        self._last_finished = datetime.utcnow()
+        try:
+            self._last_result = future.result()
+            self._last_error = None
+            print(f"✓ Modelo reentrenado (versión {self._last_result['version']})")
+        except Exception as e:
+            self._last_error = str(e)
+            print(f"⚠️ Error al reentrenar el modelo: {e}")
+        # Cargar la versión nueva sin esperar al intervalo de verificación
+        recommendation_service.registry.invalidate()
+    
+    async def run(self, n_clusters: Optional[int] = None, modo: Optional[str] = None,
+                  batch_size: int = 1024) -> Dict:
+        """Encola un entrenamiento y espera su resultado sin bloquear el event loop"""
+        return await asyncio.wrap_future(self.submit(n_clusters, modo, batch_size))
+    
+    def _pending_changes(self) -> int:
+        """Cambios de preferencias de todos los workers desde la versión activa"""
+        from app.services.recommendation_service import recommendation_service
+        
+        return recommendation_service.registry.pending_assignments()
+    
+    def _model_age(self) -> float:
+        """Segundos desde que se publicó la versión activa (infinito si no hay)"""
+        from app.services.recommendation_service import recommendation_service
+        
+        try:
+            return time.time() - os.stat(recommendation_service.registry.current_path).st_mtime
+        except FileNotFoundError:
+            return float("inf")
+    
+    def _submit_automatic(self, motivo: str):
+        """Encola un entrenamiento automático salvo que ya haya uno en curso en cualquier worker"""
+        if self.is_running() or _training_lock_held():
+            return
+        try:
+            self.submit(motivo=motivo)
+        except TrainingInProgressError:
+            pass
+    
+    def request_initial_training(self):
+        """
+        Encola el primer entrenamiento cuando no hay modelo publicado
+        
+        Lo llaman las peticiones de recomendaciones mientras sirven el
+        fallback: corre en el pool de procesos con el lock entre workers, así
+        que no bloquea el event loop ni entrena dos veces a la vez. Si falla
+        se reintenta recién después de INITIAL_TRAINING_RETRY_SECONDS.
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            if self._initial_requested is not None and ahora - self._initial_requested < INITIAL_TRAINING_RETRY_SECONDS:
+                return
+            self._initial_requested = ahora
+        self._submit_automatic("sin_modelo")
+    
+    def record_preference_change(self):
+        """
+        Reentrena al alcanzar RETRAIN_AFTER_CHANGES cambios de preferencias
+        
+        Se llama después de assign_user_cluster, que ya agregó el cambio al
+        log de deltas: el conteo es el mismo en todos los workers.
+        """
+        if self.change_threshold <= 0:
+            return
+        if self._pending_changes() >= self.change_threshold:
+            self._submit_automatic("cambios")
+    
+    async def _interval_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Otro worker ya publicó una versión dentro de este intervalo
+                if self._model_age() >= self.interval:
+                    self._submit_automatic("intervalo")
+            except Exception as e:
+                print(f"⚠️ Error al programar el reentrenamiento: {e}")
+    
+    def start(self):
+        """Inicia el reentrenamiento periódico si RETRAIN_INTERVAL_SECONDS > 0"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._interval_loop())
+            print(f"✅ Reentrenamiento programado cada {int(self.interval)}s")
+    
+    def shutdown(self):
+        """Detiene el loop periódico y el pool de procesos"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def status(self) -> Dict:
+        """Estado del reentrenamiento para el endpoint de administración"""
+        return {
+            "en_curso": self.is_running(),
+            "intervalo_segundos": self.interval,
+            "umbral_cambios": self.change_threshold,
+            "cambios_pendientes": self._pending_changes(),
+            "ultimo_motivo": self._last_trigger,
+            "ultimo_inicio": self._last_started.isoformat() if self._last_started else None,
+            "ultimo_fin": self._last_finished.isoformat() if self._last_finished else None,
+            "ultimo_resultado": self._last_result,
+            "ultimo_error": self._last_error,
+        }
+
+
+# Instancia singleton del scheduler
+retraining_scheduler = RetrainingScheduler()
@@ -0,0 +1,144 @@
+"""
+Búsqueda de texto completo de libros sobre PostgreSQL
+Usa la columna generada libros.search_vector (titulo, autores y sinopsis con
+pesos A/B/C) y su índice GIN, creados por create_search_schema() al iniciar:
+- Modo normal: websearch_to_tsquery (frases entre comillas, OR, -exclusión),
+  orden por ts_rank y fragmentos resaltados con ts_headline
+- Modo typeahead: cada palabra como prefijo (pyth -> python), solo id y título
+
+Los fragmentos resaltados son HTML seguro: ts_headline marca las coincidencias
+con caracteres de control (que se quitan antes del texto original), el
+resultado se escapa con html.escape y recién entonces los delimitadores se
+reemplazan por <mark>...</mark>. Un título o sinopsis con HTML llega como
+texto escapado y <mark> es la única etiqueta que puede aparecer.
+"""
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+from app.database.session import SEARCH_CONFIG
+from app.models.libro import Libro
+import html
+import re
+
+
+# Palabras que se toman como máximo de la consulta en modo typeahead
+MAX_PREFIX_TERMS = 8
+
+# Delimitadores de ts_headline; se reemplazan por <mark> después de escapar
+MARK_START = "\x02"
+MARK_STOP = "\x03"
+
+TITULO_HEADLINE_OPTIONS = f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", HighlightAll=true'
+SINOPSIS_HEADLINE_OPTIONS = (
+    f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", MaxFragments=2, MaxWords=25, MinWords=8, '
+    "FragmentDelimiter=\" … \""
+)
+
+
+class SearchService:
+    """Consultas tsvector/ts_rank sobre el catálogo de libros"""
+    
+    def __init__(self):
+        self.search_vector = literal_column("libros.search_vector")
+    
+    @staticmethod
+    def prefix_query(q: str) -> str:
+        """
+        Convierte el texto del usuario en un tsquery de prefijos ("web pyth" -> "web:* & pyth:*")
+        
+        Solo se conservan caracteres de palabra, así la entrada no puede romper la sintaxis de to_tsquery.
+        """
+        terminos = re.findall(r"\w+", q.lower())[:MAX_PREFIX_TERMS]
+        return " & ".join(f"{t}:*" for t in terminos)
+    
+    @staticmethod
+    def _sin_delimitadores(texto):
+        """Quita los delimitadores del texto original para que no se puedan falsificar"""
+        return func.translate(texto, MARK_START + MARK_STOP, "")
+    
+    @staticmethod
+    def highlight_html(fragmento: str) -> str:
+        """Escapa el fragmento de ts_headline y convierte los delimitadores en <mark>"""
+        return (
+            html.escape(fragmento or "")
+            .replace(MARK_START, "<mark>")
+            .replace(MARK_STOP, "</mark>")
+        )
+    
+    def _headline(self, texto, tsquery, opciones: str):
+        return func.ts_headline(SEARCH_CONFIG, self._sin_delimitadores(texto), tsquery, opciones)
+    
+    def is_available(self, db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+    
+    def search(self, db: Session, q: str, skip: int = 0, limit: int = 20,
+               options: Sequence = ()) -> List[Tuple[Libro, float, str, str]]:
+        """
+        Libros que coinciden con `q`, ordenados por relevancia
+        
+        ts_headline es caro, pero PostgreSQL evalúa las expresiones costosas
+        del SELECT después del ORDER BY/LIMIT, así que solo corre sobre la página.
+        
+        Args:
+            options: Opciones de carga de relaciones para los libros devueltos
+        
+        Returns:
+            Lista de (libro, rank, titulo resaltado, sinopsis resaltada); los
+            resaltados son HTML escapado con <mark> (ver highlight_html)
+        """
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        rank = func.ts_rank(self.search_vector, tsquery)
+        
+        rows = (
+            db.query(
+                Libro,
+                rank,
+                self._headline(Libro.titulo, tsquery, TITULO_HEADLINE_OPTIONS),
+                self._headline(func.coalesce(Libro.sinopsis, ""), tsquery, SINOPSIS_HEADLINE_OPTIONS)
+            )
+            .options(*options)
+            .filter(self.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), Libro.idLibro)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+        return [
+            (libro, r, self.highlight_html(titulo), self.highlight_html(sinopsis))
+            for libro, r, titulo, sinopsis in rows
+        ]
+    
+    def typeahead(self, db: Session, q: str, limit: int = 10) -> List[Dict]:
+        """
+        Sugerencias mientras se escribe: solo columnas livianas, sin cargar relaciones
+        
+        Returns:
+            Lista de {idLibro, titulo, resaltado, rank}; `titulo` es el texto
+            original y `resaltado` HTML escapado con <mark>
+        """
+        expresion = self.prefix_query(q)
+        if not expresion:
+            return []
+        
+        tsquery = func.to_tsquery(SEARCH_CONFIG, expresion)
+        rank = func.ts_rank(self.search_vector, tsquery)
+        rows = (
+            db.query(
+                Libro.idLibro,
+                Libro.titulo,
+                self._headline(Libro.titulo, tsquery, TITULO_HEADLINE_OPTIONS),
+                rank
+            )
+            .filter(self.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), Libro.idLibro)
+            .limit(limit)
+            .all()
+        )
+        return [
+            {"idLibro": id_libro, "titulo": titulo, "resaltado": self.highlight_html(resaltado), "rank": float(r)}
+            for id_libro, titulo, resaltado, r in rows
+        ]
+
+
+# Instancia singleton del servicio
+search_service = SearchService()
@@ -0,0 +1,128 @@
+"""
+Contadores del catálogo en una tabla resumen (estadisticas_catalogo)
+Evita los COUNT(*) de /libros/count y /admin/populate-status:
+- Un listener after_flush del ORM suma/resta en la misma transacción que
+  inserta o elimina libros, autores, editoriales, categorías, lenguajes o
+  niveles (y mueve libros entre con/sin PDF cuando cambia urlLibro), así los
+  contadores se confirman o se revierten junto con los datos
+- Todos los contadores se leen con una sola consulta
+- Si falta alguna fila (tabla nueva) se recalculan con un único SELECT
+
+Las eliminaciones masivas con query.delete() no pasan por el ORM; ninguna
+de esas tablas se borra así, pero recalculate() corrige cualquier desvío.
+"""
+from collections import Counter
+from typing import Dict
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.estadistica import EstadisticaCatalogo
+from app.models.libro import Libro, Autor, Editorial
+from app.models.preferencia import Categoria, Lenguaje
+from app.models.nivel import Nivel
+
+
+# Contador por modelo
+CLAVES_POR_MODELO = {
+    Libro: "libros",
+    Autor: "autores",
+    Editorial: "editoriales",
+    Categoria: "categorias",
+    Lenguaje: "lenguajes",
+    Nivel: "niveles",
+}
+
+CLAVES = list(CLAVES_POR_MODELO.values()) + ["libros_con_pdf", "libros_sin_pdf"]
+
+
+def _clave_pdf(url_libro) -> str:
+    return "libros_con_pdf" if url_libro is not None else "libros_sin_pdf"
+
+
+class StatsService:
+    """Lee y mantiene los contadores del catálogo"""
+    
+    @staticmethod
+    def _deltas(session: Session) -> Counter:
+        """Cambios de los contadores según los objetos del flush en curso"""
+        deltas = Counter()
+        for obj in session.new:
+            clave = CLAVES_POR_MODELO.get(type(obj))
+            if clave:
+                deltas[clave] += 1
+                if isinstance(obj, Libro):
+                    deltas[_clave_pdf(obj.urlLibro)] += 1
+        for obj in session.deleted:
+            clave = CLAVES_POR_MODELO.get(type(obj))
+            if clave:
+                deltas[clave] -= 1
+                if isinstance(obj, Libro):
+                    historial = inspect(obj).attrs.urlLibro.history
+                    original = historial.deleted[0] if historial.deleted else obj.urlLibro
+                    deltas[_clave_pdf(original)] -= 1
+        for obj in session.dirty:
+            if isinstance(obj, Libro) and obj not in session.deleted:
+                historial = inspect(obj).attrs.urlLibro.history
+                if historial.added and historial.deleted:
+                    antes, despues = _clave_pdf(historial.deleted[0]), _clave_pdf(historial.added[0])
+                    if antes != despues:
+                        deltas[antes] -= 1
+                        deltas[despues] += 1
+        return deltas
+    
+    def _after_flush(self, session: Session, flush_context):
+        deltas = self._deltas(session)
+        if not deltas:
+            return
+        conn = session.connection()
+        for clave, delta in deltas.items():
+            if delta:
+                conn.execute(
+                    update(EstadisticaCatalogo)
+                    .where(EstadisticaCatalogo.clave == clave)
+                    .values(valor=EstadisticaCatalogo.valor + delta)
+                )
+    
+    def register(self, session_factory):
+        """Engancha el listener a una fábrica de sesiones (SessionLocal)"""
+        if not event.contains(session_factory, "after_flush", self._after_flush):
+            event.listen(session_factory, "after_flush", self._after_flush)
+    
+    def recalculate(self, db: Session) -> Dict[str, int]:
+        """
+        Recalcula todos los contadores con un único SELECT y los guarda
+        
+        Returns:
+            Dict con los contadores
+        """
+        conteos = db.execute(select(
+            select(func.count()).select_from(Libro).scalar_subquery().label("libros"),
+            select(func.count()).select_from(Autor).scalar_subquery().label("autores"),
+            select(func.count()).select_from(Editorial).scalar_subquery().label("editoriales"),
+            select(func.count()).select_from(Categoria).scalar_subquery().label("categorias"),
+            select(func.count()).select_from(Lenguaje).scalar_subquery().label("lenguajes"),
+            select(func.count()).select_from(Nivel).scalar_subquery().label("niveles"),
+            select(func.count()).select_from(Libro).where(Libro.urlLibro.isnot(None))
+            .scalar_subquery().label("libros_con_pdf"),
+        )).one()._asdict()
+        conteos["libros_sin_pdf"] = conteos["libros"] - conteos["libros_con_pdf"]
+        
+        try:
+            db.query(EstadisticaCatalogo).delete()
+            db.add_all(EstadisticaCatalogo(clave=clave, valor=valor) for clave, valor in conteos.items())
+            db.commit()
+        except IntegrityError:
+            # Otro worker los recalculó al mismo tiempo
+            db.rollback()
+        return conteos
+    
+    def get(self, db: Session) -> Dict[str, int]:
+        """Todos los contadores en una sola lectura"""
+        conteos = dict(db.query(EstadisticaCatalogo.clave, EstadisticaCatalogo.valor).all())
+        if any(clave not in conteos for clave in CLAVES):
+            return self.recalculate(db)
+        return conteos
+
+
+# Instancia singleton del servicio
+stats_service = StatsService()
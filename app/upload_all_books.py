@@ -18,6 +18,8 @@ from app.database.session import SessionLocal
 from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
 from app.models.preferencia import Lenguaje, Categoria
 from app.services.s3_service import s3_service
+from app.services.content_service import content_service
+from app.utils.http_cache import catalog_version
 import mimetypes
 
 
@@ -304,6 +306,10 @@ class MultiAuthorBookUploader:
                     else:
                         total_error += 1
             
+            # Vectorizar solo los libros nuevos en el índice de contenido
+            content_service.sync_after_import(db)
+            catalog_version.bump()
+            
             print(f"\n{'='*60}")
             print(f"RESUMEN:")
             print(f"  ✓ Exitosos: {total_success}")
@@ -17,6 +17,8 @@ from app.database.session import SessionLocal
 from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
 from app.models.preferencia import Lenguaje, Categoria
 from app.services.s3_service import s3_service
+from app.services.content_service import content_service
+from app.utils.http_cache import catalog_version
 import mimetypes
 
 
@@ -285,6 +287,10 @@ class OreillyBookUploader:
                 else:
                     error_count += 1
             
+            # Vectorizar solo los libros nuevos en el índice de contenido
+            content_service.sync_after_import(db)
+            catalog_version.bump()
+            
             print(f"\n{'='*50}")
             print(f"COMPLETADO:")
             print(f"  Exitosos: {success_count}")
@@ -0,0 +1,205 @@
+"""
+Middleware de compresión de respuestas (gzip y Brotli)
+Reemplaza a GZipMiddleware de Starlette, que solo ofrece gzip y comprime
+cualquier tipo de contenido:
+- Brotli cuando el cliente lo ofrece en Accept-Encoding, si no gzip; se
+  respetan los pesos q
+- Las respuestas menores a COMPRESSION_MINIMUM_SIZE salen sin comprimir, y
+  las que no llevan cuerpo (204, 304, 1xx o cuerpo vacío) nunca se tocan
+- Los tipos ya comprimidos (PDF de get_libro_pdf, imágenes, zip) pasan tal cual
+- Las respuestas en streaming se comprimen por partes, con un flush por
+  chunk para que el cliente las reciba sin esperar al final
+- Niveles ajustables por variables de entorno (ver benchmarks/compression.py)
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional, Sequence
+import brotli
+import os
+import zlib
+
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+
+# gzip 1-9 y Brotli 0-11: niveles medios rinden casi la misma reducción con mucho menos CPU
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Estados que nunca llevan cuerpo
+STATUS_SIN_CUERPO = {204, 304}
+
+# Prefijos de Content-Type que no se comprimen (ya vienen comprimidos)
+COMPRESSION_EXCLUDED_TYPES = tuple(
+    t.strip() for t in os.getenv(
+        "COMPRESSION_EXCLUDED_TYPES",
+        "application/pdf,application/zip,application/gzip,image/,video/,audio/"
+    ).split(",") if t.strip()
+)
+
+
+class GzipCompressor:
+    encoding = "gzip"
+    
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib crudo
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    encoding = "br"
+    
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' o None según Accept-Encoding (con pesos q)"""
+    pesos = {}
+    for parte in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in parte.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding:
+            pesos[coding.lower()] = q
+    
+    comodin = pesos.get("*", 0.0)
+    q_br = pesos.get("br", comodin)
+    q_gzip = pesos.get("gzip", comodin)
+    if q_br > 0 and q_br >= q_gzip:
+        return "br"
+    if q_gzip > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Middleware ASGI: elige la codificación por request y delega en CompressionResponder"""
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        excluded_types: Sequence[str] = COMPRESSION_EXCLUDED_TYPES
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_types = tuple(excluded_types)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding is not None:
+                compressor = (
+                    BrotliCompressor(self.brotli_quality) if encoding == "br"
+                    else GzipCompressor(self.gzip_level)
+                )
+                responder = CompressionResponder(self.app, compressor, self.minimum_size, self.excluded_types)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    """Comprime (o deja pasar) los mensajes de una respuesta"""
+    
+    def __init__(self, app: ASGIApp, compressor, minimum_size: int, excluded_types: Sequence[str]):
+        self.app = app
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.excluded_types = excluded_types
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        # None hasta ver el primer chunk del cuerpo
+        self.compressing: Optional[bool] = None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+    
+    def _skip(self, message: Message) -> bool:
+        status = message.get("status", 200)
+        if status < 200 or status in STATUS_SIN_CUERPO:
+            return True
+        headers = Headers(raw=message["headers"])
+        if "content-encoding" in headers or "content-range" in headers:
+            return True
+        content_type = headers.get("content-type", "").lower()
+        return content_type.startswith(self.excluded_types)
+    
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Los headers se envían cuando se sabe si el cuerpo se comprime
+            self.initial_message = message
+            self.compressing = False if self._skip(message) else None
+            return
+        
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        
+        if not self.started:
+            self.started = True
+            if self.compressing is None:
+                # Respuesta completa y chica (o vacía, p. ej. HEAD): comprimir cuesta más de lo que ahorra
+                self.compressing = more_body or (len(body) > 0 and len(body) >= self.minimum_size)
+            
+            if not self.compressing:
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.compressor.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.compressor.compress(body) + self.compressor.flush()
+            else:
+                message["body"] = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(message["body"]))
+            
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+        
+        if not self.compressing:
+            await self.send(message)
+            return
+        
+        # Chunks siguientes de una respuesta en streaming
+        if more_body:
+            message["body"] = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            message["body"] = self.compressor.compress(body) + self.compressor.finish()
+        await self.send(message)
@@ -1,10 +1,10 @@
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-from app.utils.responses import ErrorCodes
+from app.utils.responses import ErrorCodes, EnvelopeResponse, utc_timestamp
+from app.utils.http_cache import NotModified
 import traceback
 
 
@@ -15,7 +15,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     """
     # Si el detail ya es un dict con el formato estándar, devolverlo directamente
     if isinstance(exc.detail, dict) and "error" in exc.detail:
-        return JSONResponse(
+        return EnvelopeResponse(
             status_code=exc.status_code,
             content=exc.detail
         )
@@ -30,7 +30,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     
     error_code = error_code_map.get(exc.status_code, ErrorCodes.INTERNAL_ERROR)
     
-    return JSONResponse(
+    return EnvelopeResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -39,7 +39,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
                 "message": str(exc.detail),
                 "details": None
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
@@ -57,7 +57,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "type": error["type"]
         })
     
-    return JSONResponse(
+    return EnvelopeResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "success": False,
@@ -66,7 +66,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
                 "message": "Error de validación en los datos proporcionados",
                 "details": errors
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
@@ -75,7 +75,7 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
     """
     Manejador para errores de SQLAlchemy (base de datos).
     """
-    return JSONResponse(
+    return EnvelopeResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -84,11 +84,18 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
                 "message": "Error en la base de datos",
                 "details": str(exc) if request.app.debug else None
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
 
+async def not_modified_handler(request: Request, exc: NotModified):
+    """
+    Respuesta 304 (sin cuerpo) para los GET del catálogo con ETag vigente.
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=exc.headers)
+
+
 async def general_exception_handler(request: Request, exc: Exception):
     """
     Manejador general para cualquier excepción no capturada.
@@ -97,7 +104,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     print(f"Error no manejado: {exc}")
     print(traceback.format_exc())
     
-    return JSONResponse(
+    return EnvelopeResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -106,7 +113,7 @@ async def general_exception_handler(request: Request, exc: Exception):
                 "message": "Error interno del servidor",
                 "details": str(exc) if request.app.debug else None
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utc_timestamp()
         }
     )
 
@@ -119,4 +126,5 @@ def setup_exception_handlers(app):
     app.add_exception_handler(StarletteHTTPException, http_exception_handler)
     app.add_exception_handler(RequestValidationError, validation_exception_handler)
     app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)
+    app.add_exception_handler(NotModified, not_modified_handler)
     app.add_exception_handler(Exception, general_exception_handler)
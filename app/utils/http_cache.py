@@ -0,0 +1,146 @@
+"""
+Caché HTTP de los recursos del catálogo (ETag, Last-Modified y 304)
+Todas las lecturas del catálogo comparten una versión: la marca de tiempo en
+nanosegundos de la última escritura, guardada en un archivo para que todos
+los workers (y los scripts de carga) vean la misma. Así:
+- El ETag débil y Last-Modified salen de la versión sin consultar la base
+- If-None-Match se responde con 304 antes de abrir la sesión de base de datos
+- Las rutas de escritura suben la versión al terminar (invalidates_catalog)
+"""
+from fastapi import Depends, Request, Response
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional
+from app.utils.responses import response_format
+import os
+import threading
+import time
+
+
+# Raíz del proyecto: el servidor y los scripts (ejecutados desde cualquier
+# directorio) deben leer y escribir el mismo archivo de versión
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+CATALOG_VERSION_FILE = str(PROJECT_ROOT / os.getenv("CATALOG_VERSION_FILE", "cache/catalog_version"))
+
+# Segundos que el cliente puede reutilizar la respuesta sin revalidar (0 = revalidar siempre)
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "0"))
+
+
+class NotModified(Exception):
+    """Se lanza desde catalog_cache para responder 304 sin ejecutar el endpoint"""
+    
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+
+class CatalogVersion:
+    """Versión del catálogo compartida entre procesos a través de un archivo"""
+    
+    def __init__(self, path: str = CATALOG_VERSION_FILE):
+        self.path = path
+        self._mtime: Optional[int] = None
+        self._value: Optional[int] = None
+        self._lock = threading.RLock()
+    
+    def get(self) -> int:
+        """Versión actual (un stat por llamada; el archivo se relee solo si cambió)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            # Sin archivo no se sabe qué cambió antes: empezar una versión nueva
+            return self.bump()
+        
+        if mtime != self._mtime:
+            with self._lock:
+                try:
+                    with open(self.path) as f:
+                        self._value = int(f.read().strip())
+                except (FileNotFoundError, ValueError):
+                    return self.bump()
+                self._mtime = mtime
+        return self._value
+    
+    def bump(self) -> int:
+        """Publica una versión nueva (escritura atómica: tmp + os.replace)"""
+        with self._lock:
+            version = max(time.time_ns(), (self._value or 0) + 1)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w") as f:
+                f.write(str(version))
+            os.replace(tmp, self.path)
+            self._value = version
+            self._mtime = os.stat(self.path).st_mtime_ns
+            return version
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (lista de ETags o "*")"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def catalog_headers(version: int, formato: Optional[str] = None) -> Dict[str, str]:
+    """
+    Headers de caché de una versión del catálogo
+    
+    En los endpoints que negocian el formato (response_format) cada
+    representación tiene su propio ETag: un cliente con el JSON no puede
+    revalidar la variante MessagePack que nunca recibió.
+    """
+    etag = f"{version:x}" if formato in (None, "json") else f"{version:x}-{formato}"
+    headers = {
+        "ETag": f'W/"{etag}"',
+        "Last-Modified": formatdate(version / 1e9, usegmt=True),
+        "Cache-Control": f"public, max-age={CATALOG_CACHE_MAX_AGE}, must-revalidate",
+    }
+    if formato is not None:
+        headers["Vary"] = "Accept"
+    return headers
+
+
+def _revalidate(request: Request, response: Response, formato: Optional[str]):
+    version = catalog_version.get()
+    headers = catalog_headers(version, formato)
+    
+    # Solo If-None-Match: Last-Modified tiene resolución de segundos y dos
+    # escrituras en el mismo segundo darían un 304 con datos viejos
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, headers["ETag"]):
+        raise NotModified(headers)
+    
+    response.headers.update(headers)
+
+
+def catalog_cache(request: Request, response: Response):
+    """
+    Dependencia para los GET del catálogo: agrega ETag, Last-Modified y
+    Cache-Control, o corta con 304 si el cliente ya tiene la versión actual.
+    Declararla en `dependencies=[...]` del decorador para que corra antes de get_db.
+    """
+    _revalidate(request, response, None)
+
+
+def negotiated_catalog_cache(request: Request, response: Response, formato: str = Depends(response_format)):
+    """
+    Igual que catalog_cache para los GET del catálogo que negocian el formato
+    (Accept: application/msgpack): el ETag incluye el formato y agrega Vary: Accept.
+    """
+    _revalidate(request, response, formato)
+
+
+def invalidates_catalog():
+    """Dependencia para las rutas que escriben en el catálogo: sube la versión al terminar"""
+    try:
+        yield
+    finally:
+        catalog_version.bump()
+
+
+# Instancia singleton de la versión del catálogo
+catalog_version = CatalogVersion()
@@ -0,0 +1,71 @@
+"""
+Paginación por cursor (keyset) para los listados
+En lugar de OFFSET, cada página filtra por id > último id visto, así la página
+N cuesta lo mismo que la primera (un range scan sobre la clave primaria).
+El cursor es opaco para el cliente: base64 de {"after_id": n}.
+"""
+from fastapi import HTTPException, status
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import base64
+import json
+
+from app.utils.responses import create_error_response, ErrorCodes
+
+
+def encode_cursor(after_id: int) -> str:
+    """Cursor opaco que apunta al último id de una página"""
+    raw = json.dumps({"after_id": after_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Obtiene el after_id de un cursor; 400 si el cursor no es válido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["after_id"]
+        if not isinstance(after_id, int):
+            raise ValueError
+        return after_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                ErrorCodes.INVALID_INPUT,
+                "Cursor de paginación inválido"
+            )
+        )
+
+
+def resolve_after_id(after_id: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """El cursor opaco tiene prioridad sobre after_id"""
+    if cursor:
+        return decode_cursor(cursor)
+    return after_id
+
+
+def paginate(query, id_column, skip: int, limit: int, after_id: Optional[int] = None):
+    """
+    Aplica keyset (si hay after_id) u offset (compatibilidad) ordenando por id
+    
+    Se pide una fila de más para saber si hay otra página sin contar el total.
+    Usar con keyset_page() sobre el resultado.
+    """
+    query = query.order_by(id_column)
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+
+def keyset_page(rows: List[Any], limit: int, get_id: Callable[[Any], int]) -> Tuple[List[Any], Dict]:
+    """
+    Recorta la fila extra de paginate() y arma el bloque de paginación
+    
+    Returns:
+        (filas de la página, {"next_cursor", "has_more"})
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(get_id(rows[-1])) if has_more and rows else None
+    return rows, {"next_cursor": next_cursor, "has_more": has_more}
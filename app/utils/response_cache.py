@@ -0,0 +1,239 @@
+"""
+Caché de respuestas serializadas (bytes JSON) para las lecturas del catálogo
+Complementa la caché HTTP (utils/http_cache.py): cuando el cliente no trae un
+ETag vigente, la respuesta sale ya serializada sin consultar la base ni
+construir modelos de Pydantic.
+
+- La clave es la versión del catálogo + endpoint + parámetros normalizados,
+  así cualquier escritura del catálogo (que sube la versión) la invalida
+- Backend en memoria (LRU acotado en bytes, uno por worker) o uno compartido
+  compatible con Redis entre workers (RESPONSE_CACHE_BACKEND=redis)
+- Métricas de aciertos/fallos en GET /admin/cache
+- Cada acierto lleva el timestamp del momento en que se sirve: la entrada
+  guarda la posición del timestamp del sobre y se reemplaza en los bytes
+"""
+from fastapi.responses import Response
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+from app.utils.http_cache import catalog_headers, catalog_version
+from app.utils.responses import EnvelopeResponse, MSGPACK_MEDIA_TYPE, utc_timestamp
+import os
+import struct
+import threading
+
+try:
+    import redis
+except ImportError:  # dependencia opcional, solo para el backend compartido
+    redis = None
+
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+
+# Límite del backend en memoria (por worker)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Expiración en el backend compartido: las claves de versiones viejas no se vuelven a leer
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+# Cabecera de cada entrada: posición del timestamp del sobre en el cuerpo
+# (utc_timestamp() tiene largo fijo, así que se reemplaza sin reserializar)
+ENTRY_HEADER = struct.Struct(">I")
+NO_TIMESTAMP = 0xFFFFFFFF
+TIMESTAMP_LENGTH = len(utc_timestamp())
+
+
+class MemoryBackend:
+    """LRU en memoria acotado por el tamaño total de los valores"""
+    
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # Una respuesta enorme no debe vaciar la caché entera
+        self.max_entry_bytes = max_bytes // 8
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._data[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entradas": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "desalojos": self.evictions,
+        }
+
+
+class RedisBackend:
+    """Backend compartido entre workers (Redis, Valkey, KeyDB o cualquier servidor compatible)"""
+    
+    def __init__(self, url: str = RESPONSE_CACHE_URL, ttl: int = RESPONSE_CACHE_TTL,
+                 prefix: str = "bookapp:resp:v2:"):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requiere el paquete 'redis'")
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.errors = 0
+    
+    def get(self, key: str) -> Optional[bytes]:
+        # Si el servidor no responde se trata como un fallo de caché
+        try:
+            return self.client.get(self.prefix + key)
+        except redis.RedisError:
+            self.errors += 1
+            return None
+    
+    def set(self, key: str, value: bytes):
+        try:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        except redis.RedisError:
+            self.errors += 1
+    
+    def clear(self):
+        # Las claves viejas expiran solas (TTL); no hace falta recorrerlas
+        pass
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "url": self.url, "ttl": self.ttl, "errores": self.errors}
+
+
+def _create_backend():
+    if RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            backend = RedisBackend()
+            print(f"✅ Caché de respuestas compartida en {RESPONSE_CACHE_URL}")
+            return backend
+        except Exception as e:
+            print(f"⚠️ No se pudo usar la caché compartida ({e}), usando memoria local")
+    return MemoryBackend()
+
+
+class ResponseCache:
+    """Guarda y sirve respuestas JSON ya serializadas"""
+    
+    def __init__(self, backend=None):
+        self.backend = backend or _create_backend()
+        self.hits = 0
+        self.misses = 0
+        self._version: Optional[int] = None
+    
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        if isinstance(value, (list, tuple, set)):
+            return ",".join(sorted(str(v) for v in value))
+        return str(value)
+    
+    def make_key(self, version: int, name: str, params: Dict[str, Any]) -> str:
+        """Clave estable: el orden de los parámetros (y de los valores repetidos) no importa"""
+        partes = [
+            f"{k}={self._normalize(v)}"
+            for k, v in sorted(params.items())
+            if v is not None and isinstance(v, (str, int, float, bool, list, tuple, set))
+        ]
+        return f"{version:x}:{name}?{'&'.join(partes)}"
+    
+    def _current_version(self) -> int:
+        version = catalog_version.get()
+        if version != self._version:
+            # Las entradas de la versión anterior ya no se pueden leer: liberar memoria
+            self.backend.clear()
+            self._version = version
+        return version
+    
+    @staticmethod
+    def _entry(result: Response, body: bytes) -> bytes:
+        """Cuerpo a guardar precedido de la posición de su timestamp"""
+        content = getattr(result, "content", None)
+        timestamp = content.get("timestamp") if isinstance(content, dict) else None
+        offset = NO_TIMESTAMP
+        if isinstance(timestamp, str) and len(timestamp) == TIMESTAMP_LENGTH:
+            # El sobre serializa "timestamp" después de "data": la última aparición es la suya
+            found = body.rfind(timestamp.encode())
+            if found >= 0:
+                offset = found
+        return ENTRY_HEADER.pack(offset) + body
+    
+    @staticmethod
+    def _restamp(entry: bytes) -> bytes:
+        """Cuerpo guardado con el timestamp del sobre actualizado a ahora"""
+        (offset,) = ENTRY_HEADER.unpack_from(entry)
+        body = entry[ENTRY_HEADER.size:]
+        if offset == NO_TIMESTAMP:
+            return body
+        return body[:offset] + utc_timestamp().encode() + body[offset + TIMESTAMP_LENGTH:]
+    
+    def cached(self, name: str) -> Callable:
+        """
+        Decorador para endpoints que retornan el sobre estándar: cachea el JSON serializado
+        por parámetros. Va debajo de @router.get(...); agrega los headers de la
+        caché HTTP porque al retornar un Response FastAPI no aplica los de las dependencias.
+        """
+        def decorator(endpoint: Callable) -> Callable:
+            @wraps(endpoint)
+            def wrapper(*args, **kwargs):
+                version = self._current_version()
+                key = self.make_key(version, name, kwargs)
+                
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    body = self._restamp(entry)
+                else:
+                    self.misses += 1
+                    result = endpoint(*args, **kwargs)
+                    # create_success_response ya trae los bytes; un dict se serializa aquí
+                    if not isinstance(result, Response):
+                        result = EnvelopeResponse(result)
+                    body = result.body
+                    self.backend.set(key, self._entry(result, body))
+                
+                # Endpoints con negociación (parámetro `formato`): la clave y el ETag lo incluyen
+                headers = catalog_headers(version, kwargs.get("formato"))
+                media_type = MSGPACK_MEDIA_TYPE if kwargs.get("formato") == "msgpack" else "application/json"
+                return Response(content=body, media_type=media_type, headers=headers)
+            return wrapper
+        return decorator
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "aciertos": self.hits,
+            "fallos": self.misses,
+            "tasa_aciertos": round(self.hits / total, 4) if total else None,
+            "version_catalogo": self._version,
+            **self.backend.stats(),
+        }
+
+
+# Instancia singleton de la caché de respuestas
+response_cache = ResponseCache()
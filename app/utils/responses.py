@@ -1,11 +1,26 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from fastapi import Request
+from fastapi.responses import Response
 from typing import Generic, TypeVar, Optional, Any
-from datetime import datetime
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+import numpy as np
+import msgpack
+import orjson
 
 # TypeVar para hacer responses genéricos
 T = TypeVar('T')
 
 
+def utc_timestamp() -> str:
+    """
+    Timestamp de las respuestas: UTC, siempre con milisegundos y sufijo Z
+    (p. ej. 2024-05-01T13:45:02.120Z), igual en respuestas exitosas y de error.
+    """
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
 class StandardResponse(BaseModel, Generic[T]):
     """
     Respuesta estándar para todas las peticiones exitosas.
@@ -14,12 +29,7 @@ class StandardResponse(BaseModel, Generic[T]):
     success: bool = True
     data: T
     message: str = "Operación exitosa"
-    timestamp: datetime = datetime.utcnow()
-
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    timestamp: str = Field(default_factory=utc_timestamp)
 
 
 class ErrorDetail(BaseModel):
@@ -35,12 +45,7 @@ class ErrorResponse(BaseModel):
     """
     success: bool = False
     error: ErrorDetail
-    timestamp: datetime = datetime.utcnow()
-
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    timestamp: str = Field(default_factory=utc_timestamp)
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
@@ -56,12 +61,121 @@ class PaginatedResponse(BaseModel, Generic[T]):
         "has_more": False
     }
     message: str = "Operación exitosa"
-    timestamp: datetime = datetime.utcnow()
+    timestamp: str = Field(default_factory=utc_timestamp)
+
+
+def _orjson_default(obj: Any) -> Any:
+    """Tipos que orjson no serializa por sí solo"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class EnvelopeResponse(Response):
+    """
+    Respuesta JSON serializada directamente a bytes con orjson.
+    
+    Evita el recorrido de jsonable_encoder y json.dumps de JSONResponse: los
+    datetime, dicts y arrays de NumPy se codifican en C. El contenido original
+    queda en `content` por si otro componente necesita el dict.
+    """
+    media_type = "application/json"
+    
+    def __init__(self, content: Any, status_code: int = 200, **kwargs):
+        self.content = content
+        super().__init__(content, status_code=status_code, **kwargs)
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
+
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+def _accept_q(accept: str) -> dict:
+    """Media types del header Accept con su peso q"""
+    pesos = {}
+    for parte in accept.split(","):
+        media_type, *params = [p.strip() for p in parte.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            pesos[media_type.lower()] = max(q, pesos.get(media_type.lower(), 0.0))
+    return pesos
+
+
+def response_format(request: Request) -> str:
+    """
+    Dependencia de negociación de contenido para los endpoints masivos:
+    'msgpack' si el cliente prefiere application/msgpack en Accept, si no 'json'.
+    """
+    accept = request.headers.get("accept")
+    if not accept:
+        return "json"
+    pesos = _accept_q(accept)
+    q_msgpack = max(pesos.get(m, 0.0) for m in MSGPACK_MEDIA_TYPES)
+    q_json = pesos.get("application/json", pesos.get("application/*", pesos.get("*/*", 0.0)))
+    return "msgpack" if q_msgpack > 0 and q_msgpack >= q_json else "json"
+
+
+def to_columnar(value: Any) -> Any:
+    """
+    Convierte (recursivamente) cada lista de dicts con las mismas claves en
+    {"columns": {campo: [valores]}, "rows": n}: las claves se escriben una vez
+    por lista en lugar de una vez por elemento.
+    """
+    if isinstance(value, list):
+        if value and isinstance(value[0], dict):
+            claves = value[0].keys()
+            if all(isinstance(v, dict) and v.keys() == claves for v in value):
+                return {
+                    "columns": {k: to_columnar([v[k] for v in value]) for k in claves},
+                    "rows": len(value)
+                }
+        return [to_columnar(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_columnar(v) for k, v in value.items()}
+    return value
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Tipos que msgpack no serializa por sí solo (mismo formato que el JSON)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return _orjson_default(obj)
+
+
+class MsgpackEnvelopeResponse(EnvelopeResponse):
+    """
+    El mismo sobre codificado en MessagePack y en forma columnar: las listas
+    de objetos van como arrays paralelos por campo y el sobre lleva
+    "columnar": true para que el cliente sepa reconstruir las filas.
+    """
+    media_type = MSGPACK_MEDIA_TYPE
+    
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(
+            {**to_columnar(content), "columnar": True}, default=_msgpack_default, use_bin_type=True
+        )
 
 
 # Códigos de error estandarizados
@@ -100,6 +214,9 @@ class ErrorCodes:
     LANGUAGE_NOT_FOUND = "PREF_003"
     CATEGORY_NOT_FOUND = "PREF_004"
     
+    # Recomendaciones (1500-1599)
+    TRAINING_IN_PROGRESS = "REC_001"
+    
     # Validación (9000-9099)
     VALIDATION_ERROR = "VAL_001"
     INVALID_INPUT = "VAL_002"
@@ -113,8 +230,12 @@ class ErrorCodes:
 def create_success_response(
     data: Any,
     message: str = "Operación exitosa",
-    count: Optional[int] = None
-) -> dict:
+    count: Optional[int] = None,
+    pagination: Optional[dict] = None,
+    facets: Optional[dict] = None,
+    status_code: int = 200,
+    formato: Optional[str] = None
+) -> EnvelopeResponse:
     """
     Helper para crear respuestas exitosas de forma sencilla.
     
@@ -122,6 +243,11 @@ def create_success_response(
         data: Datos de la respuesta
         message: Mensaje descriptivo
         count: Cantidad de elementos (opcional, para listas)
+        pagination: Bloque de paginación por cursor (opcional, ver utils/pagination.py)
+        facets: Conteos por faceta del listado filtrado (opcional)
+        status_code: Código HTTP; al retornar un Response FastAPI no usa el del decorador
+        formato: Resultado de la dependencia response_format en los endpoints que
+            negocian el formato ('json' o 'msgpack'); agrega Vary: Accept
     
     Ejemplo:
         return create_success_response(
@@ -134,14 +260,23 @@ def create_success_response(
         "success": True,
         "data": data,
         "message": message,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": utc_timestamp()
     }
     
     # Añadir count solo si se proporciona
     if count is not None:
         response["count"] = count
     
-    return response
+    if pagination is not None:
+        response["pagination"] = pagination
+    
+    if facets is not None:
+        response["facets"] = facets
+    
+    if formato is None:
+        return EnvelopeResponse(response, status_code=status_code)
+    response_class = MsgpackEnvelopeResponse if formato == "msgpack" else EnvelopeResponse
+    return response_class(response, status_code=status_code, headers={"Vary": "Accept"})
 
 
 def create_error_response(
@@ -168,7 +303,7 @@ def create_error_response(
             "message": message,
             "details": details
         },
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": utc_timestamp()
     }
 
 
@@ -200,5 +335,5 @@ def create_paginated_response(
             "has_more": total > (page * page_size)
         },
         "message": message,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": utc_timestamp()
     }
@@ -0,0 +1,109 @@
+"""
+Benchmark de compresión de respuestas (bytes vs CPU)
+Comprime el cuerpo JSON de una página de /libros (la misma de
+benchmarks/responses.py) con los compresores de utils/compression.py a varios
+niveles y mide:
+- bytes resultantes y relación de compresión
+- tiempo de compresión (CPU del servidor) y de descompresión (cliente)
+
+Sirve para elegir COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY.
+Ejecutar: python -m benchmarks.compression [--books 100] [--repeticiones 300] [--output resultados.json]
+"""
+import sys
+from pathlib import Path
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime
+from typing import Dict
+
+# Agregar el directorio raíz al path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import numpy as np
+
+from app.utils.compression import (
+    BrotliCompressor,
+    GzipCompressor,
+    brotli,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+)
+from app.utils.responses import create_success_response
+from benchmarks.responses import build_page, git_commit, latency_stats, measure
+
+
+GZIP_LEVELS = [1, 3, 6, 9]
+BROTLI_QUALITIES = [1, 4, 5, 6, 9, 11]
+
+
+def compress(compressor, body: bytes) -> bytes:
+    return compressor.compress(body) + compressor.finish()
+
+
+def bench_variant(body: bytes, make_compressor, decompress, repeticiones: int) -> Dict:
+    comprimido = compress(make_compressor(), body)
+    assert decompress(comprimido) == body
+    compresion = latency_stats(measure(lambda: compress(make_compressor(), body), repeticiones))
+    descompresion = latency_stats(measure(lambda: decompress(comprimido), repeticiones))
+    return {
+        "bytes": len(comprimido),
+        "relacion": round(len(body) / len(comprimido), 2),
+        "compresion_p50_ms": compresion["p50_ms"],
+        "compresion_p99_ms": compresion["p99_ms"],
+        "descompresion_p50_ms": descompresion["p50_ms"],
+    }
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas")
+    parser.add_argument("--books", type=int, default=100, help="Libros en la página")
+    parser.add_argument("--repeticiones", type=int, default=300, help="Mediciones por variante")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON de resultados (default: stdout)")
+    args = parser.parse_args()
+    
+    body = create_success_response(**build_page(args.books, np.random.default_rng(args.seed))).body
+    
+    variantes = {}
+    for level in GZIP_LEVELS:
+        print(f"⏱️ gzip nivel {level}...", file=sys.stderr)
+        variantes[f"gzip-{level}"] = bench_variant(
+            body, lambda: GzipCompressor(level), lambda data: zlib.decompress(data, 47), args.repeticiones
+        )
+    
+    for quality in BROTLI_QUALITIES:
+        print(f"⏱️ brotli calidad {quality}...", file=sys.stderr)
+        # Calidades altas son muy lentas: menos repeticiones
+        repeticiones = args.repeticiones if quality < 10 else max(10, args.repeticiones // 20)
+        variantes[f"br-{quality}"] = bench_variant(
+            body, lambda: BrotliCompressor(quality), brotli.decompress, repeticiones
+        )
+    
+    resultados = {
+        "commit": git_commit(),
+        "fecha": datetime.utcnow().isoformat(),
+        "config": {
+            "books": args.books,
+            "repeticiones": args.repeticiones,
+            "seed": args.seed,
+            "gzip_level_actual": COMPRESSION_GZIP_LEVEL,
+            "brotli_quality_actual": COMPRESSION_BROTLI_QUALITY,
+        },
+        "sin_comprimir_bytes": len(body),
+        "variantes": variantes,
+    }
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    
+    if args.output:
+        Path(args.output).write_text(texto, encoding="utf-8")
+        print(f"✅ Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
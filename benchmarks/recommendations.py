@@ -0,0 +1,417 @@
+"""
+Benchmark de latencia y calidad del sistema de recomendaciones
+Genera usuarios, preferencias y lecturas sintéticas a la escala indicada en
+una base SQLite temporal (o en la base vacía de --db-url), y mide:
+- train_model: tiempo, consultas y filas leídas
+- get_user_cluster y get_recommendations: p50/p95/p99, consultas y filas por llamada
+- precision@k / recall@k contra lecturas reservadas (held-out) y un baseline de popularidad
+
+Los resultados se escriben en JSON para compararlos entre commits.
+--pesos reemplaza los pesos de mezcla de las señales para compararlos; los
+libros y lecturas sintéticos salen del mismo perfil, así que el contenido gana
+por construcción y los pesos por defecto no se ajustan con estos datos.
+Ejecutar: python -m benchmarks.recommendations --users 10000 [--db-url postgresql://...] [--output resultados.json]
+          python -m benchmarks.recommendations --users 3000 --books 1000 --samples 3000 --pesos cluster=0.6,contenido=0.3
+"""
+import sys
+from pathlib import Path
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+# Agregar el directorio raíz al path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import numpy as np
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, EstadoUsuario
+from app.models.usuario import Usuario
+from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
+from app.models.lectura import Lectura, EstadoLectura
+from app.models.preferencia import Categoria, Lenguaje, Preferencia, PreferenciaCategoria, PreferenciaLenguaje
+from app.models.nivel import Nivel
+
+
+N_CATEGORIAS = 20
+N_LENGUAJES = 12
+N_EDITORIALES = 20
+N_AUTORES = 200
+
+# Perfiles latentes: cada usuario y cada libro pertenecen a uno, y los
+# usuarios leen sobre todo libros de su perfil (señal que el modelo debe recuperar)
+N_PERFILES = 12
+
+# Probabilidad de que una lectura sea de un libro fuera del perfil del usuario
+RUIDO_LECTURAS = 0.2
+
+INSERT_BATCH = 50000
+
+# Nombre en --pesos -> constante de recommendation_service
+PESOS = {
+    "cluster": "CLUSTER_WEIGHT",
+    "colaborativo": "COLLABORATIVE_WEIGHT",
+    "contenido": "CONTENT_WEIGHT",
+    "vecinos": "NEIGHBOUR_WEIGHT",
+}
+
+
+class QueryCounter:
+    """
+    Cuenta sentencias ejecutadas y filas leídas en un engine
+    
+    Las filas se cuentan envolviendo el cursor DBAPI de cada sentencia, así
+    el conteo es el mismo en SQLite y en Postgres.
+    """
+
+    class _Cursor:
+        def __init__(self, cursor, counter):
+            self._cursor = cursor
+            self._counter = counter
+        
+        def fetchone(self):
+            row = self._cursor.fetchone()
+            if row is not None:
+                self._counter.rows += 1
+            return row
+        
+        def fetchmany(self, *args):
+            rows = self._cursor.fetchmany(*args)
+            self._counter.rows += len(rows)
+            return rows
+        
+        def fetchall(self):
+            rows = self._cursor.fetchall()
+            self._counter.rows += len(rows)
+            return rows
+        
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+    
+    def __init__(self, engine):
+        self.queries = 0
+        self.rows = 0
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+    
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+        if context is not None and cursor.description is not None:
+            context.cursor = self._Cursor(cursor, self)
+    
+    def snapshot(self):
+        return self.queries, self.rows
+
+
+def _insert(session, model, rows: List[Dict]):
+    for start in range(0, len(rows), INSERT_BATCH):
+        session.execute(insert(model), rows[start:start + INSERT_BATCH])
+
+
+def generate_dataset(session, n_users: int, n_books: int, lecturas_por_usuario: int,
+                     holdout: float, rng: np.random.Generator) -> Dict[int, set]:
+    """
+    Inserta el catálogo, los usuarios con preferencias y las lecturas visibles
+    
+    Returns:
+        Dict idUsuario -> set de idLibro reservados (no insertados) para evaluar
+    """
+    _insert(session, Nivel, [{"idNivel": i, "nombre": n} for i, n in
+                             enumerate(["Principiante", "Intermedio", "Avanzado"], start=1)])
+    _insert(session, Categoria, [{"idCategoria": i, "nombre": f"Categoria {i}"} for i in range(1, N_CATEGORIAS + 1)])
+    _insert(session, Lenguaje, [{"idLenguaje": i, "nombre": f"Lenguaje {i}"} for i in range(1, N_LENGUAJES + 1)])
+    _insert(session, Editorial, [{"idEditorial": i, "nombre": f"Editorial {i}"} for i in range(1, N_EDITORIALES + 1)])
+    _insert(session, Autor, [{"idAutor": i, "nombre": f"Autor {i}"} for i in range(1, N_AUTORES + 1)])
+    
+    # Cada perfil tiene 2 categorías y 2 lenguajes característicos
+    perfil_categorias = rng.integers(1, N_CATEGORIAS + 1, size=(N_PERFILES, 2))
+    perfil_lenguajes = rng.integers(1, N_LENGUAJES + 1, size=(N_PERFILES, 2))
+    palabras = [f"tema{i}" for i in range(200)]
+    
+    libro_perfil = rng.integers(0, N_PERFILES, size=n_books)
+    libros, autor_libros, libro_categorias, libro_lenguajes = [], [], [], []
+    for i in range(n_books):
+        lid = i + 1
+        perfil = libro_perfil[i]
+        temas = rng.choice(palabras[perfil * 10:perfil * 10 + 30], size=8)
+        libros.append({
+            "idLibro": lid,
+            "titulo": f"Libro {lid} {' '.join(temas[:3])}",
+            "totalPaginas": int(rng.integers(80, 900)),
+            "sinopsis": " ".join(temas),
+            "idEditorial": int(rng.integers(1, N_EDITORIALES + 1)),
+        })
+        autor_libros.append({"idLibro": lid, "idAutor": int(rng.integers(1, N_AUTORES + 1))})
+        # Algunos libros quedan sin etiquetas, como en el catálogo real
+        if rng.random() < 0.8:
+            libro_categorias.append({"idLibro": lid, "idCategoria": int(perfil_categorias[perfil, rng.integers(0, 2)])})
+            libro_lenguajes.append({"idLibro": lid, "idLenguaje": int(perfil_lenguajes[perfil, rng.integers(0, 2)])})
+    _insert(session, Libro, libros)
+    _insert(session, AutorLibro, autor_libros)
+    _insert(session, LibroCategoria, libro_categorias)
+    _insert(session, LibroLenguaje, libro_lenguajes)
+    
+    libros_por_perfil = [np.flatnonzero(libro_perfil == p) + 1 for p in range(N_PERFILES)]
+    estados = list(EstadoLectura)
+    pesos_estado = [0.15, 0.35, 0.4, 0.1]
+    
+    usuario_perfil = rng.integers(0, N_PERFILES, size=n_users)
+    usuarios, preferencias, pref_categorias, pref_lenguajes, lecturas = [], [], [], [], []
+    reservadas: Dict[int, set] = {}
+    for i in range(n_users):
+        uid = i + 1
+        perfil = usuario_perfil[i]
+        usuarios.append({
+            "idUsuario": uid,
+            "registro": f"bench{uid}",
+            "nombre": f"Usuario {uid}",
+            "email": f"bench{uid}@example.com",
+            "password": "x",
+            "estado": EstadoUsuario.ACTIVO,
+        })
+        preferencias.append({"idPreferencias": uid, "idUsuario": uid, "idNivel": int(rng.integers(1, 4))})
+        for cid in set(perfil_categorias[perfil].tolist()):
+            pref_categorias.append({"idPreferencias": uid, "idCategoria": cid})
+        for lid in set(perfil_lenguajes[perfil].tolist()):
+            pref_lenguajes.append({"idPreferencias": uid, "idLenguaje": lid})
+        
+        propios = libros_por_perfil[perfil]
+        n_propios = min(len(propios), int(round(lecturas_por_usuario * (1 - RUIDO_LECTURAS))))
+        leidos = set(rng.choice(propios, size=n_propios, replace=False).tolist()) if n_propios else set()
+        while len(leidos) < min(lecturas_por_usuario, n_books):
+            leidos.add(int(rng.integers(1, n_books + 1)))
+        leidos = list(leidos)
+        
+        n_reservadas = int(len(leidos) * holdout)
+        if n_reservadas:
+            reservadas[uid] = set(leidos[:n_reservadas])
+        for lid in leidos[n_reservadas:]:
+            lecturas.append({
+                "idUsuario": uid,
+                "idLibro": lid,
+                "paginaLeidas": 0,
+                "estado": estados[rng.choice(len(estados), p=pesos_estado)],
+            })
+    _insert(session, Usuario, usuarios)
+    _insert(session, Preferencia, preferencias)
+    _insert(session, PreferenciaCategoria, pref_categorias)
+    _insert(session, PreferenciaLenguaje, pref_lenguajes)
+    _insert(session, Lectura, lecturas)
+    session.commit()
+    return reservadas
+
+
+def latency_stats(tiempos: List[float], consultas: List[int], filas: List[int]) -> Dict:
+    """Percentiles en milisegundos y promedios de consultas/filas por llamada"""
+    ms = np.array(tiempos) * 1000
+    return {
+        "llamadas": len(tiempos),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "media_ms": round(float(ms.mean()), 3),
+        "consultas_media": round(float(np.mean(consultas)), 2),
+        "filas_media": round(float(np.mean(filas)), 2),
+    }
+
+
+def measure(counter: QueryCounter, fn):
+    """Ejecuta fn y retorna (resultado, segundos, consultas, filas)"""
+    queries, rows = counter.snapshot()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, counter.queries - queries, counter.rows - rows
+
+
+def parse_pesos(texto: str) -> Dict[str, float]:
+    """"cluster=0.2,contenido=1" -> {"cluster": 0.2, "contenido": 1.0}"""
+    pesos = {}
+    for parte in filter(None, texto.split(",")):
+        nombre, _, valor = parte.partition("=")
+        if nombre.strip() not in PESOS:
+            raise argparse.ArgumentTypeError(f"Peso desconocido: {nombre}. Use {', '.join(PESOS)}")
+        pesos[nombre.strip()] = float(valor)
+    return pesos
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "desconocido"
+
+
+def main():
+    """Función principal"""
+    # Los mensajes de los servicios van a stderr para no mezclarse con el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        texto, output = run()
+    
+    if output:
+        output.write_text(texto, encoding="utf-8")
+        print(f"✅ Resultados guardados en {output}", file=sys.stderr)
+    else:
+        print(texto)
+
+
+def run():
+    """Genera los datos, corre las mediciones y retorna (json, archivo de salida)"""
+    parser = argparse.ArgumentParser(description="Benchmark de RecommendationService")
+    parser.add_argument("--users", type=int, default=10000, help="Usuarios sintéticos (10000/100000/1000000)")
+    parser.add_argument("--books", type=int, default=2000, help="Libros sintéticos")
+    parser.add_argument("--lecturas", type=int, default=10, help="Lecturas por usuario")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fracción de lecturas reservadas para evaluar")
+    parser.add_argument("--clusters", type=int, default=5, help="n_clusters de train_model")
+    parser.add_argument("--modo", default="dense", help="Modo de train_model (dense/sparse)")
+    parser.add_argument("--samples", type=int, default=200, help="Usuarios muestreados para latencia y calidad")
+    parser.add_argument("--k", type=int, default=10, help="k de precision@k / recall@k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--pesos", type=parse_pesos, default={},
+                        help="Pesos de mezcla a usar, p. ej. cluster=0.6,colaborativo=0.4,contenido=0.3,vecinos=0.3")
+    parser.add_argument("--db-url", help="Base vacía a usar en lugar de SQLite temporal (p. ej. Postgres local)")
+    parser.add_argument("--output", help="Archivo JSON de resultados (default: stdout)")
+    args = parser.parse_args()
+    
+    output = Path(args.output).resolve() if args.output else None
+    
+    # Los servicios escriben sus artefactos en ./models: se usa un directorio
+    # temporal para no tocar los modelos del proyecto, y se borra al terminar
+    workdir = tempfile.mkdtemp(prefix="bench-recomendaciones-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    engine = None
+    try:
+        db_url = args.db_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        engine = create_engine(db_url)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        
+        import app.services.recommendation_service as recommendation_module
+        from app.services.recommendation_service import recommendation_service
+        
+        for nombre, valor in args.pesos.items():
+            setattr(recommendation_module, PESOS[nombre], valor)
+        pesos = {nombre: getattr(recommendation_module, constante) for nombre, constante in PESOS.items()}
+        
+        rng = np.random.default_rng(args.seed)
+        db = Session()
+        if db.query(Usuario.idUsuario).first() is not None:
+            print("❌ La base indicada ya tiene usuarios; use una base vacía", file=sys.stderr)
+            sys.exit(1)
+        
+        print(f"📊 Generando {args.users} usuarios y {args.books} libros...", file=sys.stderr)
+        start = time.perf_counter()
+        reservadas = generate_dataset(db, args.users, args.books, args.lecturas, args.holdout, rng)
+        generation_seconds = time.perf_counter() - start
+        
+        counter = QueryCounter(engine)
+        
+        print("🔄 Entrenando modelo...", file=sys.stderr)
+        _, train_seconds, train_queries, train_rows = measure(
+            counter, lambda: recommendation_service.train_model(db, args.clusters, modo=args.modo)
+        )
+        
+        sample = rng.choice(np.arange(1, args.users + 1), size=min(args.samples, args.users), replace=False)
+        usuarios = {u.idUsuario: u for u in db.query(Usuario).filter(Usuario.idUsuario.in_(sample.tolist()))}
+        
+        cluster_t, cluster_q, cluster_r = [], [], []
+        recs_t, recs_q, recs_r = [], [], []
+        cached_t = []
+        precision, recall = [], []
+        pop_precision, pop_recall = [], []
+        
+        # Baseline: los libros más leídos que el usuario no leyó
+        libro_ids, conteos = np.unique([lid for (lid,) in db.query(Lectura.idLibro)], return_counts=True)
+        populares = libro_ids[np.argsort(-conteos, kind="stable")].tolist()
+        
+        print(f"⏱️ Midiendo {len(sample)} usuarios...", file=sys.stderr)
+        for uid in sample.tolist():
+            usuario = usuarios[uid]
+            db.expire_all()
+            
+            _, t, q, r = measure(counter, lambda: recommendation_service.get_user_cluster(usuario, db))
+            cluster_t.append(t); cluster_q.append(q); cluster_r.append(r)
+            
+            recommendation_service.results_cache.clear()
+            db.expire_all()
+            recs, t, q, r = measure(counter, lambda: recommendation_service.get_recommendations(uid, db, args.k))
+            recs_t.append(t); recs_q.append(q); recs_r.append(r)
+            
+            _, t, _, _ = measure(counter, lambda: recommendation_service.get_recommendations(uid, db, args.k))
+            cached_t.append(t)
+            
+            objetivo = reservadas.get(uid)
+            if objetivo:
+                recomendados = {rec["idLibro"] for rec in recs[:args.k]}
+                aciertos = len(recomendados & objetivo)
+                precision.append(aciertos / args.k)
+                recall.append(aciertos / len(objetivo))
+                
+                leidos = {lid for (lid,) in db.query(Lectura.idLibro).filter(Lectura.idUsuario == uid)}
+                top_pop = [lid for lid in populares if lid not in leidos][:args.k]
+                aciertos_pop = len(set(top_pop) & objetivo)
+                pop_precision.append(aciertos_pop / args.k)
+                pop_recall.append(aciertos_pop / len(objetivo))
+        
+        resultados = {
+            "commit": git_commit(),
+            "fecha": datetime.utcnow().isoformat(),
+            "config": {
+                "users": args.users,
+                "books": args.books,
+                "lecturas_por_usuario": args.lecturas,
+                "holdout": args.holdout,
+                "clusters": args.clusters,
+                "modo": args.modo,
+                "samples": len(sample),
+                "k": args.k,
+                "seed": args.seed,
+                "pesos": pesos,
+                "db": engine.dialect.name,
+            },
+            "dataset": {"segundos_generacion": round(generation_seconds, 3)},
+            "train_model": {
+                "segundos": round(train_seconds, 3),
+                "consultas": train_queries,
+                "filas": train_rows,
+            },
+            "get_user_cluster": latency_stats(cluster_t, cluster_q, cluster_r),
+            "get_recommendations": latency_stats(recs_t, recs_q, recs_r),
+            "get_recommendations_cache": {
+                "p50_ms": round(float(np.percentile(np.array(cached_t) * 1000, 50)), 3),
+                "p99_ms": round(float(np.percentile(np.array(cached_t) * 1000, 99)), 3),
+            },
+            "calidad": {
+                "usuarios_evaluados": len(precision),
+                f"precision@{args.k}": round(float(np.mean(precision)), 4) if precision else None,
+                f"recall@{args.k}": round(float(np.mean(recall)), 4) if recall else None,
+                "baseline_popularidad": {
+                    f"precision@{args.k}": round(float(np.mean(pop_precision)), 4) if pop_precision else None,
+                    f"recall@{args.k}": round(float(np.mean(pop_recall)), 4) if pop_recall else None,
+                },
+            },
+        }
+        db.close()
+        
+        return json.dumps(resultados, indent=2, ensure_ascii=False), output
+    finally:
+        # Volver al directorio original y borrar la base y los modelos temporales
+        os.chdir(cwd)
+        if engine is not None:
+            engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
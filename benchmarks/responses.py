@@ -0,0 +1,183 @@
+"""
+Benchmark de serialización del sobre estándar de respuestas
+Arma una página de /libros (100 libros con editorial y autores, paginación y
+facetas) tal como la devuelve read_libros y mide el tiempo de convertirla a bytes:
+- antes: dict -> jsonable_encoder -> JSONResponse (json.dumps), lo que hacía FastAPI
+- después: create_success_response -> EnvelopeResponse (orjson)
+- msgpack: la variante columnar de Accept: application/msgpack, con el tiempo
+  de decodificación del cliente frente a json.loads
+
+Verifica además que ambos cuerpos decodifiquen al mismo JSON (salvo el timestamp).
+Ejecutar: python -m benchmarks.responses [--books 100] [--repeticiones 2000] [--output resultados.json]
+"""
+import sys
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+# Agregar el directorio raíz al path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import msgpack
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas.libro import LibroResponse, EditorialResponse, AutorResponse
+from app.utils.pagination import encode_cursor
+from app.utils.responses import create_success_response
+
+
+def build_page(n_books: int, rng: np.random.Generator) -> Dict:
+    """Datos de una página de /libros con la forma de _libro_response"""
+    libros = []
+    for i in range(1, n_books + 1):
+        editorial_id = int(rng.integers(1, 21))
+        libro = LibroResponse(
+            idLibro=i,
+            titulo=f"Libro de prueba número {i}: una introducción práctica",
+            totalPaginas=int(rng.integers(80, 900)),
+            sinopsis="Sinopsis de ejemplo con acentos (introducción, programación) " * 6,
+            urlLibro=f"https://bucket.s3.amazonaws.com/libros/{i}.pdf",
+            urlPortada=f"https://bucket.s3.amazonaws.com/portadas/{i}.jpg",
+            idEditorial=editorial_id,
+            editorial=EditorialResponse(idEditorial=editorial_id, nombre=f"Editorial {editorial_id}"),
+            autores=[
+                AutorResponse(idAutor=int(a), nombre=f"Autor {int(a)}")
+                for a in rng.choice(np.arange(1, 201), size=int(rng.integers(1, 4)), replace=False)
+            ],
+        )
+        libros.append(libro.model_dump())
+    
+    facetas = {
+        "total": 5000,
+        "categoria": [{"id": c, "nombre": f"Categoría {c}", "count": int(rng.integers(1, 500))} for c in range(1, 21)],
+        "lenguaje": [{"id": l, "nombre": f"Lenguaje {l}", "count": int(rng.integers(1, 500))} for l in range(1, 13)],
+        "editorial": [{"id": e, "nombre": f"Editorial {e}", "count": int(rng.integers(1, 500))} for e in range(1, 21)],
+        "autor": [{"id": a, "nombre": f"Autor {a}", "count": int(rng.integers(1, 50))} for a in range(1, 51)],
+        "paginas": {"min": 80, "max": 899},
+    }
+    return {
+        "data": libros,
+        "message": "Libros obtenidos exitosamente",
+        "count": len(libros),
+        "pagination": {"next_cursor": encode_cursor(n_books), "has_more": True},
+        "facets": facetas,
+    }
+
+
+def encode_before(page: Dict) -> bytes:
+    """Camino anterior: el endpoint retornaba un dict y FastAPI lo codificaba"""
+    envelope = {
+        "success": True,
+        "data": page["data"],
+        "message": page["message"],
+        "timestamp": datetime.utcnow().isoformat(),
+        "count": page["count"],
+        "pagination": page["pagination"],
+        "facets": page["facets"],
+    }
+    return JSONResponse(content=jsonable_encoder(envelope)).body
+
+
+def encode_after(page: Dict) -> bytes:
+    return create_success_response(**page).body
+
+
+def encode_msgpack(page: Dict) -> bytes:
+    return create_success_response(**page, formato="msgpack").body
+
+
+def measure(fn: Callable[[], object], repeticiones: int) -> List[float]:
+    # Calentamiento
+    for _ in range(min(50, repeticiones)):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def latency_stats(tiempos: List[float]) -> Dict:
+    ms = np.array(tiempos) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "media_ms": round(float(ms.mean()), 4),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "desconocido"
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de respuestas")
+    parser.add_argument("--books", type=int, default=100, help="Libros en la página")
+    parser.add_argument("--repeticiones", type=int, default=2000, help="Codificaciones medidas por variante")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON de resultados (default: stdout)")
+    args = parser.parse_args()
+    
+    page = build_page(args.books, np.random.default_rng(args.seed))
+    
+    antes_body = encode_before(page)
+    despues_body = encode_after(page)
+    antes_json = json.loads(antes_body)
+    despues_json = json.loads(despues_body)
+    antes_json.pop("timestamp")
+    despues_json.pop("timestamp")
+    if antes_json != despues_json:
+        print("❌ Los cuerpos no coinciden", file=sys.stderr)
+        sys.exit(1)
+    
+    print(f"⏱️ Midiendo {args.repeticiones} codificaciones por variante...", file=sys.stderr)
+    antes = latency_stats(measure(lambda: encode_before(page), args.repeticiones))
+    despues = latency_stats(measure(lambda: encode_after(page), args.repeticiones))
+    
+    resultados = {
+        "commit": git_commit(),
+        "fecha": datetime.utcnow().isoformat(),
+        "config": {"books": args.books, "repeticiones": args.repeticiones, "seed": args.seed},
+        "antes_jsonable_encoder_jsonresponse": {**antes, "bytes": len(antes_body)},
+        "despues_envelope_orjson": {**despues, "bytes": len(despues_body)},
+        "aceleracion_p50": round(antes["p50_ms"] / despues["p50_ms"], 2) if despues["p50_ms"] else None,
+    }
+    
+    msgpack_body = encode_msgpack(page)
+    resultados["msgpack_columnar"] = {
+        **latency_stats(measure(lambda: encode_msgpack(page), args.repeticiones)),
+        "bytes": len(msgpack_body),
+        "decodificar_json_p50_ms": latency_stats(
+            measure(lambda: json.loads(despues_body), args.repeticiones)
+        )["p50_ms"],
+        "decodificar_msgpack_p50_ms": latency_stats(
+            measure(lambda: msgpack.unpackb(msgpack_body), args.repeticiones)
+        )["p50_ms"],
+    }
+    
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    
+    if args.output:
+        Path(args.output).write_text(texto, encoding="utf-8")
+        print(f"✅ Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
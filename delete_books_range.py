@@ -1,6 +1,8 @@
 """Script para borrar libros del ID 1 al 33"""
 from app.database.session import SessionLocal
 from app.models.libro import Libro
+from app.services.content_service import content_service
+from app.utils.http_cache import catalog_version
 
 db = SessionLocal()
 
@@ -17,6 +19,11 @@ try:
     db.commit()
     print(f"\n✓ {len(libros)} libros eliminados correctamente")
     
+    # Quitar los libros del índice de contenido e invalidar las cachés del catálogo
+    if libros:
+        content_service.remove([libro.idLibro for libro in libros])
+        catalog_version.bump()
+    
 except Exception as e:
     print(f"Error: {str(e)}")
     db.rollback()
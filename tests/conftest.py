@@ -0,0 +1,189 @@
+"""
+Fixtures compartidas de los tests
+- Base SQLite en memoria nueva por test (misma conexión para todos los hilos)
+- Catálogo chico de ejemplo, un usuario autenticado y lectores con
+  preferencias e historial para entrenar el modelo de recomendaciones
+- Contador de sentencias SQL (after_cursor_execute) para fijar el número de
+  consultas por endpoint y detectar regresiones N+1
+"""
+import os
+import tempfile
+
+# Antes de importar la app: sin credenciales reales ni archivos del proyecto
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+os.environ.setdefault("AWS_BUCKET_NAME", "test")
+os.environ.setdefault(
+    "CATALOG_VERSION_FILE", os.path.join(tempfile.mkdtemp(prefix="bookapp-tests-"), "catalog_version")
+)
+
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import app.database.session as session_module
+from app.main import app
+from app.models import Base, EstadoUsuario
+from app.models.usuario import Usuario
+from app.models.lectura import Lectura, EstadoLectura
+from app.models.libro import Libro, Autor, Editorial, AutorLibro, LibroCategoria, LibroLenguaje
+from app.models.preferencia import (
+    Categoria,
+    Lenguaje,
+    Preferencia,
+    PreferenciaCategoria,
+    PreferenciaLenguaje
+)
+from app.models.nivel import Nivel
+from app.services.auth import get_current_active_user
+from app.services.facet_service import facet_service
+from app.services.recommendation_service import recommendation_service
+from app.utils.http_cache import catalog_version
+from app.utils.response_cache import response_cache
+
+
+N_LIBROS = 30
+N_AUTORES = 6
+N_EDITORIALES = 3
+N_LECTORES = 24
+
+
+class QueryCounter:
+    """Registra las sentencias que ejecuta el engine desde el último reset()"""
+    
+    def __init__(self, engine):
+        self.statements: List[str] = []
+        event.listen(engine, "after_cursor_execute", self._on_execute)
+    
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+    
+    def reset(self):
+        self.statements.clear()
+    
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+    
+    def selects(self) -> List[str]:
+        return [s for s in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Base en memoria enlazada a SessionLocal; los artefactos de models/ van a tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_module.SessionLocal.configure(bind=engine)
+    
+    # Cachés a nivel de proceso: empezar cada test con una versión del catálogo nueva
+    catalog_version.bump()
+    response_cache.backend.clear()
+    facet_service._index = None
+    recommendation_service.registry._snapshot = None
+    recommendation_service.registry.invalidate()
+    recommendation_service.results_cache.clear()
+    
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = session_module.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def catalogo(db):
+    """Catálogo de ejemplo: cada libro tiene dos autores, dos categorías y un lenguaje"""
+    db.add_all([Nivel(nombre=n) for n in ["Principiante", "Intermedio", "Avanzado"]])
+    db.add_all([Categoria(nombre=f"Categoria {i}") for i in range(1, 5)])
+    db.add_all([Lenguaje(nombre=f"Lenguaje {i}") for i in range(1, 4)])
+    db.add_all([Editorial(nombre=f"Editorial {i}") for i in range(1, N_EDITORIALES + 1)])
+    db.add_all([Autor(nombre=f"Autor {i}") for i in range(1, N_AUTORES + 1)])
+    db.commit()
+    
+    for i in range(1, N_LIBROS + 1):
+        libro = Libro(
+            titulo=f"Libro {i}",
+            totalPaginas=100 + i,
+            sinopsis=f"Sinopsis del libro {i}",
+            idEditorial=i % N_EDITORIALES + 1
+        )
+        db.add(libro)
+        db.flush()
+        db.add_all([
+            AutorLibro(idAutor=i % N_AUTORES + 1, idLibro=libro.idLibro),
+            AutorLibro(idAutor=(i + 1) % N_AUTORES + 1, idLibro=libro.idLibro),
+            LibroCategoria(idLibro=libro.idLibro, idCategoria=i % 4 + 1),
+            LibroCategoria(idLibro=libro.idLibro, idCategoria=(i + 1) % 4 + 1),
+            LibroLenguaje(idLibro=libro.idLibro, idLenguaje=i % 3 + 1),
+        ])
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def usuario(db):
+    usuario = Usuario(
+        registro="test001", nombre="Usuario Test", email="test@example.com",
+        password="x", estado=EstadoUsuario.ACTIVO
+    )
+    db.add(usuario)
+    db.commit()
+    db.refresh(usuario)
+    db.expunge(usuario)
+    return usuario
+
+
+@pytest.fixture
+def lectores(catalogo) -> List[int]:
+    """
+    Usuarios con preferencias y lecturas: el lector i prefiere la categoría
+    i % 4 + 1 y el lenguaje i % 3 + 1, y leyó los libros de esa categoría
+    """
+    db = catalogo
+    ids = []
+    for i in range(N_LECTORES):
+        lector = Usuario(
+            registro=f"lector{i:03d}", nombre=f"Lector {i}", email=f"lector{i}@example.com",
+            password="x", estado=EstadoUsuario.ACTIVO
+        )
+        db.add(lector)
+        db.flush()
+        preferencia = Preferencia(idUsuario=lector.idUsuario, idNivel=i % 3 + 1)
+        db.add(preferencia)
+        db.flush()
+        db.add_all([
+            PreferenciaCategoria(idPreferencias=preferencia.idPreferencias, idCategoria=i % 4 + 1),
+            PreferenciaLenguaje(idPreferencias=preferencia.idPreferencias, idLenguaje=i % 3 + 1),
+        ])
+        # Los libros j tienen las categorías j % 4 + 1 y (j + 1) % 4 + 1
+        db.add_all([
+            Lectura(idUsuario=lector.idUsuario, idLibro=j, paginaLeidas=10, estado=EstadoLectura.COMPLETADO)
+            for j in range(1, N_LIBROS + 1) if j % 4 == i % 4
+        ][:4])
+        ids.append(lector.idUsuario)
+    db.commit()
+    return ids
+
+
+@pytest.fixture
+def client(engine, usuario):
+    """Cliente autenticado: el usuario ya está cargado, así no suma consultas"""
+    app.dependency_overrides[get_current_active_user] = lambda: usuario
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def queries(engine) -> QueryCounter:
+    counter = QueryCounter(engine)
+    yield counter
+    event.remove(engine, "after_cursor_execute", counter._on_execute)
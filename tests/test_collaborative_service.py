@@ -0,0 +1,44 @@
+"""
+Matriz item-item: matriz e ids de libros se publican en un solo archivo
+"""
+import os
+
+import numpy as np
+
+from app.models.lectura import EstadoLectura, Lectura
+from app.services.collaborative_service import CollaborativeService
+
+
+def test_matriz_e_ids_se_publican_juntos(lectores, db):
+    servicio = CollaborativeService()
+    servicio.build(db)
+    matriz, libro_ids = servicio._load()
+    
+    assert os.listdir("models") == ["item_similarity.npz"]
+    assert matriz.shape == (len(libro_ids), len(libro_ids))
+    
+    # Un libro nuevo con lecturas cambia ids y matriz a la vez
+    db.add_all([
+        Lectura(idUsuario=usuario_id, idLibro=30, paginaLeidas=10, estado=EstadoLectura.COMPLETADO)
+        for usuario_id in lectores[:3]
+    ])
+    db.commit()
+    servicio.build(db)
+    
+    otro_worker = CollaborativeService()
+    matriz_nueva, ids_nuevos = otro_worker._load()
+    assert 30 in ids_nuevos and 30 not in libro_ids
+    assert matriz_nueva.shape == (len(ids_nuevos), len(ids_nuevos))
+    assert servicio._load()[1].tolist() == ids_nuevos.tolist()
+
+
+def test_similares_y_puntaje_con_la_matriz_cargada(lectores, db):
+    servicio = CollaborativeService()
+    servicio.build(db)
+    
+    # El lector 0 leyó los libros 4, 8, 12 y 16: se co-leen entre sí
+    similares = [lid for lid, _ in servicio.similar_books(4)]
+    assert similares and set(similares) <= {8, 12, 16, 20, 24, 28}
+    puntajes = servicio.score_for_user({4: EstadoLectura.COMPLETADO})
+    assert puntajes and all(lid != 4 for lid, _ in puntajes)
+    assert np.all(np.diff([score for _, score in puntajes]) <= 0)
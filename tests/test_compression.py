@@ -0,0 +1,132 @@
+"""
+Middleware de compresión: negociación, umbral, tipos excluidos y respuestas sin cuerpo
+"""
+import gzip
+
+import brotli
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.utils.compression import CompressionMiddleware, choose_encoding
+
+
+TEXTO = "linea de texto repetida para comprimir\n" * 200
+LINEAS = [f"linea {i} " * 40 + "\n" for i in range(50)]
+
+
+def crear_app(minimum_size: int = 1024) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+    
+    @app.get("/texto")
+    def texto():
+        return PlainTextResponse(TEXTO)
+    
+    @app.get("/chico")
+    def chico():
+        return PlainTextResponse("ok")
+    
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter(LINEAS), media_type="text/plain")
+    
+    @app.get("/pdf")
+    def pdf():
+        return StreamingResponse(iter([b"%PDF-1.4 " * 500, b"%%EOF"]), media_type="application/pdf")
+    
+    @app.get("/no-modificado")
+    def no_modificado():
+        return Response(status_code=304, headers={"ETag": 'W/"1"'})
+    
+    @app.get("/vacio")
+    def vacio():
+        return Response(status_code=204)
+    
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("accept_encoding,esperado", [
+    ("gzip", "gzip"),
+    ("br", "br"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("identity", None),
+    ("*", "br"),
+    ("", None),
+])
+def test_choose_encoding(accept_encoding, esperado):
+    assert choose_encoding(accept_encoding) == esperado
+
+
+@pytest.mark.parametrize("encoding,decompress", [("gzip", gzip.decompress), ("br", brotli.decompress)])
+def test_comprime_respuesta_completa(encoding, decompress):
+    with crear_app().stream("GET", "/texto", headers={"Accept-Encoding": encoding}) as response:
+        crudo = b"".join(response.iter_raw())
+    
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) == len(crudo) < len(TEXTO)
+    assert decompress(crudo).decode() == TEXTO
+
+
+def test_sin_accept_encoding_no_comprime():
+    response = crear_app().get("/texto", headers={"Accept-Encoding": "identity"})
+    
+    assert "content-encoding" not in response.headers
+    assert response.text == TEXTO
+
+
+def test_umbral_minimo():
+    chico = crear_app(minimum_size=1024).get("/chico", headers={"Accept-Encoding": "gzip"})
+    sin_umbral = crear_app(minimum_size=1).get("/chico", headers={"Accept-Encoding": "gzip"})
+    
+    assert "content-encoding" not in chico.headers
+    assert sin_umbral.headers["content-encoding"] == "gzip"
+    assert sin_umbral.text == "ok"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_streaming_se_comprime_por_partes(encoding):
+    response = crear_app().get("/stream", headers={"Accept-Encoding": encoding})
+    
+    assert response.headers["content-encoding"] == encoding
+    assert "content-length" not in response.headers
+    assert response.text == "".join(LINEAS)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_pdf_no_se_comprime(encoding):
+    response = crear_app(minimum_size=0).get("/pdf", headers={"Accept-Encoding": encoding})
+    
+    assert "content-encoding" not in response.headers
+    assert response.content == b"%PDF-1.4 " * 500 + b"%%EOF"
+
+
+@pytest.mark.parametrize("ruta,status", [("/no-modificado", 304), ("/vacio", 204)])
+def test_respuestas_sin_cuerpo_no_se_tocan_con_umbral_cero(ruta, status):
+    response = crear_app(minimum_size=0).get(ruta, headers={"Accept-Encoding": "gzip, br"})
+    
+    assert response.status_code == status
+    assert "content-encoding" not in response.headers
+    assert response.content == b""
+
+
+def test_304_del_catalogo(catalogo, client):
+    etag = client.get("/libros?limit=50").headers["etag"]
+    response = client.get("/libros?limit=50", headers={"If-None-Match": etag, "Accept-Encoding": "gzip, br"})
+    
+    assert response.status_code == 304
+    assert "content-encoding" not in response.headers
+    assert response.content == b""
+
+
+def test_listado_de_libros_comprimido(catalogo, client):
+    plano = client.get("/libros?limit=30", headers={"Accept-Encoding": "identity"})
+    comprimido = client.get("/libros?limit=30", headers={"Accept-Encoding": "br"})
+    
+    assert comprimido.headers["content-encoding"] == "br"
+    assert int(comprimido.headers["content-length"]) < len(plano.content)
+    assert comprimido.json()["data"] == plano.json()["data"]
@@ -0,0 +1,81 @@
+"""
+Índice de contenido: versiones publicadas con CURRENT, escrituras con lock
+entre procesos y actualización desde las rutas como BackgroundTask
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+from app.services.content_service import ContentService, CONTENT_VERSIONS_TO_KEEP, content_service
+
+
+def _upsert_en_proceso(directory: str, inicio: int):
+    servicio = ContentService(directory)
+    for libro_id in range(inicio, inicio + 10):
+        servicio.upsert([(libro_id, f"Libro {libro_id}", "Sinopsis")])
+
+
+def _version_actual(directory: str) -> str:
+    with open(os.path.join(directory, "CURRENT")) as f:
+        return f.read().strip()
+
+
+def test_build_publica_version(catalogo):
+    directory = "models/content"
+    
+    assert content_service.build(catalogo) == 30
+    
+    version = _version_actual(directory)
+    assert os.listdir(os.path.join(directory, "versions")) == [version]
+    assert not any(name.startswith("content_") for name in os.listdir("models"))
+    assert content_service.similar_books(1, limit=3)
+
+
+def test_upsert_y_remove_publican_versiones_nuevas(catalogo):
+    content_service.build(catalogo)
+    otro_worker = ContentService()
+    assert otro_worker.is_available()
+    
+    content_service.upsert([(100, "Programación funcional", "Haskell y monadas")])
+    content_service.upsert([(101, "Programación funcional avanzada", "Haskell y tipos")])
+    
+    # Otro worker ve la versión nueva a través del puntero
+    assert otro_worker.similar_books(100, limit=1)[0][0] == 101
+    
+    content_service.remove([100, 101])
+    assert otro_worker.similar_books(100) == []
+    versiones = os.listdir("models/content/versions")
+    assert len(versiones) == CONTENT_VERSIONS_TO_KEEP
+    assert _version_actual("models/content") in versiones
+
+
+def test_escrituras_concurrentes_no_pierden_cambios(catalogo):
+    content_service.build(catalogo)
+    
+    ctx = multiprocessing.get_context("spawn")
+    procesos = [ctx.Process(target=_upsert_en_proceso, args=("models/content", 100 + 10 * i)) for i in range(3)]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(timeout=120)
+        assert proceso.exitcode == 0
+    
+    _, libro_ids, _ = ContentService()._load()
+    assert np.isin(np.arange(100, 130), libro_ids).all()
+    assert len(libro_ids) == 30 + 30
+
+
+def test_rutas_actualizan_el_indice_en_background(catalogo, client):
+    content_service.build(catalogo)
+    
+    creado = client.post("/libros", json={
+        "titulo": "Programación funcional", "totalPaginas": 10,
+        "sinopsis": "Haskell y monadas", "idEditorial": 1, "autores_ids": [1]
+    }).json()["data"]
+    client.put("/libros/2", json={"titulo": "Programación funcional con Haskell", "sinopsis": "Monadas"})
+    
+    assert content_service.similar_books(creado["idLibro"], limit=1)[0][0] == 2
+    
+    client.delete(f"/libros/{creado['idLibro']}")
+    assert content_service.similar_books(creado["idLibro"]) == []
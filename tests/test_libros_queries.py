@@ -0,0 +1,91 @@
+"""
+Número de sentencias SQL por endpoint de libros
+Las rutas que devuelven libros comparten LIBRO_RESPONSE_OPTIONS: un libro o
+una página completa se cargan con dos SELECT (libros + editorial con JOIN, y
+autores con selectinload), sin importar cuántos libros o autores haya.
+Si alguien agrega un campo que dispara un lazy load, estos conteos cambian.
+
+/libros/search usa las mismas opciones pero requiere PostgreSQL, y
+/libros/with-file sube el PDF a S3: no se cubren aquí.
+"""
+import pytest
+
+
+LIBRO_NUEVO = {"titulo": "Libro nuevo", "totalPaginas": 120, "sinopsis": "Texto", "idEditorial": 1}
+
+
+@pytest.mark.parametrize("limit", [5, 30])
+def test_listado_dos_consultas_sin_importar_el_tamano(catalogo, client, queries, limit):
+    queries.reset()
+    response = client.get(f"/libros?limit={limit}")
+    
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == limit
+    assert all(len(libro["autores"]) == 2 for libro in response.json()["data"])
+    assert queries.count == 2
+
+
+def test_listado_en_cache_no_consulta(catalogo, client, queries):
+    client.get("/libros?limit=10")
+    queries.reset()
+    
+    assert client.get("/libros?limit=10").status_code == 200
+    assert queries.count == 0
+
+
+def test_listado_liviano_una_consulta(catalogo, client, queries):
+    queries.reset()
+    response = client.get("/libros?view=card&limit=30")
+    
+    assert response.status_code == 200
+    assert queries.count == 1
+
+
+def test_detalle_dos_consultas(catalogo, client, queries):
+    queries.reset()
+    response = client.get("/libros/5")
+    
+    assert response.status_code == 200
+    assert response.json()["data"]["editorial"]["idEditorial"] == 5 % 3 + 1
+    assert queries.count == 2
+
+
+def test_libros_por_autor_dos_consultas(catalogo, client, queries):
+    queries.reset()
+    response = client.get("/autores/2/libros")
+    
+    assert response.status_code == 200
+    assert response.json()["data"]
+    assert queries.count == 2
+
+
+@pytest.mark.parametrize("autores_ids", [[1], [1, 2, 3]])
+def test_crear_libro_recarga_con_dos_consultas(catalogo, client, queries, autores_ids):
+    queries.reset()
+    response = client.post("/libros", json={**LIBRO_NUEVO, "autores_ids": autores_ids})
+    
+    assert response.status_code == 201
+    assert [a["idAutor"] for a in response.json()["data"]["autores"]] == autores_ids
+    # editorial, autores, refresh y la recarga (2): no depende de la cantidad de autores
+    assert len(queries.selects()) == 5
+    # + INSERT libro, 2 UPDATE de estadísticas y un INSERT por autor
+    assert queries.count == 8 + len(autores_ids)
+
+
+def test_actualizar_libro(catalogo, client, queries):
+    queries.reset()
+    response = client.put("/libros/3", json={"titulo": "Otro título"})
+    
+    assert response.status_code == 200
+    assert response.json()["data"]["titulo"] == "Otro título"
+    # SELECT del libro, UPDATE y la recarga (2)
+    assert queries.count == 4
+
+
+def test_actualizar_autores_no_agrega_consultas(catalogo, client, queries):
+    queries.reset()
+    response = client.put("/libros/3", json={"autores_ids": [1, 2, 3, 4]})
+    
+    assert response.status_code == 200
+    assert len(response.json()["data"]["autores"]) == 4
+    assert len(queries.selects()) == 3
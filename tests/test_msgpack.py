@@ -0,0 +1,115 @@
+"""
+Negociación de MessagePack columnar en /libros, /lecturas y /recomendaciones
+"""
+import msgpack
+import pytest
+from starlette.requests import Request
+
+from app.models.lectura import Lectura, EstadoLectura
+from app.utils.responses import response_format, to_columnar
+
+
+def filas(valor):
+    """Inverso de to_columnar: lo que hace el cliente al decodificar"""
+    if isinstance(valor, dict) and set(valor) == {"columns", "rows"}:
+        columnas = {k: filas(v) for k, v in valor["columns"].items()}
+        return [{k: columnas[k][i] for k in columnas} for i in range(valor["rows"])]
+    if isinstance(valor, list):
+        return [filas(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: filas(v) for k, v in valor.items()}
+    return valor
+
+
+def decodificar(response) -> dict:
+    body = msgpack.unpackb(response.content)
+    assert body.pop("columnar") is True
+    return filas(body)
+
+
+def mismo_sobre(json_body: dict, msgpack_body: dict):
+    json_body.pop("timestamp")
+    msgpack_body.pop("timestamp")
+    assert msgpack_body == json_body
+
+
+@pytest.mark.parametrize("accept", ["application/msgpack", "application/x-msgpack"])
+def test_libros_msgpack_columnar(catalogo, client, accept):
+    url = "/libros?limit=10&facetas=true"
+    response = client.get(url, headers={"Accept": accept})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "Accept" in response.headers["vary"]
+    
+    crudo = msgpack.unpackb(response.content)
+    # Claves una sola vez: arrays paralelos por campo
+    assert crudo["data"]["rows"] == 10
+    assert crudo["data"]["columns"]["idLibro"] == list(range(1, 11))
+    
+    mismo_sobre(client.get(url).json(), decodificar(response))
+
+
+def test_libros_cache_separa_formatos(catalogo, client):
+    msgpack_body = client.get("/libros?limit=5", headers={"Accept": "application/x-msgpack"}).content
+    json_response = client.get("/libros?limit=5")
+    msgpack_hit = client.get("/libros?limit=5", headers={"Accept": "application/x-msgpack"})
+    
+    assert json_response.headers["content-type"] == "application/json"
+    assert msgpack_hit.headers["content-type"] == "application/msgpack"
+    # Mismo cuerpo guardado; solo cambia el timestamp del sobre en cada acierto
+    guardado, acierto = msgpack.unpackb(msgpack_body), msgpack.unpackb(msgpack_hit.content)
+    assert acierto.pop("timestamp") >= guardado.pop("timestamp")
+    assert acierto == guardado
+
+
+def test_libros_etag_distinto_por_formato(catalogo, client):
+    msgpack_accept = {"Accept": "application/msgpack"}
+    etag_json = client.get("/libros?limit=5").headers["etag"]
+    etag_msgpack = client.get("/libros?limit=5", headers=msgpack_accept).headers["etag"]
+    
+    assert etag_json != etag_msgpack
+    # El ETag del JSON no revalida la variante MessagePack (ni al revés)
+    cruzado = client.get("/libros?limit=5", headers={**msgpack_accept, "If-None-Match": etag_json})
+    assert cruzado.status_code == 200
+    assert cruzado.headers["content-type"] == "application/msgpack"
+    assert client.get("/libros?limit=5", headers={"If-None-Match": etag_msgpack}).status_code == 200
+    
+    vigente = client.get("/libros?limit=5", headers={**msgpack_accept, "If-None-Match": etag_msgpack})
+    assert vigente.status_code == 304
+    assert vigente.headers["etag"] == etag_msgpack and "Accept" in vigente.headers["vary"]
+    assert client.get("/libros?limit=5", headers={"If-None-Match": etag_json}).status_code == 304
+
+
+def test_lecturas_msgpack(catalogo, client, usuario, db):
+    db.add_all([
+        Lectura(idUsuario=usuario.idUsuario, idLibro=i, paginaLeidas=i, estado=EstadoLectura.EN_PROGRESO)
+        for i in range(1, 4)
+    ])
+    db.commit()
+    
+    response = client.get("/lecturas", headers={"Accept": "application/x-msgpack"})
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    mismo_sobre(client.get("/lecturas").json(), decodificar(response))
+
+
+@pytest.mark.parametrize("accept,esperado", [
+    ("application/msgpack", "msgpack"),
+    ("application/x-msgpack", "msgpack"),
+    ("application/json;q=0.9, application/x-msgpack", "msgpack"),
+    ("application/json, application/msgpack;q=0.5", "json"),
+    ("application/msgpack;q=0", "json"),
+    ("*/*", "json"),
+    ("", "json"),
+])
+def test_response_format(accept, esperado):
+    request = Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+    assert response_format(request) == esperado
+
+
+def test_to_columnar_solo_listas_homogeneas():
+    assert to_columnar([{"a": 1, "b": 2}, {"a": 3, "b": 4}]) == {"columns": {"a": [1, 3], "b": [2, 4]}, "rows": 2}
+    assert to_columnar([{"a": 1}, {"b": 2}]) == [{"a": 1}, {"b": 2}]
+    assert to_columnar([]) == []
@@ -0,0 +1,52 @@
+"""
+Índice LSH de usuarios: guardado como .npy y abierto con mmap
+"""
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from app.services.neighbor_index import UserNeighborIndex
+from app.services.recommendation_service import RecommendationService
+
+
+def mapeado(array) -> bool:
+    """Indica si el array (o el array del que es vista) está mapeado desde disco"""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+@pytest.fixture
+def features() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((200, 12)).astype(np.float32)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_cargado_con_mmap_responde_igual(tmp_path, features, sparse):
+    X = csr_matrix(features) if sparse else features
+    user_ids = list(range(1000, 1200))
+    index = UserNeighborIndex.build(user_ids, X)
+    index.save(str(tmp_path / "user_neighbors"))
+    
+    cargado = UserNeighborIndex.load(str(tmp_path / "user_neighbors"))
+    
+    assert mapeado(cargado.codes) and mapeado(cargado.order)
+    assert mapeado(cargado.features.data if sparse else cargado.features)
+    for fila in (0, 57, 199):
+        assert cargado.query(features[fila], k=10, exclude=user_ids[fila]) == \
+            index.query(features[fila], k=10, exclude=user_ids[fila])
+
+
+def test_modelo_entrenado_abre_vecinos_con_mmap(lectores, db):
+    servicio = RecommendationService()
+    servicio.train_model(db, n_clusters=3)
+    snapshot = servicio.registry.get()
+    
+    index = snapshot.neighbor_index
+    
+    assert mapeado(index.user_ids) and mapeado(index.features)
+    vecinos = index.query(index.features[0], k=5, exclude=int(index.user_ids[0]))
+    assert vecinos and all(uid in lectores for uid, _ in vecinos)
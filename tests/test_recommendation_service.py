@@ -0,0 +1,156 @@
+"""
+Entrenamiento y asignación de clusters del servicio de recomendaciones
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.models import EstadoUsuario
+from app.models.preferencia import Categoria, Preferencia, PreferenciaCategoria, PreferenciaLenguaje
+from app.models.usuario import Usuario
+from app.services.recommendation_service import (
+    COLLABORATIVE_WEIGHT,
+    NEIGHBOUR_WEIGHT,
+    ClusterAssignments,
+    RecommendationService,
+)
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def servicio(engine) -> RecommendationService:
+    """Servicio nuevo por test: el registro y las cachés no se comparten entre tests"""
+    return RecommendationService()
+
+
+def test_entrenar_usa_las_mismas_columnas_en_matriz_y_metadatos(lectores, db, servicio, monkeypatch):
+    feature_columns = servicio._feature_columns
+    
+    def columnas_y_categoria_nueva(db_):
+        # Una categoría creada mientras entrena no debe cambiar el ancho de la matriz
+        columnas = feature_columns(db_)
+        db_.add(Categoria(nombre=f"Nueva {len(columnas[0])}"))
+        db_.commit()
+        return columnas
+    
+    monkeypatch.setattr(servicio, "_feature_columns", columnas_y_categoria_nueva)
+    servicio.train_model(db, n_clusters=3)
+    
+    snapshot = servicio.registry.get()
+    metadata = snapshot.metadata
+    assert snapshot.n_features == len(metadata["categoria_ids"]) + len(metadata["lenguaje_ids"]) + 1
+    assert metadata["categoria_ids"] == [1, 2, 3, 4]
+
+
+def test_cluster_de_usuario_nuevo_sin_leer_el_catalogo(lectores, db, servicio, queries):
+    servicio.train_model(db, n_clusters=3)
+    snapshot = servicio.registry.get()
+    
+    # Mismas preferencias que el lector 1 (categoría 2, lenguaje 2, nivel 2)
+    nuevo = Usuario(registro="nuevo", nombre="Nuevo", email="nuevo@example.com",
+                    password="x", estado=EstadoUsuario.ACTIVO)
+    db.add(nuevo)
+    db.flush()
+    preferencia = Preferencia(idUsuario=nuevo.idUsuario, idNivel=2)
+    db.add(preferencia)
+    db.flush()
+    db.add_all([
+        PreferenciaCategoria(idPreferencias=preferencia.idPreferencias, idCategoria=2),
+        PreferenciaLenguaje(idPreferencias=preferencia.idPreferencias, idLenguaje=2),
+    ])
+    db.commit()
+    db.refresh(nuevo)
+    db.expunge_all()
+    
+    queries.reset()
+    cluster = servicio.get_user_cluster(nuevo, db)
+    
+    assert cluster == snapshot.assignments.get(lectores[1])
+    # Preferencia y sus dos colecciones; ni categorías ni lenguajes completos
+    assert queries.count == 3
+    assert not any("FROM categorias" in q or "FROM lenguajes" in q for q in queries.statements)
+
+
+def test_otros_miembros_descuenta_usuarios_reasignados():
+    # Usuarios 1 y 2 en el cluster 0, usuario 3 en el cluster 1
+    assignments = ClusterAssignments(np.array([1, 2, 3], dtype=np.int32), np.array([0, 0, 1], dtype=np.int16))
+    assert assignments.has_other_members(0, 1)
+    
+    # El usuario 2 se pasó al cluster 1: el 1 queda solo en el cluster 0
+    assignments[2] = 1
+    assignments[2] = 1
+    assert not assignments.has_other_members(0, 1)
+    assert assignments.has_other_members(1, 3)
+    
+    # El usuario 1 también se fue: el cluster 0 queda vacío para un usuario nuevo
+    assignments[1] = 1
+    assert not assignments.has_other_members(0, 99)
+    assert assignments.has_other_members(1, 1)
+
+
+def test_senal_colaborativa_pesa_en_la_mezcla():
+    candidatos = np.array([10, 11, 12, 13], dtype=np.int64)
+    colaborativos = [(13, 0.9)]
+    
+    ranking = RecommendationService._blend_rankings(candidatos, [(colaborativos, COLLABORATIVE_WEIGHT)])
+    
+    # El último del cluster sube por encima del resto con la señal item-item
+    assert ranking.tolist() == [10, 13, 11, 12]
+
+
+def test_pesos_configurables_por_entorno():
+    env = dict(os.environ, RECOMMENDATIONS_CONTENT_WEIGHT="1.5", RECOMMENDATIONS_CLUSTER_WEIGHT="0.1")
+    codigo = ("from app.services import recommendation_service as r; "
+              "print(r.CLUSTER_WEIGHT, r.COLLABORATIVE_WEIGHT, r.CONTENT_WEIGHT, r.NEIGHBOUR_WEIGHT)")
+    
+    salida = subprocess.run([sys.executable, "-c", codigo], env=env, cwd=RAIZ,
+                            capture_output=True, text=True, check=True)
+    
+    assert salida.stdout.split() == ["0.1", str(COLLABORATIVE_WEIGHT), "1.5", str(NEIGHBOUR_WEIGHT)]
+
+
+def test_fallback_excluye_libros_leidos_con_subconsulta(lectores, db, servicio, queries):
+    usuario = db.query(Usuario).filter(Usuario.idUsuario == lectores[1]).one()
+    leidos = {lectura.idLibro for lectura in usuario.lecturas}
+    assert leidos and usuario.preferencia.preferencia_categorias and usuario.preferencia.preferencia_lenguajes
+    
+    queries.reset()
+    libros = servicio._fallback_recommendations(usuario, db, limit=30, excluir_ids={30})
+    ids = [libro.idLibro for libro in libros]
+    
+    assert len(ids) == 30 - len(leidos) - 1
+    assert not leidos & set(ids) and 30 not in ids
+    # Los leídos van como subconsulta en las consultas de libros, no como lista de ids
+    consultas_libros = [q for q in queries.statements if q.startswith("SELECT libros.")]
+    assert consultas_libros
+    assert all('NOT IN (SELECT lecturas."idLibro"' in q for q in consultas_libros)
+
+
+def test_lote_usa_las_asignaciones_como_get_user_cluster(lectores, db, servicio, monkeypatch):
+    servicio.train_model(db, n_clusters=3)
+    snapshot = servicio.registry.get()
+    
+    # Lector 0 reasignado a otro cluster (log de deltas)
+    reasignado = lectores[0]
+    otro = (snapshot.assignments.get(reasignado) + 1) % 3
+    servicio.registry.record_assignment(snapshot, reasignado, otro)
+    
+    pedidos = []
+    cluster_candidates = snapshot.cluster_candidates
+    monkeypatch.setattr(snapshot, "cluster_candidates", lambda c: pedidos.append(c) or cluster_candidates(c))
+    predichos = []
+    predict = snapshot.kmeans.predict
+    monkeypatch.setattr(snapshot.kmeans, "predict", lambda X: predichos.append(X.shape[0]) or predict(X))
+    
+    list(servicio.get_recommendations_batch(lectores[:4], db, limit=5))
+    
+    usuario = db.query(Usuario).filter(Usuario.idUsuario == reasignado).one()
+    assert pedidos[0] == otro == servicio.get_user_cluster(usuario, db)
+    assert pedidos == [snapshot.assignments.get(uid) for uid in lectores[:4]]
+    # Todos tienen asignación: kmeans.predict no se llama
+    assert predichos == []
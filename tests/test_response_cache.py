@@ -0,0 +1,46 @@
+"""
+Caché de respuestas serializadas: los aciertos salen con el timestamp actual
+"""
+import re
+import time
+
+import msgpack
+
+from app.utils.response_cache import response_cache
+from app.utils.responses import EnvelopeResponse
+
+TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$")
+
+
+def sin_timestamp(body: dict) -> dict:
+    return {k: v for k, v in body.items() if k != "timestamp"}
+
+
+def test_acierto_json_con_timestamp_actual(catalogo, client):
+    primera = client.get("/editoriales").json()
+    aciertos = response_cache.hits
+    time.sleep(0.01)
+    segunda = client.get("/editoriales").json()
+    
+    assert response_cache.hits == aciertos + 1
+    assert TIMESTAMP.match(segunda["timestamp"])
+    assert segunda["timestamp"] > primera["timestamp"]
+    assert sin_timestamp(segunda) == sin_timestamp(primera)
+
+
+def test_acierto_msgpack_con_timestamp_actual(catalogo, client):
+    accept = {"Accept": "application/msgpack"}
+    primera = msgpack.unpackb(client.get("/libros?limit=5", headers=accept).content)
+    aciertos = response_cache.hits
+    time.sleep(0.01)
+    segunda = msgpack.unpackb(client.get("/libros?limit=5", headers=accept).content)
+    
+    assert response_cache.hits == aciertos + 1
+    assert segunda["timestamp"] > primera["timestamp"]
+    assert sin_timestamp(segunda) == sin_timestamp(primera)
+
+
+def test_respuesta_sin_timestamp_se_guarda_igual():
+    result = EnvelopeResponse({"data": [1, 2]})
+    
+    assert response_cache._restamp(response_cache._entry(result, result.body)) == result.body
@@ -0,0 +1,88 @@
+"""
+Formato de las respuestas: sobre estándar, timestamp UTC con milisegundos
+y códigos 201 en los endpoints de creación
+"""
+import re
+
+import pytest
+
+from app.utils.responses import ErrorDetail, ErrorResponse, PaginatedResponse, StandardResponse, utc_timestamp
+
+TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$")
+
+
+def test_utc_timestamp_con_milisegundos_y_z():
+    assert TIMESTAMP.match(utc_timestamp())
+
+
+def test_modelos_usan_el_mismo_timestamp():
+    respuestas = [
+        StandardResponse[int](data=1),
+        ErrorResponse(error=ErrorDetail(code="SYS_003", message="No encontrado")),
+        PaginatedResponse[int](data=[1, 2]),
+    ]
+    for respuesta in respuestas:
+        assert TIMESTAMP.match(respuesta.model_dump()["timestamp"])
+    
+    # Se genera en cada instancia, no una sola vez al importar el módulo
+    assert StandardResponse[int](data=1).timestamp >= respuestas[0].timestamp
+
+
+def test_sobre_de_respuesta_exitosa(client, catalogo):
+    response = client.get("/libros/1")
+    body = response.json()
+    
+    assert response.status_code == 200
+    assert set(body) == {"success", "data", "message", "timestamp", "count"}
+    assert body["success"] is True and body["data"]["idLibro"] == 1 and body["count"] == 1
+    assert TIMESTAMP.match(body["timestamp"])
+
+
+def test_sobre_de_listado_con_count(client, catalogo):
+    body = client.get("/editoriales").json()
+    
+    assert set(body) == {"success", "data", "message", "timestamp", "count"}
+    assert body["count"] == len(body["data"])
+    assert TIMESTAMP.match(body["timestamp"])
+
+
+def test_sobre_de_error(client, catalogo):
+    response = client.get("/libros/9999")
+    body = response.json()
+    
+    assert response.status_code == 404
+    assert set(body) == {"success", "error", "timestamp"}
+    assert body["success"] is False
+    assert set(body["error"]) == {"code", "message", "details"}
+    assert body["error"]["code"] == "BOOK_001"
+    assert TIMESTAMP.match(body["timestamp"])
+
+
+def test_sobre_de_error_de_validacion(client):
+    response = client.post("/editoriales", json={})
+    body = response.json()
+    
+    assert response.status_code == 422
+    assert body["success"] is False and body["error"]["code"] == "VAL_001"
+    assert body["error"]["details"] and TIMESTAMP.match(body["timestamp"])
+
+
+@pytest.mark.parametrize("ruta,payload", [
+    ("/editoriales", {"nombre": "Editorial Nueva"}),
+    ("/autores", {"nombre": "Autor Nuevo"}),
+    ("/niveles", {"nombre": "Experto"}),
+    ("/categorias", {"nombre": "Categoría Nueva"}),
+    ("/lenguajes", {"nombre": "Lenguaje Nuevo"}),
+    ("/libros", {"titulo": "Libro Nuevo", "totalPaginas": 120, "idEditorial": 1, "autores_ids": [1]}),
+    ("/lecturas", {"idLibro": 1, "paginaLeidas": 5}),
+    ("/preferencias", {"categorias_ids": [1], "lenguajes_ids": [1], "nivel_id": 1}),
+    ("/auth/register", {"registro": "nuevo001", "nombre": "Nuevo", "email": "nuevo@example.com",
+                        "password": "secreto123"}),
+])
+def test_creacion_responde_201(client, catalogo, ruta, payload):
+    response = client.post(ruta, json=payload)
+    body = response.json()
+    
+    assert response.status_code == 201, body
+    assert body["success"] is True and body["data"]
+    assert TIMESTAMP.match(body["timestamp"])
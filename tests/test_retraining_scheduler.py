@@ -0,0 +1,158 @@
+"""
+Reentrenamiento: conteo de cambios compartido, renovación del lock y
+entrenamientos en curso con otros parámetros
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from app.services import retraining_scheduler as scheduler_module
+from app.services.recommendation_service import recommendation_service
+from app.services.retraining_scheduler import RetrainingScheduler, TrainingInProgressError
+
+
+class EjecutorFalso:
+    """Registra los entrenamientos encolados sin correrlos"""
+    
+    def __init__(self):
+        self.encolados = []
+    
+    def submit(self, fn, *args):
+        self.encolados.append(args)
+        return Future()
+
+
+@pytest.fixture
+def scheduler(engine) -> RetrainingScheduler:
+    scheduler = RetrainingScheduler()
+    scheduler._executor = EjecutorFalso()
+    return scheduler
+
+
+@pytest.fixture
+def modelo(lectores, db):
+    recommendation_service.train_model(db, n_clusters=3)
+    recommendation_service.registry.invalidate()
+    return recommendation_service.registry.get()
+
+
+def test_otros_parametros_con_entrenamiento_en_curso(scheduler):
+    en_curso = scheduler.submit(n_clusters=4, modo="dense")
+    
+    assert scheduler.submit(n_clusters=4, modo="dense") is en_curso
+    with pytest.raises(TrainingInProgressError):
+        scheduler.submit(n_clusters=8, modo="dense")
+    with pytest.raises(TrainingInProgressError):
+        scheduler.submit(n_clusters=4, modo="sparse")
+    assert len(scheduler._executor.encolados) == 1
+
+
+def test_cambios_se_cuentan_en_el_log_compartido(modelo, scheduler, lectores):
+    scheduler.change_threshold = 3
+    otro_worker = RetrainingScheduler()
+    otro_worker._executor = EjecutorFalso()
+    otro_worker.change_threshold = 3
+    
+    # Dos cambios en un worker y uno en otro alcanzan el umbral
+    for usuario_id, worker in zip(lectores, (scheduler, scheduler, otro_worker)):
+        recommendation_service.assign_user_cluster(usuario_id, None)
+        worker.record_preference_change()
+    
+    assert scheduler._executor.encolados == []
+    assert otro_worker._executor.encolados == [(5, "dense", 1024)]
+    assert scheduler.status()["cambios_pendientes"] == 3
+
+
+def test_edad_de_la_version_publicada(modelo, scheduler):
+    scheduler.interval = 3600
+    assert scheduler._model_age() < scheduler.interval
+    
+    scheduler.interval = 0.01
+    time.sleep(0.02)
+    assert scheduler._model_age() >= scheduler.interval
+
+
+def test_intervalo_no_entrena_con_lock_de_otro_proceso(scheduler):
+    assert scheduler_module._acquire_training_lock()
+    try:
+        scheduler._submit_automatic("intervalo")
+        assert scheduler._executor.encolados == []
+    finally:
+        os.remove(scheduler_module.TRAINING_LOCK_PATH)
+    
+    scheduler._submit_automatic("intervalo")
+    assert len(scheduler._executor.encolados) == 1
+
+
+def test_lock_se_renueva_mientras_entrena(engine, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "TRAINING_LOCK_HEARTBEAT_SECONDS", 0.01)
+    assert scheduler_module._acquire_training_lock()
+    viejo = time.time() - 10 * scheduler_module.TRAINING_LOCK_STALE_SECONDS
+    os.utime(scheduler_module.TRAINING_LOCK_PATH, (viejo, viejo))
+    
+    stop = threading.Event()
+    hilo = threading.Thread(target=scheduler_module._renew_training_lock, args=(stop,))
+    hilo.start()
+    time.sleep(0.1)
+    stop.set()
+    hilo.join()
+    
+    assert scheduler_module._training_lock_held()
+    assert not scheduler_module._acquire_training_lock()
+    os.remove(scheduler_module.TRAINING_LOCK_PATH)
+
+
+def test_entrenar_con_otros_parametros_responde_409(client, monkeypatch):
+    scheduler = scheduler_module.retraining_scheduler
+    monkeypatch.setattr(scheduler, "_executor", EjecutorFalso())
+    monkeypatch.setattr(scheduler, "_future", None)
+    monkeypatch.setattr(scheduler, "_params", None)
+    
+    assert client.get("/recomendaciones/entrenar?n_clusters=4&background=true").status_code == 200
+    response = client.get("/recomendaciones/entrenar?n_clusters=6")
+    
+    assert response.status_code == 409
+    assert response.json()["error"]["code"] == "REC_001"
+
+
+@pytest.fixture
+def scheduler_global(monkeypatch) -> RetrainingScheduler:
+    """El scheduler singleton con un ejecutor falso y sin entrenamientos previos"""
+    scheduler = scheduler_module.retraining_scheduler
+    monkeypatch.setattr(scheduler, "_executor", EjecutorFalso())
+    monkeypatch.setattr(scheduler, "_future", None)
+    monkeypatch.setattr(scheduler, "_params", None)
+    monkeypatch.setattr(scheduler, "_initial_requested", None)
+    return scheduler
+
+
+def test_sin_modelo_encola_el_entrenamiento_y_responde_fallback(client, catalogo, usuario, db, scheduler_global,
+                                                               monkeypatch):
+    def entrenar_en_la_peticion(*args, **kwargs):
+        raise AssertionError("La petición no debe entrenar el modelo")
+    
+    monkeypatch.setattr(recommendation_service, "train_model", entrenar_en_la_peticion)
+    
+    response = client.get("/recomendaciones?limit=5")
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 5
+    assert scheduler_global._executor.encolados == [(5, "dense", 1024)]
+    assert scheduler_global._last_trigger == "sin_modelo"
+    
+    # Las peticiones siguientes no vuelven a encolar mientras el primero corre
+    assert recommendation_service.get_user_cluster(usuario, db) is None
+    lote = client.post("/recomendaciones/lote", json={"usuario_ids": [usuario.idUsuario], "limit": 3})
+    assert len(lote.json()["recomendaciones"]) == 3
+    assert len(scheduler_global._executor.encolados) == 1
+
+
+def test_sin_modelo_no_encola_si_otro_proceso_entrena(engine, scheduler_global):
+    assert scheduler_module._acquire_training_lock()
+    try:
+        assert recommendation_service.get_model_snapshot() is None
+        assert scheduler_global._executor.encolados == []
+    finally:
+        os.remove(scheduler_module.TRAINING_LOCK_PATH)
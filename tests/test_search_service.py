@@ -0,0 +1,36 @@
+"""
+Resaltado de la búsqueda de texto completo: HTML escapado con <mark>
+La consulta en sí requiere PostgreSQL; aquí se cubre el post-proceso y el SQL generado.
+"""
+import pytest
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+from app.models.libro import Libro
+from app.services.search_service import MARK_START, MARK_STOP, search_service
+
+
+@pytest.mark.parametrize("fragmento,esperado", [
+    (f"Aprende {MARK_START}Python{MARK_STOP}", "Aprende <mark>Python</mark>"),
+    (f"<script>alert(1)</script> {MARK_START}Python{MARK_STOP}",
+     "&lt;script&gt;alert(1)&lt;/script&gt; <mark>Python</mark>"),
+    (f'<img src=x onerror="x"> & {MARK_START}C++{MARK_STOP}',
+     "&lt;img src=x onerror=&quot;x&quot;&gt; &amp; <mark>C++</mark>"),
+    ("Texto con <mark>etiquetas</mark> propias", "Texto con &lt;mark&gt;etiquetas&lt;/mark&gt; propias"),
+    (None, ""),
+])
+def test_highlight_html_escapa_el_texto(fragmento, esperado):
+    assert search_service.highlight_html(fragmento) == esperado
+
+
+def test_headline_quita_los_delimitadores_del_texto_original():
+    expresion = search_service._headline(Libro.titulo, func.to_tsquery("spanish", "python"), "HighlightAll=true")
+    compilado = expresion.compile(dialect=postgresql.dialect())
+    
+    assert "ts_headline" in str(compilado)
+    assert "translate(libros.titulo" in str(compilado)
+    assert MARK_START + MARK_STOP in compilado.params.values()
+
+
+def test_prefix_query_solo_palabras():
+    assert search_service.prefix_query("web <b>pyth") == "web:* & b:* & pyth:*"
@@ -0,0 +1,20 @@
+"""
+Número de sentencias SQL del listado de usuarios con paginación por cursor
+Cada página es un único SELECT por clave (idUsuario > cursor), sin COUNT
+de la tabla completa: la página N cuesta lo mismo que la primera.
+"""
+
+
+def test_paginas_una_consulta_sin_count(lectores, client, queries):
+    queries.reset()
+    primera = client.get("/usuarios?limit=10").json()
+    
+    assert queries.count == 1
+    assert primera["pagination"]["has_more"]
+    
+    queries.reset()
+    segunda = client.get(f"/usuarios?limit=10&cursor={primera['pagination']['next_cursor']}").json()
+    
+    assert queries.count == 1
+    assert not any("count(" in q.lower() for q in queries.statements)
+    assert segunda["data"][0]["idUsuario"] > primera["data"][-1]["idUsuario"]